@@ -44,14 +44,33 @@ NetworkX is distributed with the 3-clause BSD license.
 Functions for hashing graphs to strings.
 Isomorphic graphs should be assigned identical hashes.
 For now, only Weisfeiler-Lehman hashing is implemented.
+
+In contrast to the networkx implementation, the refinement works on integer
+node classes stored in NumPy arrays. The edges are kept as CSR arrays of
+half-edges (source, target and edge class), sorted by source.
+In every iteration, the signature of a node (its own class and the sorted
+classes of its neighbors) is compressed to a small integer with one
+``np.unique`` call per node degree, and only the final histogram is hashed.
+With ``compat=True``, every distinct signature is hashed once to reproduce
+the hexadecimal digests of the networkx implementation.
 """
 
-from collections import Counter, defaultdict
+from collections import defaultdict, namedtuple
 from hashlib import blake2b
 
-import networkx as nx
+import numpy as np
+
+__all__ = [
+    "weisfeiler_lehman_graph_hash",
+    "weisfeiler_lehman_graph_hashes",
+    "weisfeiler_lehman_subgraph_hashes",
+    "weisfeiler_lehman_subgraph_hash_counts",
+    "weisfeiler_lehman_array_hash",
+]
 
-__all__ = ["weisfeiler_lehman_graph_hash", "weisfeiler_lehman_subgraph_hashes"]
+_IntegerGraph = namedtuple(
+    "_IntegerGraph", ["nodes", "labels", "node_alphabet", "src", "dst", "edges", "edge_alphabet"]
+)
 
 
 def _hash_label(label, digest_size):
@@ -67,24 +86,223 @@ def _init_node_labels(G, edge_attr, node_attr):
         return {u: str(deg) for u, deg in G.degree()}
 
 
-def _neighborhood_aggregate(G, node, node_labels, edge_attr=None):
-    """
-    Compute new labels for given node by aggregating
-    the labels of each node's neighbors.
-    """
-    label_list = []
-    for nbr in G.neighbors(node):
+def _edge_label(G, node, nbr, edge_attr):
+    if edge_attr is None:
+        return ""
+    data = G[node][nbr]
+    if G.is_multigraph():
         # ToDo: make a PR to networkx
         # needed to add this to make it work with MultiGraph
-        if isinstance(G, (nx.MultiDiGraph, nx.MultiGraph)):
-            prefix = "" if edge_attr is None else str(G[node][nbr][0][edge_attr])
+        data = data[0]
+    return str(data[edge_attr])
+
+
+def _codes(values):
+    """Return the sorted unique values as strings and the rank of every value."""
+    alphabet, codes = np.unique(np.asarray(values), return_inverse=True)
+    return [str(value) for value in alphabet.tolist()], codes.reshape(-1).astype(np.int64)
+
+
+def _integer_graph_from_arrays(nodes, node_labels, src, dst, edge_labels, directed):
+    """Sort the half-edges by source and compress node and edge labels to integers."""
+    src = np.asarray(src, dtype=np.int64).reshape(-1)
+    dst = np.asarray(dst, dtype=np.int64).reshape(-1)
+    if edge_labels is None:
+        edge_labels = np.full(len(src), "")
+    edge_labels = np.asarray(edge_labels)
+
+    if not directed:
+        # every edge is seen from both ends, self-loops only once
+        not_loop = src != dst
+        src, dst = np.concatenate((src, dst[not_loop])), np.concatenate((dst, src[not_loop]))
+        edge_labels = np.concatenate((edge_labels, edge_labels[not_loop]))
+
+    node_alphabet, labels = _codes(node_labels)
+    edge_alphabet, edges = _codes(edge_labels) if len(src) else ([], np.zeros(0, np.int64))
+
+    order = np.argsort(src, kind="stable")
+    return _IntegerGraph(
+        nodes, labels, node_alphabet, src[order], dst[order], edges[order], edge_alphabet
+    )
+
+
+def _integer_graph(G, edge_attr=None, node_attr=None, compat=False):
+    """Translate a networkx graph into integer node classes and half-edge arrays."""
+    return _integer_graph_from_arrays(*_graph_arrays(G, edge_attr, node_attr, compat))
+
+
+def _graph_arrays(G, edge_attr=None, node_attr=None, compat=False):
+    """
+    Return the nodes, initial node labels, half-edges and edge labels of a networkx graph,
+    and whether the half-edges are directed.
+
+    For directed graphs, only the successors of a node are aggregated.
+    With ``compat=True``, every neighbor is only counted once and the label
+    of the first parallel edge is used, as in the networkx implementation.
+    Otherwise, every parallel edge is counted with its own label.
+    """
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    initial_labels = _init_node_labels(G, edge_attr, node_attr)
+    node_labels = np.array([initial_labels[node] for node in nodes], dtype=str)
+
+    if compat:
+        half_edges = [
+            (index[node], index[nbr], _edge_label(G, node, nbr, edge_attr))
+            for node in nodes
+            for nbr in G.neighbors(node)
+        ]
+        directed = True
+    else:
+        half_edges = [
+            (index[u], index[v], "" if edge_attr is None else str(d[edge_attr]))
+            for u, v, d in G.edges(data=True)
+        ]
+        directed = G.is_directed()
+
+    src = [edge[0] for edge in half_edges]
+    dst = [edge[1] for edge in half_edges]
+    edge_labels = np.array([edge[2] for edge in half_edges], dtype=str)
+    return nodes, node_labels, src, dst, edge_labels, directed
+
+
+def _degree_groups(src, n_nodes):
+    """Return the CSR index pointer and the nodes grouped by ascending degree."""
+    degree = np.bincount(src, minlength=n_nodes)
+    indptr = np.concatenate(([0], np.cumsum(degree)))
+    groups = [(int(d), np.flatnonzero(degree == d)) for d in np.unique(degree)]
+    return indptr, groups
+
+
+def _refine(labels, n_labels, graph, indptr, groups):
+    """
+    Compress the signature of every node to a new integer class.
+
+    Neighbor classes are combined with the edge class into
+    ``edge * n_labels + label``, such that the signatures, and
+    therefore the new classes, are canonical for a given graph.
+    New classes are assigned in the order of (degree, signature).
+    """
+    codes = graph.edges * n_labels + labels[graph.dst]
+    new_labels = np.empty_like(labels)
+    signatures = []
+    counts = []
+    offset = 0
+    for degree, group in groups:
+        columns = np.sort(codes[indptr[group][:, None] + np.arange(degree)], axis=1)
+        rows = np.column_stack((labels[group], columns))
+        unique_rows, inverse, unique_counts = np.unique(
+            rows, axis=0, return_inverse=True, return_counts=True
+        )
+        new_labels[group] = offset + inverse.reshape(-1)
+        offset += len(unique_rows)
+        signatures.append(unique_rows)
+        counts.append(unique_counts)
+    return new_labels, signatures, counts
+
+
+def _legacy_label(row, class_labels, edge_prefixes, n_labels):
+    """Build the string that the networkx implementation hashes for a signature."""
+    nbr_labels = []
+    for code in row[1:]:
+        edge, label = divmod(code, n_labels)
+        nbr_labels.append(edge_prefixes[edge] + class_labels[label])
+    return class_labels[row[0]] + "".join(sorted(nbr_labels))
+
+
+def _weisfeiler_lehman_iterations(graph, digest_size, compat):
+    """
+    Yield the node classes, the class labels and the histogram of every iteration.
+
+    For ``compat=False``, the class labels are None and the histogram lists
+    the unique signatures with their counts appended.
+    For ``compat=True``, the signatures are hashed to the hexadecimal labels of
+    the networkx implementation, nodes with the same hexadecimal label share
+    a class and the histogram lists the (label, count) pairs sorted by label.
+    """
+    labels = graph.labels
+    n_labels = len(graph.node_alphabet)
+    class_labels = graph.node_alphabet
+    indptr, groups = _degree_groups(graph.src, len(labels))
+
+    while True:
+        labels, signatures, counts = _refine(labels, n_labels, graph, indptr, groups)
+        if compat:
+            hashed = [
+                _hash_label(
+                    _legacy_label(row, class_labels, graph.edge_alphabet, n_labels), digest_size
+                )
+                for rows in signatures
+                for row in rows.tolist()
+            ]
+            class_labels, merged = _codes(hashed)
+            labels = merged[labels]
+            n_labels = len(class_labels)
+            label_counts = np.bincount(
+                merged, weights=np.concatenate(counts) if counts else None, minlength=n_labels
+            )
+            histogram = list(zip(class_labels, label_counts.astype(int).tolist()))
+            yield labels, class_labels, histogram
         else:
-            prefix = "" if edge_attr is None else str(G[node][nbr][edge_attr])
-        label_list.append(prefix + node_labels[nbr])
-    return node_labels[node] + "".join(sorted(label_list))
+            histogram = []
+            for rows, row_counts in zip(signatures, counts):
+                histogram.extend(np.column_stack((rows, row_counts)).tolist())
+            n_labels = len(histogram)
+            yield labels, None, histogram
+
 
+def _histograms(graph, iterations, digest_size, compat):
+    """
+    Yield the histograms of the requested number of iterations.
 
-def weisfeiler_lehman_graph_hash(G, edge_attr=None, node_attr=None, iterations=3, digest_size=16):
+    If ``iterations`` is None, stop as soon as the number of node classes
+    does not change anymore, i.e., the partition of the nodes is stable.
+    The histogram of the iteration that confirms the stability is included,
+    such that the hash equals the one computed with a fixed number of iterations.
+    """
+    steps = _weisfeiler_lehman_iterations(graph, digest_size, compat)
+    if iterations is not None:
+        for _ in range(iterations):
+            yield next(steps)[2]
+        return
+
+    n_classes = len(graph.node_alphabet)
+    for _, _, histogram in steps:
+        yield histogram
+        if len(histogram) == n_classes:
+            return
+        n_classes = len(histogram)
+
+
+def _weisfeiler_lehman_digest(graph, iterations, digest_size, compat):
+    """Return the hash and the number of iterations that were performed."""
+    depth = 0
+    if compat:
+        subgraph_hash_counts = []
+        for histogram in _histograms(graph, iterations, digest_size, compat):
+            subgraph_hash_counts.extend(histogram)
+            depth += 1
+        # hash the final counter
+        return _hash_label(str(tuple(subgraph_hash_counts)), digest_size), depth
+
+    digest = blake2b(
+        repr((graph.node_alphabet, graph.edge_alphabet)).encode("utf8"), digest_size=digest_size
+    )
+    for histogram in _histograms(graph, iterations, digest_size, compat):
+        digest.update(repr(histogram).encode("ascii"))
+        depth += 1
+    return digest.hexdigest(), depth
+
+
+def weisfeiler_lehman_graph_hash(
+    G,
+    edge_attr=None,
+    node_attr=None,
+    iterations=3,
+    digest_size=16,
+    compat=False,
+    return_depth=False,
+):
     """Return Weisfeiler Lehman (WL) graph hash.
 
     The function iteratively aggregates and hashes neighbourhoods of each node.
@@ -109,16 +327,32 @@ def weisfeiler_lehman_graph_hash(G, edge_attr=None, node_attr=None, iterations=3
     node_attr: string, default=None
         The key in node attribute dictionary to be used for hashing.
         If None, and no edge_attr given, use the degrees of the nodes as labels.
-    iterations: int, default=3
+    iterations: int or None, default=3
         Number of neighbor aggregations to perform.
         Should be larger for larger graphs.
+        If None, the aggregation stops when the number of node classes
+        does not change anymore, i.e., the refinement has converged.
     digest_size: int, default=16
         Size (in bits) of blake2b hash digest to use for hashing node labels.
+    compat: bool, default=False
+        If True, hash the label of every node class in every iteration
+        to reproduce the digests of the networkx implementation.
+        Otherwise, only the final histogram of integer classes is hashed.
+        For simple graphs, both modes assign equal hashes to the same graphs,
+        but the digests differ. For multigraphs, the compat mode also reproduces
+        that only the first of several parallel edges between two nodes is
+        taken into account, whereas otherwise every parallel edge is counted.
+    return_depth: bool, default=False
+        If True, also return the number of iterations that were performed.
+        The hash is the same as the one obtained with ``iterations=depth``.
 
     Returns
     -------
     h : string
         Hexadecimal string corresponding to hash of the input graph.
+    depth : int
+        Number of iterations that were performed. Only returned
+        if ``return_depth`` is True.
 
     Examples
     --------
@@ -146,17 +380,15 @@ def weisfeiler_lehman_graph_hash(G, edge_attr=None, node_attr=None, iterations=3
 
     Omitting the `edge_attr` option, results in identical hashes.
 
-    >>> nx.weisfeiler_lehman_graph_hash(G1)
-    '7bc4dde9a09d0b94c5097b219891d81a'
-    >>> nx.weisfeiler_lehman_graph_hash(G2)
-    '7bc4dde9a09d0b94c5097b219891d81a'
+    >>> weisfeiler_lehman_graph_hash(G1) == weisfeiler_lehman_graph_hash(G2)
+    True
 
     With edge labels, the graphs are no longer assigned
     the same hash digest.
 
-    >>> nx.weisfeiler_lehman_graph_hash(G1, edge_attr="label")
+    >>> weisfeiler_lehman_graph_hash(G1, edge_attr="label", compat=True)
     'c653d85538bcf041d88c011f4f905f10'
-    >>> nx.weisfeiler_lehman_graph_hash(G2, edge_attr="label")
+    >>> weisfeiler_lehman_graph_hash(G2, edge_attr="label", compat=True)
     '3dcd84af1ca855d0eff3c978d88e7ec7'
 
     Notes
@@ -166,6 +398,12 @@ def weisfeiler_lehman_graph_hash(G, edge_attr=None, node_attr=None, iterations=3
 
     Similarity between hashes does not imply similarity between graphs.
 
+    With ``iterations=None``, the refinement of graphs that cannot be
+    distinguished by the WL test converges after the same number of iterations.
+    Such adaptive hashes can therefore be compared between graphs,
+    but not with hashes computed with a fixed number of iterations
+    (unless it equals the recorded depth).
+
     References
     ----------
     .. [1] Shervashidze, Nino, Pascal Schweitzer, Erik Jan Van Leeuwen,
@@ -178,30 +416,265 @@ def weisfeiler_lehman_graph_hash(G, edge_attr=None, node_attr=None, iterations=3
     weisfeiler_lehman_subgraph_hashes
     """
 
-    def weisfeiler_lehman_step(G, labels, edge_attr=None):
-        """
-        Apply neighborhood aggregation to each node
-        in the graph.
-        Computes a dictionary with labels for each node.
-        """
-        new_labels = {}
-        for node in G.nodes():
-            label = _neighborhood_aggregate(G, node, labels, edge_attr=edge_attr)
-            new_labels[node] = _hash_label(label, digest_size)
-        return new_labels
+    graph = _integer_graph(G, edge_attr=edge_attr, node_attr=node_attr, compat=compat)
+    digest, depth = _weisfeiler_lehman_digest(graph, iterations, digest_size, compat)
+    return (digest, depth) if return_depth else digest
 
-    # set initial node labels
-    node_labels = _init_node_labels(G, edge_attr, node_attr)
 
-    subgraph_hash_counts = []
-    for _ in range(iterations):
-        node_labels = weisfeiler_lehman_step(G, node_labels, edge_attr=edge_attr)
-        counter = Counter(node_labels.values())
-        # sort the counter, extend total counts
-        subgraph_hash_counts.extend(sorted(counter.items(), key=lambda x: x[0]))
+def _ranks_by_graph(values, graph_ids, n_graphs):
+    """
+    Rank string values within every graph, as `_codes` does for a single graph.
+
+    Returns the alphabet of every graph, the rank of every value in the alphabet of
+    its graph and the rank of every value in the alphabet of all graphs.
+    """
+    alphabet, codes = _codes(values) if len(values) else ([], np.zeros(0, np.int64))
+    size = max(len(alphabet), 1)
+    keys, inverse = np.unique(graph_ids * size + codes, return_inverse=True)
+    owners, keys = np.divmod(keys, size)
+    bounds = np.searchsorted(owners, np.arange(n_graphs + 1))
+    ranks = inverse.reshape(-1) - bounds[graph_ids]
+    keys = keys.tolist()
+    alphabets = [
+        [alphabet[key] for key in keys[bounds[i] : bounds[i + 1]]] for i in range(n_graphs)
+    ]
+    return alphabets, ranks, codes
+
+
+def _integer_union(graphs, compat):
+    """
+    Translate graphs given as `_graph_arrays` into one integer graph with offset node indices.
+
+    Returns the union, the graph of every node and the node and edge alphabets of every
+    graph. With ``compat=True``, the node and edge classes are ranks in the alphabets
+    of all graphs. Otherwise, they are the ranks in the alphabets of the own graph,
+    as for `_integer_graph_from_arrays`, since the hashes depend on them.
+    """
+    n_graphs = len(graphs)
+    sizes = np.array([len(node_labels) for _, node_labels, *_ in graphs], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    graph_ids = np.repeat(np.arange(n_graphs), sizes)
+    node_labels = np.concatenate([np.asarray(labels, dtype=str) for _, labels, *_ in graphs])
+    node_alphabets, labels, node_codes = _ranks_by_graph(node_labels, graph_ids, n_graphs)
+
+    all_src = []
+    all_dst = []
+    all_edge_labels = []
+    for (_, _, src, dst, edge_labels, directed), offset in zip(graphs, offsets):
+        src = np.asarray(src, dtype=np.int64).reshape(-1) + offset
+        dst = np.asarray(dst, dtype=np.int64).reshape(-1) + offset
+        edge_labels = np.full(len(src), "") if edge_labels is None else np.asarray(edge_labels)
+        if not directed:
+            not_loop = src != dst
+            src, dst = np.concatenate((src, dst[not_loop])), np.concatenate((dst, src[not_loop]))
+            edge_labels = np.concatenate((edge_labels, edge_labels[not_loop]))
+        all_src.append(src)
+        all_dst.append(dst)
+        all_edge_labels.append(edge_labels.astype(str))
+    src = np.concatenate(all_src)
+    dst = np.concatenate(all_dst)
+    edge_labels = np.concatenate(all_edge_labels)
+    edge_alphabets, edges, edge_codes = _ranks_by_graph(edge_labels, graph_ids[src], n_graphs)
+
+    node_alphabet = edge_alphabet = None
+    if compat:
+        node_alphabet = _codes(node_labels)[0] if len(node_labels) else []
+        edge_alphabet = _codes(edge_labels)[0] if len(edge_labels) else []
+        labels, edges = node_codes, edge_codes
+    order = np.argsort(src, kind="stable")
+    union = _IntegerGraph(
+        list(range(len(labels))),
+        labels.astype(np.int64),
+        node_alphabet,
+        src[order],
+        dst[order],
+        edges[order].astype(np.int64),
+        edge_alphabet,
+    )
+    return union, graph_ids, node_alphabets, edge_alphabets
+
+
+def _batch_refinements(union, graph_ids, n_labels, digest_size, compat):
+    """
+    Yield the histograms of every graph for every iteration of the refinement of their union.
+
+    The histograms are the ones of `_weisfeiler_lehman_iterations` for the single graphs.
+    With ``compat=True``, the classes are shared by all graphs, such that every
+    distinct signature is only hashed once. Otherwise, the graph is the first
+    column of the signatures and the classes are ranked within every graph.
+    """
+    n_graphs = len(n_labels)
+    labels = union.labels
+    indptr, groups = _degree_groups(union.src, len(labels))
+
+    if compat:
+        steps = _weisfeiler_lehman_iterations(union, digest_size, compat=True)
+        for labels, class_labels, _ in steps:
+            keys, counts = np.unique(graph_ids * len(class_labels) + labels, return_counts=True)
+            owners, keys = np.divmod(keys, len(class_labels))
+            bounds = np.searchsorted(owners, np.arange(n_graphs + 1))
+            pairs = list(zip((class_labels[key] for key in keys.tolist()), counts.tolist()))
+            yield [pairs[bounds[i] : bounds[i + 1]] for i in range(n_graphs)]
+
+    while True:
+        codes = union.edges * n_labels[graph_ids[union.dst]] + labels[union.dst]
+        owners = []
+        rows = []
+        inverses = []
+        for degree, group in groups:
+            columns = np.sort(codes[indptr[group][:, None] + np.arange(degree)], axis=1)
+            signatures, inverse, counts = np.unique(
+                np.column_stack((graph_ids[group], labels[group], columns)),
+                axis=0,
+                return_inverse=True,
+                return_counts=True,
+            )
+            inverses.append((group, len(rows) + inverse.reshape(-1)))
+            owners.append(signatures[:, 0])
+            rows.extend(np.column_stack((signatures[:, 1:], counts)).tolist())
+        owners = np.concatenate(owners) if owners else np.zeros(0, np.int64)
+        # order the signatures by graph, degree and signature
+        order = np.argsort(owners, kind="stable")
+        n_labels = np.bincount(owners, minlength=n_graphs)
+        bounds = np.concatenate(([0], np.cumsum(n_labels)))
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order)) - bounds[owners[order]]
+        new_labels = np.empty_like(labels)
+        for group, inverse in inverses:
+            new_labels[group] = ranks[inverse]
+        labels = new_labels
+        order = order.tolist()
+        yield [[rows[k] for k in order[bounds[i] : bounds[i + 1]]] for i in range(n_graphs)]
+
+
+def weisfeiler_lehman_graph_hashes(
+    graphs,
+    edge_attr=None,
+    node_attr=None,
+    iterations=3,
+    digest_size=16,
+    compat=False,
+    return_depth=False,
+):
+    """Return the Weisfeiler Lehman (WL) graph hashes of many graphs.
 
-    # hash the final counter
-    return _hash_label(str(tuple(subgraph_hash_counts)), digest_size)
+    The graphs are refined together as one disjoint union, i.e., with one
+    ``np.unique`` call per node degree and iteration for all graphs.
+    The hashes are identical to the ones of `weisfeiler_lehman_graph_hash`.
+    This is much faster for many small graphs, e.g., molecules.
+
+    Parameters
+    ----------
+    graphs: iterable of graphs
+        The graphs to be hashed.
+    edge_attr: string, default=None
+        The key in edge attribute dictionary to be used for hashing.
+    node_attr: string, default=None
+        The key in node attribute dictionary to be used for hashing.
+    iterations: int or None, default=3
+        Number of neighbor aggregations to perform.
+        If None, aggregate every graph until its partition of the nodes is stable.
+    digest_size: int, default=16
+        Size (in bits) of blake2b hash digest to use for hashing node labels.
+    compat: bool, default=False
+        If True, reproduce the digests of the networkx implementation.
+    return_depth: bool, default=False
+        If True, also return the number of iterations that were performed.
+
+    Returns
+    -------
+    hashes : list
+        Hash of every graph, or tuples of the hash and the number of iterations
+        if ``return_depth`` is True.
+
+    See also
+    --------
+    weisfeiler_lehman_graph_hash
+    """
+    graphs = [_graph_arrays(G, edge_attr, node_attr, compat) for G in graphs]
+    if not graphs:
+        return []
+    union, graph_ids, node_alphabets, edge_alphabets = _integer_union(graphs, compat)
+    n_classes = [len(alphabet) for alphabet in node_alphabets]
+    depths = [0] * len(graphs)
+    active = set(range(len(graphs))) if iterations != 0 else set()
+    if compat:
+        counts = [[] for _ in graphs]
+    else:
+        digests = [
+            blake2b(repr(alphabets).encode("utf8"), digest_size=digest_size)
+            for alphabets in zip(node_alphabets, edge_alphabets)
+        ]
+
+    refinements = _batch_refinements(
+        union, graph_ids, np.array(n_classes, dtype=np.int64), digest_size, compat
+    )
+    while active:
+        histograms = next(refinements)
+        for i in list(active):
+            if compat:
+                counts[i].extend(histograms[i])
+            else:
+                digests[i].update(repr(histograms[i]).encode("ascii"))
+            depths[i] += 1
+            if iterations is None:
+                if len(histograms[i]) == n_classes[i]:
+                    active.discard(i)
+                n_classes[i] = len(histograms[i])
+            elif depths[i] == iterations:
+                active.discard(i)
+
+    if compat:
+        hashes = [_hash_label(str(tuple(histogram)), digest_size) for histogram in counts]
+    else:
+        hashes = [digest.hexdigest() for digest in digests]
+    return list(zip(hashes, depths)) if return_depth else hashes
+
+
+def weisfeiler_lehman_array_hash(
+    src, dst, node_labels, edge_labels=None, directed=True, iterations=3, digest_size=16
+):
+    """Return the Weisfeiler Lehman (WL) graph hash of a graph given as edge arrays.
+
+    This skips the construction of a networkx graph. Every edge is counted,
+    i.e., parallel edges with different labels are all taken into account.
+
+    Parameters
+    ----------
+    src: array-like of int
+        Index of the source node of every edge.
+    dst: array-like of int
+        Index of the target node of every edge.
+    node_labels: array-like
+        Label of every node, e.g., the species or atomic numbers.
+    edge_labels: array-like, default=None
+        Label of every edge, e.g., an integer encoding of the voltage.
+        If None, edge labels are ignored.
+    directed: bool, default=True
+        If True, only the targets of the edges leaving a node are aggregated.
+        Otherwise, every edge is aggregated from both ends.
+    iterations: int or None, default=3
+        Number of neighbor aggregations to perform.
+        If None, aggregate until the partition of the nodes is stable.
+    digest_size: int, default=16
+        Size (in bits) of blake2b hash digest.
+
+    Returns
+    -------
+    h : string
+        Hexadecimal string corresponding to hash of the input graph.
+        For string labels, it is the same as the hash of `weisfeiler_lehman_graph_hash`
+        for the equivalent networkx graph.
+
+    See also
+    --------
+    weisfeiler_lehman_graph_hash
+    """
+    node_labels = np.asarray(node_labels)
+    graph = _integer_graph_from_arrays(
+        list(range(len(node_labels))), node_labels, src, dst, edge_labels, directed
+    )
+    return _weisfeiler_lehman_digest(graph, iterations, digest_size, compat=False)[0]
 
 
 def weisfeiler_lehman_subgraph_hashes(
@@ -324,26 +797,47 @@ def weisfeiler_lehman_subgraph_hashes(
     weisfeiler_lehman_graph_hash
     """
 
-    def weisfeiler_lehman_step(G, labels, node_subgraph_hashes, edge_attr=None):
-        """
-        Apply neighborhood aggregation to each node
-        in the graph.
-        Computes a dictionary with labels for each node.
-        Appends the new hashed label to the dictionary of subgraph hashes
-        originating from and indexed by each node in G
-        """
-        new_labels = {}
-        for node in G.nodes():
-            label = _neighborhood_aggregate(G, node, labels, edge_attr=edge_attr)
-            hashed_label = _hash_label(label, digest_size)
-            new_labels[node] = hashed_label
-            node_subgraph_hashes[node].append(hashed_label)
-        return new_labels
-
-    node_labels = _init_node_labels(G, edge_attr, node_attr)
+    graph = _integer_graph(G, edge_attr=edge_attr, node_attr=node_attr, compat=True)
+    steps = _weisfeiler_lehman_iterations(graph, digest_size, compat=True)
 
     node_subgraph_hashes = defaultdict(list)
-    for _ in range(iterations):
-        node_labels = weisfeiler_lehman_step(G, node_labels, node_subgraph_hashes, edge_attr)
+    for labels, class_labels, _ in (next(steps) for _ in range(iterations)):
+        for node, label in zip(graph.nodes, labels.tolist()):
+            node_subgraph_hashes[node].append(class_labels[label])
 
     return dict(node_subgraph_hashes)
+
+
+def weisfeiler_lehman_subgraph_hash_counts(
+    G, edge_attr=None, node_attr=None, iterations=3, digest_size=16
+):
+    """
+    Return the number of nodes with each subgraph hash, for every depth.
+
+    The hashes are the ones of `weisfeiler_lehman_subgraph_hashes`, but only
+    their counts are kept, i.e., no list of hashes is built for every node.
+
+    Parameters
+    ----------
+    G: graph
+        The graph to be hashed.
+    edge_attr: string, default=None
+        The key in edge attribute dictionary to be used for hashing.
+    node_attr: string, default=None
+        The key in node attribute dictionary to be used for hashing.
+    iterations: int, default=3
+        Number of neighbor aggregations to perform.
+    digest_size: int, default=16
+        Size (in bits) of blake2b hash digest to use for hashing node labels.
+
+    Returns
+    -------
+    histograms : list
+        One list of (hash, count) pairs sorted by hash for every depth.
+
+    See also
+    --------
+    weisfeiler_lehman_subgraph_hashes
+    """
+    graph = _integer_graph(G, edge_attr=edge_attr, node_attr=node_attr, compat=True)
+    return list(_histograms(graph, iterations, digest_size, compat=True))
@@ -0,0 +1,264 @@
+"""Process pool that kills and replaces workers that exceed time or memory limits.
+
+:py:class:`concurrent.futures.ProcessPoolExecutor` cannot cancel a running task.
+Hence, one structure that hangs, or that makes the worker use all the memory of the node,
+stalls the whole batch. Here, every worker processes one chunk of tasks at a time
+and reports every result as soon as it is done. The parent process watches the time
+since the last report and the resident memory of every worker, and replaces workers
+that exceed the limits. The remaining tasks of the chunk are put back into the queue.
+"""
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+__all__ = ("SupervisedPool", "supervised_imap_unordered")
+
+#: Interval in seconds in which the limits are checked.
+_POLL_INTERVAL = 0.1
+
+
+def _rss(pid: int) -> Optional[int]:
+    """Resident set size of a process in bytes, None if it cannot be determined."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _worker_loop(connection, func: Callable) -> None:
+    while True:
+        chunk = connection.recv()
+        if chunk is None:
+            break
+        for index, args in chunk:
+            try:
+                result, reason = func(*args), None
+            except Exception as e:
+                result, reason = None, f"error: {type(e).__name__}: {e}"
+            connection.send((index, result, reason))
+
+
+class _Worker:
+    __slots__ = ("process", "connection", "pending", "n_tasks", "last_report")
+
+    def __init__(self, context, func: Callable):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop, args=(child_connection, func), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        self.pending = deque()
+        self.n_tasks = 0
+        self.last_report = time.monotonic()
+
+    def submit(self, chunk: List[Tuple[int, Any]]) -> None:
+        self.pending.extend(chunk)
+        self.last_report = time.monotonic()
+        self.connection.send(chunk)
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SupervisedPool:
+    """Pool of worker processes that call a function on chunks of tasks.
+
+    Chunks are processed in the order in which they are submitted.
+    Every task is a tuple of an index, that is passed through, and the arguments
+    of the function. Results are tuples of the index, the return value of the
+    function (None if it failed) and the reason of the failure
+    (``"timeout"``, ``"memory"``, ``"crashed"`` or ``"error: ..."``, None on success).
+
+    Args:
+        func (Callable): Function to call, must be picklable.
+        n_workers (int): Number of worker processes.
+        timeout (float, optional): Maximum number of seconds for one task.
+            Defaults to None, in which case there is no limit.
+        max_memory (int, optional): Maximum resident memory of a worker in bytes.
+            Defaults to None, in which case there is no limit.
+        max_tasks_per_worker (int, optional): Number of tasks after which a worker is replaced
+            by a fresh process once its current chunk is done.
+            Defaults to None, in which case workers live until the pool is closed.
+    """
+
+    def __init__(
+        self,
+        func: Callable,
+        n_workers: int,
+        timeout: Optional[float] = None,
+        max_memory: Optional[int] = None,
+        max_tasks_per_worker: Optional[int] = None,
+    ):
+        if max_memory is not None and _rss(os.getpid()) is None:
+            logger.warning("Cannot determine the memory of processes, memory limit is ignored")
+            max_memory = None
+        self.func = func
+        self.n_workers = max(1, n_workers)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._context = multiprocessing.get_context()
+        self._queue = deque()
+        self._workers = []
+
+    def submit(self, chunk: Sequence[Tuple[int, tuple]]) -> None:
+        """Queue a chunk of tasks."""
+        if chunk:
+            self._queue.append(list(chunk))
+            self._dispatch()
+
+    @property
+    def busy(self) -> bool:
+        """Whether there are tasks that are queued or running."""
+        return bool(self._queue) or any(worker.pending for worker in self._workers)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether there are enough queued chunks to keep all workers busy."""
+        return len(self._queue) >= self.n_workers
+
+    def get(self) -> List[Tuple[int, Any, Optional[str]]]:
+        """Wait for results and return them.
+
+        Returns after at most the poll interval if limits are set. Hence, the list
+        can be empty even if tasks are running.
+        """
+        busy = [worker for worker in self._workers if worker.pending]
+        if not busy:
+            return []
+        limited = self.timeout is not None or self.max_memory is not None
+        ready = wait(
+            [worker.connection for worker in busy], timeout=_POLL_INTERVAL if limited else None
+        )
+        now = time.monotonic()
+        results = []
+        for worker in busy:
+            if worker.connection in ready:
+                try:
+                    index, result, reason = worker.connection.recv()
+                except (EOFError, OSError):
+                    results.append(self._replace(worker, "crashed"))
+                    continue
+                worker.pending.popleft()
+                worker.n_tasks += 1
+                worker.last_report = now
+                results.append((index, result, reason))
+            elif self.timeout is not None and now - worker.last_report > self.timeout:
+                results.append(self._replace(worker, "timeout"))
+            elif self.max_memory is not None and (_rss(worker.process.pid) or 0) > self.max_memory:
+                results.append(self._replace(worker, "memory"))
+        self._dispatch()
+        return results
+
+    def close(self) -> None:
+        """Stop all workers."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def __enter__(self) -> "SupervisedPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _dispatch(self) -> None:
+        for i, worker in enumerate(self._workers):
+            if not self._queue:
+                return
+            if worker.pending:
+                continue
+            if (
+                self.max_tasks_per_worker is not None
+                and worker.n_tasks >= self.max_tasks_per_worker
+            ):
+                worker.stop()
+                worker = self._workers[i] = _Worker(self._context, self.func)
+            worker.submit(self._queue.popleft())
+        while self._queue and len(self._workers) < self.n_workers:
+            worker = _Worker(self._context, self.func)
+            self._workers.append(worker)
+            worker.submit(self._queue.popleft())
+
+    def _replace(self, worker: _Worker, reason: str) -> Tuple[int, Any, str]:
+        index, _ = worker.pending.popleft()
+        logger.warning(f"Replacing worker {worker.process.pid} ({reason}) for task {index}")
+        worker.kill()
+        if worker.pending:
+            self._queue.appendleft(list(worker.pending))
+        self._workers[self._workers.index(worker)] = _Worker(self._context, self.func)
+        return index, None, reason
+
+
+def supervised_imap_unordered(
+    func: Callable,
+    chunks: Iterable[Sequence[Tuple[int, tuple]]],
+    n_workers: int,
+    timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+    max_tasks_per_worker: Optional[int] = None,
+) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """Call a function on chunks of arguments in worker processes and yield results as they finish.
+
+    The chunks are consumed lazily, i.e., only if there are idle workers.
+
+    Args:
+        func (Callable): Function to call, must be picklable.
+        chunks (Iterable[Sequence[Tuple[int, tuple]]]): Chunks of tasks, every task is
+            a tuple of an index (that is passed through) and the arguments of ``func``.
+            The chunks are processed in the given order.
+        n_workers (int): Number of worker processes.
+        timeout (float, optional): Maximum number of seconds for one task.
+            Defaults to None, in which case there is no limit.
+        max_memory (int, optional): Maximum resident memory of a worker in bytes.
+            Defaults to None, in which case there is no limit.
+        max_tasks_per_worker (int, optional): Number of tasks after which a worker is replaced
+            by a fresh process once its current chunk is done.
+            Defaults to None, in which case workers live until all tasks are done.
+
+    Yields:
+        Tuple[int, Any, Optional[str]]: Index of the task, return value of ``func``
+            (None if it failed) and the reason of the failure
+            (``"timeout"``, ``"memory"``, ``"crashed"`` or ``"error: ..."``, None on success).
+    """
+    chunks = iter(chunks)
+    with SupervisedPool(func, n_workers, timeout, max_memory, max_tasks_per_worker) as pool:
+        exhausted = False
+        while True:
+            while not exhausted and not pool.saturated:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pool.submit(chunk)
+            if exhausted and not pool.busy:
+                break
+            yield from pool.get()
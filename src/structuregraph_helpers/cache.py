@@ -0,0 +1,210 @@
+"""Persistent, content-addressed cache for structure hashes.
+
+The hashes are stored in a SQLite database. The key of every entry is derived from
+the SHA-256 digest of the input file, the local environment method,
+the ``lqg`` flag, the hash kind, and the package and hash algorithm versions.
+Changing any of those leads to a cache miss. Hence, outdated entries
+are never returned and we do not need to invalidate the cache manually.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+from loguru import logger
+
+from .hash import HASH_VERSION
+from .version import VERSION
+
+__all__ = ("HashCache", "default_cache_path", "file_digest")
+
+
+def default_cache_path() -> Path:
+    """Return the default location of the hash cache.
+
+    This is ``$XDG_CACHE_HOME/structuregraph_helpers/hashes.sqlite``,
+    with ``~/.cache`` as fallback for ``XDG_CACHE_HOME``.
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(cache_home) / "structuregraph_helpers" / "hashes.sqlite"
+
+
+def file_digest(path: Union[str, os.PathLike], chunk_size: int = 1 << 20) -> str:
+    """Compute the SHA-256 digest of the contents of a file.
+
+    Args:
+        path (Union[str, os.PathLike]): Path to the file.
+        chunk_size (int): Number of bytes read at once. Defaults to 1 MiB.
+
+    Returns:
+        str: Hex digest of the file contents.
+    """
+    sha = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class HashCache:
+    """On-disk cache of structure hashes, keyed by the contents of the input file.
+
+    Entries that have not been read or written for the longest time are evicted
+    first once the cache holds more than ``max_entries`` hashes. The access times
+    of cache hits are kept in memory and written in one transaction when hashes
+    are evicted or the cache is closed, such that lookups do not write to the database.
+
+    Args:
+        path (Union[str, os.PathLike], optional): Path to the SQLite database.
+            Defaults to None, in which case :py:func:`default_cache_path` is used.
+        max_entries (int, optional): Maximum number of hashes to keep.
+            Defaults to None, in which case the size of the cache is not bounded.
+
+    Example:
+        >>> with HashCache("hashes.sqlite", max_entries=1_000_000) as cache:
+        ...     digest = file_digest("structure.cif")
+        ...     cache.set(digest, {"decorated_graph_hash": "abc"}, method="vesta", lqg=False)
+        ...     cache.get(digest, ["decorated_graph_hash"], method="vesta", lqg=False)
+        {'decorated_graph_hash': 'abc'}
+    """
+
+    def __init__(
+        self, path: Optional[Union[str, os.PathLike]] = None, max_entries: Optional[int] = None
+    ):
+        self.path = Path(path) if path is not None else default_cache_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._accessed = {}
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS hashes_last_access ON hashes (last_access)"
+            )
+
+    @staticmethod
+    def key(digest: str, kind: str, method: str, lqg: bool) -> str:
+        """Return the cache key of one hash of a file.
+
+        Args:
+            digest (str): Digest of the file contents, see :py:func:`file_digest`.
+            kind (str): Hash kind, see :py:data:`~structuregraph_helpers.hash.HASH_KINDS`.
+            method (str): Local environment method used to create the structure graph.
+            lqg (bool): Whether the hash is computed on the labeled quotient graph.
+
+        Returns:
+            str: Cache key.
+        """
+        return f"{digest}:{method}:{int(lqg)}:{kind}:{VERSION}:{HASH_VERSION}"
+
+    def get(self, digest: str, kinds: Iterable[str], method: str, lqg: bool) -> Dict[str, str]:
+        """Look up the hashes of a file.
+
+        Args:
+            digest (str): Digest of the file contents, see :py:func:`file_digest`.
+            kinds (Iterable[str]): Hash kinds to look up.
+            method (str): Local environment method used to create the structure graph.
+            lqg (bool): Whether the hash is computed on the labeled quotient graph.
+
+        Returns:
+            Dict[str, str]: Hashes found in the cache, missing kinds are not included.
+        """
+        keys = {self.key(digest, kind, method, lqg): kind for kind in kinds}
+        if not keys:
+            return {}
+        placeholders = ", ".join("?" * len(keys))
+        rows = self._connection.execute(
+            f"SELECT key, value FROM hashes WHERE key IN ({placeholders})",  # noqa: S608
+            tuple(keys),
+        ).fetchall()
+        now = time.time()
+        for key, _ in rows:
+            self._accessed[key] = now
+        return {keys[key]: value for key, value in rows}
+
+    def set(self, digest: str, hashes: Dict[str, str], method: str, lqg: bool) -> None:
+        """Store the hashes of a file.
+
+        Hashes that are not strings, e.g., NaN for structures
+        for which the hashing failed, are not stored.
+
+        Args:
+            digest (str): Digest of the file contents, see :py:func:`file_digest`.
+            hashes (Dict[str, str]): Mapping of hash kind to hash.
+            method (str): Local environment method used to create the structure graph.
+            lqg (bool): Whether the hash is computed on the labeled quotient graph.
+        """
+        now = time.time()
+        rows = [
+            (self.key(digest, kind, method, lqg), value, now)
+            for kind, value in hashes.items()
+            if isinstance(value, str)
+        ]
+        for key, *_ in rows:
+            self._accessed.pop(key, None)
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO hashes (key, value, last_access) VALUES (?, ?, ?)", rows
+            )
+
+    def flush(self) -> None:
+        """Write the access times of the cache hits since the last flush."""
+        if not self._accessed:
+            return
+        with self._connection:
+            self._connection.executemany(
+                "UPDATE hashes SET last_access = ? WHERE key = ?",
+                [(last_access, key) for key, last_access in self._accessed.items()],
+            )
+        self._accessed = {}
+
+    def evict(self, max_entries: Optional[int] = None) -> int:
+        """Remove the least recently used hashes until at most ``max_entries`` are left.
+
+        Args:
+            max_entries (int, optional): Maximum number of hashes to keep.
+                Defaults to None, in which case the ``max_entries``
+                of the cache is used.
+
+        Returns:
+            int: Number of removed hashes.
+        """
+        self.flush()
+        max_entries = self.max_entries if max_entries is None else max_entries
+        if max_entries is None:
+            return 0
+        excess = len(self) - max_entries
+        if excess <= 0:
+            return 0
+        with self._connection:
+            self._connection.execute(
+                "DELETE FROM hashes WHERE key IN "
+                "(SELECT key FROM hashes ORDER BY last_access LIMIT ?)",
+                (excess,),
+            )
+        logger.debug(f"Evicted {excess} hashes from {self.path}")
+        return excess
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"HashCache({str(self.path)!r}, max_entries={self.max_entries})"
+
+    def close(self) -> None:
+        """Write the access times, evict hashes beyond ``max_entries`` and close the database."""
+        self.evict()
+        self._connection.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
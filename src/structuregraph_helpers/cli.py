@@ -1,104 +1,657 @@
 """Command-line interface for StructureGraphHelpers."""
-import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
 import os
 import pprint
-from collections import OrderedDict
-from functools import partial
-from glob import glob
+from collections import Counter, OrderedDict
+from operator import itemgetter
 from pathlib import Path
-from typing import Union
+from typing import (
+    Any,
+    Container,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import click
 import numpy as np
 from loguru import logger
 from pymatgen.core import Structure
 
-from structuregraph_helpers.create import get_structure_graph
-from structuregraph_helpers.hash import (
-    decorated_graph_hash,
-    decorated_no_leaf_hash,
-    decorated_scaffold_hash,
-    undecorated_graph_hash,
-    undecorated_no_leaf_hash,
-    undecorated_scaffold_hash,
+from structuregraph_helpers._pool import SupervisedPool
+from structuregraph_helpers.cache import HashCache, default_cache_path, file_digest
+from structuregraph_helpers.create import get_compact_structure_graph
+from structuregraph_helpers.hash import HASH_KINDS, compute_hashes
+from structuregraph_helpers.index import PREFILTER_KEYS, HashIndex, prefilter_keys
+from structuregraph_helpers.sources import (
+    StructureSource,
+    find_structures,
+    iter_archive,
+    iter_structure_sources,
+    read_structure,
 )
 from structuregraph_helpers.utils import dump_json
 
-__all__ = ["create_hashes_for_structure"]
+__all__ = [
+    "create_hashes_for_structure",
+    "compute_hashes_for_folder",
+    "iter_hashes_for_folder",
+    "in_shard",
+    "index_folder",
+    "merge_hash_files",
+]
+
+_kinds_option = click.option(
+    "--kind",
+    "kinds",
+    multiple=True,
+    type=click.Choice(HASH_KINDS),
+    help="Hash to compute. Can be given multiple times. Defaults to all hashes.",
+)
+
+#: Local environment method used to create the structure graphs.
+_METHOD = "vesta"
+
+#: Number of members of archives that are sent to a worker at once.
+_ARCHIVE_CHUNK_SIZE = 32
+
+
+def _cache_options(func):
+    """Add the options that control the hash cache to a command."""
+    func = click.option(
+        "--cache-max-entries",
+        type=int,
+        default=None,
+        help="Evict the least recently used hashes beyond this number.",
+    )(func)
+    func = click.option(
+        "--no-cache", is_flag=True, default=False, help="Do not use the hash cache."
+    )(func)
+    func = click.option(
+        "--cache",
+        "cache_path",
+        type=click.Path(dir_okay=False),
+        default=None,
+        help=f"Path to the hash cache. Defaults to {default_cache_path()}.",
+    )(func)
+    return func
+
+
+def _open_cache(
+    cache_path: Optional[os.PathLike], no_cache: bool, max_entries: Optional[int]
+) -> Optional[HashCache]:
+    if no_cache:
+        return None
+    return HashCache(cache_path, max_entries=max_entries)
 
 
 def create_hashes_for_structure(
-    structure: Union[Structure, os.PathLike], lqg: bool = False
+    structure: Union[Structure, os.PathLike],
+    lqg: bool = False,
+    kinds: Optional[Iterable[str]] = None,
+    cache: Optional[HashCache] = None,
+    method: str = _METHOD,
 ) -> dict:
     """Create hashes for a Structure.
 
     Args:
         structure (Union[Structure, os.PathLike]): pymatgen Structure
         lqg (bool): If True, computed the hash on the labeled quotient graph.
+        kinds (Iterable[str], optional): Hashes to compute, any of
+            :py:data:`~structuregraph_helpers.hash.HASH_KINDS`.
+            Defaults to None, in which case all hashes are computed.
+        cache (HashCache, optional): Cache to look up and store the hashes.
+            Only used if ``structure`` is a path. Defaults to None.
+        method (str): Local environment method used to create the structure graph.
+            Defaults to "vesta".
 
     Returns:
         dict: Dictionary of hashes for the Structure.
     """
-    hashes = OrderedDict()
-    hash_types = [
-        ("undecorated_graph_hash", undecorated_graph_hash),
-        ("undecorated_no_leaf_hash", undecorated_no_leaf_hash),
-        ("undecorated_scaffold_hash", undecorated_scaffold_hash),
-        ("decorated_graph_hash", decorated_graph_hash),
-        ("decorated_no_leaf_hash", decorated_no_leaf_hash),
-        ("decorated_scaffold_hash", decorated_scaffold_hash),
-    ]
-    try:
-        if isinstance(structure, (os.PathLike, str, Path)):
-            structure = Structure.from_file(structure)
+    kinds = HASH_KINDS if not kinds else tuple(kinds)
+    if cache is None or not isinstance(structure, (os.PathLike, str, Path)):
+        return _try_create_hashes_for_structure(structure, lqg, kinds, method)
 
-        sg = get_structure_graph(structure)
+    digest = file_digest(structure)
+    hashes = cache.get(digest, kinds, method=method, lqg=lqg)
+    missing = tuple(kind for kind in kinds if kind not in hashes)
+    if missing:
+        computed = _try_create_hashes_for_structure(structure, lqg, missing, method)
+        cache.set(digest, computed, method=method, lqg=lqg)
+        hashes.update(computed)
+    return OrderedDict((kind, hashes[kind]) for kind in kinds)
 
-        for name, hash_func in hash_types:
-            hashes[name] = hash_func(sg, lqg=lqg)
+
+def _try_create_hashes_for_structure(
+    structure: Union[Structure, os.PathLike], lqg: bool, kinds: Iterable[str], method: str
+) -> dict:
+    try:
+        hashes = _create_hashes_for_structure(structure, lqg, kinds, method)
     except Exception as e:
         logger.error(f"Error {e} computing hashes for {structure}")
-        for name, hash_func in hash_types:
-            hashes[name] = np.nan
+        hashes = OrderedDict((kind, np.nan) for kind in kinds)
 
     return hashes
 
 
-def compute_hashes_for_folder(
-    folder: os.PathLike, outname: os.PathLike, lqg: bool = False, n_jobs: int = 1
+def _create_hashes_for_structure(
+    structure: Union[Structure, os.PathLike], lqg: bool, kinds: Iterable[str], method: str
 ) -> dict:
-    """Create hashes for all CIF files in a folder.
+    if isinstance(structure, (os.PathLike, str, Path)):
+        structure = Structure.from_file(structure)
+
+    sg = get_compact_structure_graph(structure, method=method)
+    hash_kinds = [kind for kind in kinds if kind not in PREFILTER_KEYS]
+    hashes = compute_hashes(sg, kinds=hash_kinds, lqg=lqg)
+    if len(hash_kinds) < len(kinds):
+        hashes.update(prefilter_keys(sg, lqg))
+        hashes = OrderedDict((kind, hashes[kind]) for kind in kinds)
+    return hashes
+
+
+def iter_hashes_for_folder(
+    folder: os.PathLike,
+    lqg: bool = False,
+    n_jobs: int = 1,
+    kinds: Optional[Iterable[str]] = None,
+    cache: Optional[HashCache] = None,
+    skip: Optional[Container[str]] = None,
+    method: str = _METHOD,
+    timeout: Optional[float] = None,
+    max_memory: Optional[int] = None,
+    max_tasks_per_worker: Optional[int] = None,
+    fallback_method: Optional[str] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    recursive: bool = True,
+) -> Iterator[Tuple[str, dict]]:
+    """Create hashes for all structures in a folder and yield them as soon as they are done.
+
+    All structure files, including the ones in subfolders and archives, are hashed,
+    see :py:mod:`~structuregraph_helpers.sources` for the recognized files
+    and the names of the structures.
+
+    Hashes found in the cache are yielded as soon as they are found, all others
+    in the order in which they are completed. The file size is used as estimate
+    for the cost of a structure and the largest files are started first.
+    Archives are not extracted. Their members are read one after another
+    (once the workers are busy with all other files) and sent to the workers as bytes.
+
+    Workers that exceed ``timeout`` or ``max_memory`` are killed and replaced.
+    The hashes of the structure they were working on are NaN, and the reason
+    (``"timeout"``, ``"memory"``, ``"crashed"`` or ``"error: ..."``) is reported
+    under the ``"skipped"`` key. If a ``fallback_method`` is given, such structures
+    are retried with it and the ``"method"`` key is set for successful retries.
 
     Args:
-        folder (os.PathLike): Path to folder containing CIF files.
-        outname (os.PathLike): Path to output file.
+        folder (os.PathLike): Path to folder containing structure files.
         lqg (bool): If True, computed the hash on the labeled quotient graph.
         n_jobs (int): Number of jobs to run in parallel.
+        kinds (Iterable[str], optional): Hashes to compute, any of
+            :py:data:`~structuregraph_helpers.hash.HASH_KINDS` and
+            :py:data:`~structuregraph_helpers.index.PREFILTER_KEYS`.
+            Defaults to None, in which case all hashes are computed.
+        cache (HashCache, optional): Cache to look up and store the hashes.
+            Only the files with hashes missing from the cache are parsed.
+            Defaults to None.
+        skip (Container[str], optional): Names of the structures to skip.
+            Defaults to None.
+        method (str): Local environment method used to create the structure graphs.
+            Defaults to "vesta".
+        timeout (float, optional): Maximum number of seconds per structure.
+            Defaults to None, in which case there is no limit.
+        max_memory (int, optional): Maximum resident memory of a worker in bytes.
+            Defaults to None, in which case there is no limit.
+        max_tasks_per_worker (int, optional): Number of structures after which
+            a worker is replaced by a fresh process.
+            Defaults to None, in which case workers are not replaced.
+        fallback_method (str, optional): Local environment method used to retry
+            structures that failed with ``method``. Defaults to None.
+        shard (Tuple[int, int], optional): Only hash the structures in shard ``i``
+            of ``n`` shards, see :py:func:`in_shard`. Defaults to None.
+        recursive (bool): If True, also hash the structures in subfolders.
+            Defaults to True.
+
+    Yields:
+        Tuple[str, dict]: Name of the structure and its hashes.
+    """
+    kinds = HASH_KINDS if not kinds else tuple(kinds)
+    n_workers = n_jobs or os.cpu_count() or 1
+    files, archives = find_structures(folder, recursive=recursive)
+    members = (
+        member
+        for archive in archives
+        for member in iter_archive(archive, Path(archive).relative_to(folder).as_posix())
+    )
+    counts = Counter()
+    todo = {}
+    failed = {}
+    indices = itertools.count()
+
+    def select(sources: Iterable[StructureSource]) -> Iterator[Tuple[StructureSource, Any]]:
+        # the cache is only accessed from this process, the workers only see the misses
+        for source in sources:
+            counts["found"] += 1
+            if shard is not None and not in_shard(source.name, shard):
+                continue
+            if skip is not None and source.name in skip:
+                counts["skipped"] += 1
+                continue
+            if cache is None:
+                digest, hashes, missing = None, {}, kinds
+            else:
+                digest = (
+                    file_digest(source.path)
+                    if source.data is None
+                    else hashlib.sha256(source.data).hexdigest()
+                )
+                hashes = cache.get(digest, kinds, method=method, lqg=lqg)
+                missing = tuple(kind for kind in kinds if kind not in hashes)
+            if not missing:
+                counts["cached"] += 1
+                yield source, OrderedDict((kind, hashes[kind]) for kind in kinds)
+                continue
+            i = next(indices)
+            todo[i] = (source, digest, hashes)
+            yield source, task(i, missing, method)
+
+    def task(i: int, task_kinds: Tuple[str, ...], task_method: str) -> Tuple[int, tuple]:
+        source = todo[i][0]
+        return i, (source.filename, source.data, lqg, task_kinds, task_method)
+
+    def finish(results: Iterable[Tuple[int, Any, Optional[str]]], retry: bool = False):
+        for i, res, reason in results:
+            source, digest, hashes = todo.pop(i)
+            if reason is None:
+                if cache is not None:
+                    cache.set(digest, res, method=fallback_method if retry else method, lqg=lqg)
+                if retry:
+                    # the cached hashes are not reused to avoid mixing methods
+                    hashes = OrderedDict((kind, res[kind]) for kind in kinds)
+                    hashes["method"] = fallback_method
+                else:
+                    hashes.update(res)
+                    hashes = OrderedDict((kind, hashes[kind]) for kind in kinds)
+                yield source.name, hashes
+            elif fallback_method is not None and not retry:
+                logger.warning(f"Retrying {source.name} with {fallback_method} ({reason})")
+                todo[i] = (source, digest, hashes)
+                failed[i] = reason
+            else:
+                if retry:
+                    reason = f"{failed[i]}; {fallback_method}: {reason}"
+                logger.warning(f"Skipping {source.name} ({reason})")
+                yield source.name, _skipped(kinds, reason)
+
+    with SupervisedPool(
+        _create_hashes_for_source,
+        n_workers,
+        timeout=timeout,
+        max_memory=max_memory,
+        max_tasks_per_worker=max_tasks_per_worker,
+    ) as pool:
+        # the largest files are started first, the small ones are batched
+        # so that they fill up the workers in the end without much overhead
+        # select yields tasks for structures that need to be hashed and hashes for the others
+        tasks = []
+        for source, result in select(files):
+            if isinstance(result, tuple):
+                tasks.append(result)
+            else:
+                yield source.name, result
+        for chunk in _schedule([todo[i][0].size for i, _ in tasks], n_workers):
+            pool.submit([tasks[j] for j in chunk])
+        del tasks
+
+        # the members of archives are only read if there is no other work for the workers
+        chunk = []
+        for source, result in select(members):
+            if not isinstance(result, tuple):
+                yield source.name, result
+                continue
+            chunk.append(result)
+            if len(chunk) >= _ARCHIVE_CHUNK_SIZE:
+                pool.submit(chunk)
+                chunk = []
+                while pool.saturated:
+                    yield from finish(pool.get())
+        pool.submit(chunk)
+        while pool.busy:
+            yield from finish(pool.get())
+
+        if failed:
+            retries = list(failed)
+            for chunk in _schedule([todo[i][0].size for i in retries], n_workers):
+                pool.submit([task(retries[j], kinds, fallback_method) for j in chunk])
+            while pool.busy:
+                yield from finish(pool.get(), retry=True)
+
+    if counts["skipped"]:
+        logger.info(f"Skipped {counts['skipped']} of {counts['found']} structures")
+    if cache is not None:
+        logger.info(f"Found {counts['cached']} of {counts['found']} structures in cache")
+
+
+def _create_hashes_for_source(
+    filename: str, data: Optional[bytes], lqg: bool, kinds: Iterable[str], method: str
+) -> dict:
+    return _create_hashes_for_structure(read_structure(filename, data), lqg, kinds, method)
+
+
+def in_shard(name: str, shard: Tuple[int, int]) -> bool:
+    """Return whether a structure belongs to a shard.
+
+    The assignment only depends on the name of the structure, not on the other files
+    in the folder or the machine. Hence, independent jobs that each process one shard
+    of the same folder together process every structure exactly once.
+
+    Args:
+        name (str): Name of the structure (file stem).
+        shard (Tuple[int, int]): Index ``i`` and number ``n`` of the shards, with ``0 <= i < n``.
 
     Returns:
-        dict: Dictionary of hashes for the Structure.
+        bool: True if the structure is in shard ``i``.
+    """
+    index, count = shard
+    digest = hashlib.blake2b(name.encode("utf8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count == index
+
+
+def _parse_shard(ctx, param, value: Optional[str]) -> Optional[Tuple[int, int]]:
+    if value is None:
+        return None
+    try:
+        index, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise click.BadParameter(f"must be of the form i/n, got {value!r}") from None
+    if not 0 <= index < count:
+        raise click.BadParameter(f"index must be in [0, {count}), got {index}")
+    return index, count
+
+
+def _skipped(kinds: Iterable[str], reason: str) -> dict:
+    hashes = OrderedDict((kind, np.nan) for kind in kinds)
+    hashes["skipped"] = reason
+    return hashes
+
+
+def _schedule(
+    costs: Sequence[float], n_workers: int, chunks_per_worker: int = 8
+) -> List[List[int]]:
+    """Group tasks into chunks, ordered by decreasing cost.
+
+    Tasks are sorted by decreasing cost and consecutive tasks are grouped until
+    the cost of a chunk reaches the total cost divided by ``n_workers * chunks_per_worker``.
+    Hence, expensive tasks end up in chunks of their own at the front of the queue,
+    while cheap tasks are batched to reduce the communication overhead.
+
+    Args:
+        costs (Sequence[float]): Estimated cost of every task.
+        n_workers (int): Number of workers.
+        chunks_per_worker (int): Targeted number of chunks per worker. Defaults to 8.
+
+    Returns:
+        List[List[int]]: Indices of the tasks in every chunk.
     """
-    hashes = OrderedDict()
-    cif_files = glob(os.path.join(folder, "*.cif"))
+    costs = np.asarray(costs, dtype=float)
+    order = np.argsort(-costs, kind="stable")
+    target = costs.sum() / (n_workers * chunks_per_worker)
+    chunks = []
+    chunk = []
+    chunk_cost = 0.0
+    for i in order.tolist():
+        chunk.append(i)
+        chunk_cost += costs[i]
+        if chunk_cost >= target:
+            chunks.append(chunk)
+            chunk = []
+            chunk_cost = 0.0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def compute_hashes_for_folder(
+    folder: os.PathLike,
+    outname: Optional[os.PathLike],
+    lqg: bool = False,
+    n_jobs: int = 1,
+    kinds: Optional[Iterable[str]] = None,
+    cache: Optional[HashCache] = None,
+    resume: bool = False,
+    flush_every: int = 100,
+    **kwargs,
+) -> Optional[dict]:
+    """Create hashes for all structures in a folder, see :py:func:`iter_hashes_for_folder`.
+
+    If ``outname`` ends with ``.jsonl``, one JSON line of the form
+    ``{"name": ..., "<kind>": ..., ...}`` is appended per structure
+    as soon as it is done, and the hashes are not kept in memory.
+    Otherwise, all hashes are written as one JSON object once they are all done.
 
-    curried_func = partial(create_hashes_for_structure, lqg=lqg)
+    Args:
+        folder (os.PathLike): Path to folder containing structure files.
+        outname (os.PathLike, optional): Path to output file.
+            If None, the hashes are only returned.
+        lqg (bool): If True, computed the hash on the labeled quotient graph.
+        n_jobs (int): Number of jobs to run in parallel.
+        kinds (Iterable[str], optional): Hashes to compute, any of
+            :py:data:`~structuregraph_helpers.hash.HASH_KINDS`.
+            Defaults to None, in which case all hashes are computed.
+        cache (HashCache, optional): Cache to look up and store the hashes.
+            Only the files with hashes missing from the cache are parsed.
+            Defaults to None.
+        resume (bool): If True, keep the structures already in the ``.jsonl`` output
+            and only hash the missing ones. Defaults to False.
+        flush_every (int): Number of JSON lines after which the output is flushed.
+            Defaults to 100.
+        **kwargs: Passed to :py:func:`iter_hashes_for_folder`, e.g.,
+            ``method``, ``timeout``, ``max_memory``, ``max_tasks_per_worker``,
+            ``fallback_method``, ``shard`` and ``recursive``.
+
+    Raises:
+        ValueError: If ``resume`` is used without a ``.jsonl`` output.
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
-        for res, file in zip(executor.map(curried_func, cif_files), cif_files):
-            name = Path(file).stem
-            hashes[name] = res
+    Returns:
+        Optional[dict]: Dictionary of hashes for the Structure,
+            None if the hashes are written to a ``.jsonl`` file.
+    """
+    if outname is not None and Path(outname).suffix == ".jsonl":
+        skip = _read_jsonl_names(outname) if resume else None
+        hashes = iter_hashes_for_folder(
+            folder, lqg, n_jobs, kinds, cache=cache, skip=skip, **kwargs
+        )
+        with open(outname, "a" if resume else "w") as handle:
+            for i, (name, res) in enumerate(hashes, start=1):
+                handle.write(json.dumps({"name": name, **res}) + "\n")
+                if i % flush_every == 0:
+                    handle.flush()
+        return None
+    if resume:
+        raise ValueError("Resuming requires an output file with the .jsonl suffix.")
 
+    hashes = OrderedDict(
+        sorted(
+            iter_hashes_for_folder(folder, lqg, n_jobs, kinds, cache=cache, **kwargs),
+            key=itemgetter(0),
+        )
+    )
     if outname is not None:
         dump_json(hashes, outname)
     return hashes
 
 
+def index_folder(
+    folder: os.PathLike,
+    index: HashIndex,
+    lqg: bool = False,
+    n_jobs: int = 1,
+    kinds: Optional[Iterable[str]] = None,
+    cache: Optional[HashCache] = None,
+    batch_size: int = 1000,
+    **kwargs,
+) -> int:
+    """Hash the structures in a folder that are not yet in an index and add them.
+
+    The prefilter keys (:py:data:`~structuregraph_helpers.index.PREFILTER_KEYS`)
+    are stored with the hashes. Structures for which the hashing failed are added
+    without hashes, such that they are not retried when the index is updated.
+
+    Args:
+        folder (os.PathLike): Path to folder containing structure files.
+        index (HashIndex): Index to update.
+        lqg (bool): If True, computed the hash on the labeled quotient graph.
+        n_jobs (int): Number of jobs to run in parallel.
+        kinds (Iterable[str], optional): Hashes to compute, any of
+            :py:data:`~structuregraph_helpers.hash.HASH_KINDS`.
+            Defaults to None, in which case all hashes are computed.
+        cache (HashCache, optional): Cache to look up and store the hashes.
+            Defaults to None.
+        batch_size (int): Number of structures that are added to the index at once.
+            Defaults to 1000.
+        **kwargs: Passed to :py:func:`iter_hashes_for_folder`, e.g.,
+            ``method``, ``timeout``, ``max_memory`` or ``recursive``.
+
+    Returns:
+        int: Number of added structures.
+    """
+    kinds = HASH_KINDS if not kinds else tuple(kinds)
+    method = kwargs.get("method", _METHOD)
+    records = iter_hashes_for_folder(
+        folder, lqg, n_jobs, kinds + PREFILTER_KEYS, cache=cache, skip=set(index.names()), **kwargs
+    )
+    n_added = 0
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            break
+        n_added += index.add_many(batch, method=method, lqg=lqg)
+    logger.info(f"Added {n_added} structures to {index}")
+    return n_added
+
+
+def _read_jsonl_names(filename: os.PathLike) -> Set[str]:
+    """Return the names in a JSON lines output file.
+
+    An incomplete last line, e.g., from a crashed run, is removed from the file.
+    """
+    names = set()
+    if not os.path.exists(filename):
+        return names
+    with open(filename, "r+b") as handle:
+        complete = 0
+        for line in handle:
+            if not line.endswith(b"\n"):
+                break
+            names.add(json.loads(line)["name"])
+            complete += len(line)
+        if handle.tell() != complete:
+            logger.warning(f"Removing incomplete last line of {filename}")
+            handle.truncate(complete)
+    return names
+
+
+def merge_hash_files(
+    filenames: Iterable[os.PathLike],
+    outname: Optional[os.PathLike] = None,
+    folder: Optional[os.PathLike] = None,
+    recursive: bool = True,
+) -> dict:
+    """Merge the outputs of several (sharded) runs of :py:func:`compute_hashes_for_folder`.
+
+    The inputs and the output can be JSON or JSON lines (``.jsonl``) files.
+    If a structure appears more than once, the first entry is kept.
+
+    Args:
+        filenames (Iterable[os.PathLike]): Paths to the outputs to merge.
+        outname (os.PathLike, optional): Path to the merged output.
+            Defaults to None, in which case only the report is created.
+        folder (os.PathLike, optional): Folder with the structures that should be covered
+            by the outputs. Defaults to None, in which case the coverage is not checked.
+        recursive (bool): If True, the structures in the subfolders of ``folder``
+            should also be covered. Defaults to True.
+
+    Returns:
+        dict: Report with the number of structures and the names of the structures
+            that are ``missing`` (only if ``folder`` is given), that appear more than once
+            (``duplicates``), that appear more than once with different hashes
+            (``conflicts``), and that were ``skipped``.
+    """
+    seen = {}
+    duplicates = []
+    conflicts = []
+    skipped = []
+    merged = OrderedDict()
+    jsonl = outname is not None and Path(outname).suffix == ".jsonl"
+    with open(outname, "w") if jsonl else contextlib.nullcontext() as handle:
+        for filename in filenames:
+            for name, hashes in _iter_hash_records(filename):
+                serialized = json.dumps(hashes, sort_keys=True).encode("utf8")
+                digest = hashlib.blake2b(serialized, digest_size=16).digest()
+                if name in seen:
+                    duplicates.append(name)
+                    if seen[name] != digest:
+                        conflicts.append(name)
+                    continue
+                seen[name] = digest
+                if "skipped" in hashes:
+                    skipped.append(name)
+                if jsonl:
+                    handle.write(json.dumps({"name": name, **hashes}) + "\n")
+                elif outname is not None:
+                    merged[name] = hashes
+    if outname is not None and not jsonl:
+        dump_json(OrderedDict(sorted(merged.items())), outname)
+
+    report = OrderedDict(n_structures=len(seen))
+    if folder is not None:
+        report["missing"] = [
+            source.name
+            for source in iter_structure_sources(folder, recursive=recursive, read=False)
+            if source.name not in seen
+        ]
+    report["duplicates"] = sorted(set(duplicates))
+    report["conflicts"] = sorted(set(conflicts))
+    report["skipped"] = sorted(skipped)
+    return report
+
+
+def _iter_hash_records(filename: os.PathLike) -> Iterator[Tuple[str, dict]]:
+    if Path(filename).suffix != ".jsonl":
+        with open(filename, "r") as handle:
+            yield from json.load(handle).items()
+        return
+    with open(filename, "r") as handle:
+        for line in handle:
+            if not line.endswith("\n"):
+                logger.warning(f"Ignoring incomplete last line of {filename}")
+                break
+            record = json.loads(line)
+            yield record.pop("name"), record
+
+
 @click.command("cli")
 @click.argument("structure_file", type=click.Path(exists=True))
 @click.option("--lqg", is_flag=True, default=False)
-def get_hash(structure_file, lqg):
-    structure = Structure.from_file(structure_file)
-    hashes = create_hashes_for_structure(structure, lqg)
+@_kinds_option
+@click.option("--method", default=_METHOD, help="Local environment method.")
+@_cache_options
+def get_hash(structure_file, lqg, kinds, method, cache_path, no_cache, cache_max_entries):
+    cache = _open_cache(cache_path, no_cache, cache_max_entries)
+    try:
+        hashes = create_hashes_for_structure(
+            structure_file, lqg, kinds=kinds, cache=cache, method=method
+        )
+    finally:
+        if cache is not None:
+            cache.close()
 
     pprint.pprint(dict(hashes))  # noqa: T203
 
@@ -108,6 +661,185 @@ def get_hash(structure_file, lqg):
 @click.argument("outname", type=click.Path())
 @click.option("--n-jobs", type=int, default=1)
 @click.option("--lqg", is_flag=True, default=False)
-def get_hashes(indir, outname, n_jobs, lqg):
-    hashes = compute_hashes_for_folder(indir, outname, lqg, n_jobs)
-    dump_json(hashes, outname)
+@_kinds_option
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Only hash the structures missing from an existing .jsonl output.",
+)
+@click.option(
+    "--shard",
+    default=None,
+    callback=_parse_shard,
+    help="Only hash shard i of n shards (0 <= i < n) of the folder, given as i/n.",
+)
+@click.option(
+    "--recursive/--no-recursive",
+    default=True,
+    help="Whether to also use the structures in subfolders.",
+)
+@click.option("--method", default=_METHOD, help="Local environment method.")
+@click.option("--timeout", type=float, default=None, help="Maximum seconds per structure.")
+@click.option("--max-memory", type=int, default=None, help="Maximum memory per worker in MB.")
+@click.option(
+    "--max-tasks-per-worker",
+    type=int,
+    default=None,
+    help="Replace workers by fresh processes after this number of structures.",
+)
+@click.option(
+    "--fallback-method",
+    default=None,
+    help="Local environment method to retry structures that failed or exceeded the limits.",
+)
+@_cache_options
+def get_hashes(
+    indir,
+    outname,
+    n_jobs,
+    lqg,
+    kinds,
+    resume,
+    shard,
+    recursive,
+    method,
+    timeout,
+    max_memory,
+    max_tasks_per_worker,
+    fallback_method,
+    cache_path,
+    no_cache,
+    cache_max_entries,
+):
+    cache = _open_cache(cache_path, no_cache, cache_max_entries)
+    try:
+        compute_hashes_for_folder(
+            indir,
+            outname,
+            lqg,
+            n_jobs,
+            kinds=kinds,
+            cache=cache,
+            resume=resume,
+            method=method,
+            timeout=timeout,
+            max_memory=max_memory * 1024**2 if max_memory is not None else None,
+            max_tasks_per_worker=max_tasks_per_worker,
+            fallback_method=fallback_method,
+            shard=shard,
+            recursive=recursive,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+@click.command("cli")
+@click.argument("outname", type=click.Path())
+@click.argument("filenames", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "--folder",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Folder with the structures that should be covered by the outputs.",
+)
+@click.option(
+    "--recursive/--no-recursive",
+    default=True,
+    help="Whether to also use the structures in subfolders.",
+)
+def merge(outname, filenames, folder, recursive):
+    report = merge_hash_files(filenames, outname, folder, recursive=recursive)
+
+    click.echo(f"Merged {report['n_structures']} structures from {len(filenames)} files")
+    for key in ("missing", "duplicates", "conflicts", "skipped"):
+        names = report.get(key)
+        if names:
+            shown = ", ".join(names[:10]) + (", ..." if len(names) > 10 else "")
+            click.echo(f"{len(names)} {key}: {shown}")
+    if report.get("missing") or report["conflicts"]:
+        raise SystemExit(1)
+
+
+@click.command("cli")
+@click.argument("source", type=click.Path(exists=True))
+@click.option(
+    "--index",
+    "index_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Index that is updated with the structures of the folder. "
+    "Defaults to an index that is not stored.",
+)
+@click.option(
+    "--kind",
+    "kinds",
+    multiple=True,
+    type=click.Choice(HASH_KINDS),
+    help="Hash that must agree for duplicates. Can be given multiple times. "
+    "Defaults to decorated_graph_hash.",
+)
+@click.option(
+    "--output", type=click.Path(dir_okay=False), default=None, help="JSON file for the groups."
+)
+@click.option("--n-jobs", type=int, default=1)
+@click.option("--lqg", is_flag=True, default=False)
+@click.option(
+    "--recursive/--no-recursive",
+    default=True,
+    help="Whether to also use the structures in subfolders.",
+)
+@click.option("--method", default=_METHOD, help="Local environment method.")
+@click.option("--timeout", type=float, default=None, help="Maximum seconds per structure.")
+@_cache_options
+def dedupe(
+    source,
+    index_path,
+    kinds,
+    output,
+    n_jobs,
+    lqg,
+    recursive,
+    method,
+    timeout,
+    cache_path,
+    no_cache,
+    cache_max_entries,
+):
+    """Cluster the structures in a folder or an index into groups of duplicates."""
+    kinds = tuple(kinds) or ("decorated_graph_hash",)
+    if os.path.isdir(source):
+        index = HashIndex(index_path or ":memory:")
+        cache = _open_cache(cache_path, no_cache, cache_max_entries)
+        try:
+            index_folder(
+                source,
+                index,
+                lqg,
+                n_jobs,
+                kinds=kinds,
+                cache=cache,
+                method=method,
+                timeout=timeout,
+                recursive=recursive,
+            )
+        finally:
+            if cache is not None:
+                cache.close()
+    else:
+        index = HashIndex(source)
+
+    with index:
+        groups = index.groups(kinds)
+        n_structures = len(index)
+
+    if output is not None:
+        dump_json(groups, output)
+    n_duplicates = sum(len(group) - 1 for group in groups)
+    click.echo(
+        f"Found {len(groups)} groups with {n_duplicates} duplicates among {n_structures} structures"
+    )
+    if output is None:
+        for group in groups:
+            click.echo(" ".join(group))
@@ -0,0 +1,159 @@
+"""Compact, array-backed representation of structure graphs."""
+from typing import Iterable
+
+import networkx as nx
+import numpy as np
+from pymatgen.analysis.graphs import StructureGraph
+from pymatgen.core import Element, Lattice, Structure
+
+__all__ = ("CompactStructureGraph",)
+
+
+class CompactStructureGraph:
+    """Structure graph stored as a handful of NumPy arrays.
+
+    The edges follow the conventions of pymatgen's :py:class:`StructureGraph`:
+    every edge is stored once, ``src <= dst``, and ``images`` is the lattice
+    image of the ``dst`` site (``to_jimage``) as seen from ``src`` in the home cell.
+
+    Compared to a :py:class:`StructureGraph`, there are no site, species or
+    networkx objects, which makes copies, subgraphs and conversions cheap.
+
+    Args:
+        lattice (Lattice): pymatgen Lattice
+        frac_coords (np.ndarray): Fractional coordinates, shape (n_sites, 3).
+        numbers (np.ndarray): Atomic numbers, shape (n_sites,).
+        src (np.ndarray): Index of the first site of every edge.
+        dst (np.ndarray): Index of the second site of every edge.
+        images (np.ndarray): Image of the second site of every edge, shape (n_edges, 3).
+    """
+
+    __slots__ = ("lattice", "frac_coords", "numbers", "src", "dst", "images")
+
+    def __init__(
+        self,
+        lattice: Lattice,
+        frac_coords: np.ndarray,
+        numbers: np.ndarray,
+        src: np.ndarray,
+        dst: np.ndarray,
+        images: np.ndarray,
+    ):
+        self.lattice = lattice
+        self.frac_coords = np.asarray(frac_coords, dtype=float).reshape(-1, 3)
+        self.numbers = np.asarray(numbers, dtype=np.uint8)
+        self.src = np.asarray(src, dtype=np.int32)
+        self.dst = np.asarray(dst, dtype=np.int32)
+        self.images = np.asarray(images, dtype=np.int8).reshape(-1, 3)
+
+    @classmethod
+    def from_structure_graph(cls, structure_graph: StructureGraph) -> "CompactStructureGraph":
+        """Create a CompactStructureGraph from a pymatgen StructureGraph.
+
+        Args:
+            structure_graph (StructureGraph): pymatgen StructureGraph.
+                Only ordered structures are supported.
+
+        Returns:
+            CompactStructureGraph: Compact copy of the graph.
+        """
+        structure = structure_graph.structure
+        edges = [(u, v, *d["to_jimage"]) for u, v, d in structure_graph.graph.edges(data=True)]
+        edges = np.array(edges, dtype=int).reshape(-1, 5)
+        return cls(
+            structure.lattice,
+            structure.frac_coords,
+            structure.atomic_numbers,
+            edges[:, 0],
+            edges[:, 1],
+            edges[:, 2:],
+        )
+
+    def to_structure_graph(self) -> StructureGraph:
+        """Convert to a pymatgen StructureGraph.
+
+        Returns:
+            StructureGraph: pymatgen StructureGraph with the same sites and edges.
+        """
+        sg = StructureGraph.with_empty_graph(self.structure, name="bonds")
+        sg.graph.add_edges_from(
+            (u, v, {"to_jimage": (a, b, c)})
+            for u, v, (a, b, c) in zip(self.src.tolist(), self.dst.tolist(), self.images.tolist())
+        )
+        return sg
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __repr__(self) -> str:
+        return f"CompactStructureGraph({len(self)} sites, {self.n_edges} edges)"
+
+    @property
+    def n_edges(self) -> int:
+        """Number of edges."""
+        return len(self.src)
+
+    @property
+    def structure(self) -> Structure:
+        """pymatgen Structure with the sites of the graph."""
+        return Structure(self.lattice, self.numbers.tolist(), self.frac_coords)
+
+    @property
+    def cart_coords(self) -> np.ndarray:
+        """Cartesian coordinates of the sites."""
+        return self.lattice.get_cartesian_coords(self.frac_coords)
+
+    @property
+    def species(self) -> np.ndarray:
+        """Element symbols of the sites."""
+        numbers, inverse = np.unique(self.numbers, return_inverse=True)
+        symbols = np.array([Element.from_Z(int(z)).symbol for z in numbers], dtype=str)
+        return symbols[inverse.reshape(-1)]
+
+    def degrees(self) -> np.ndarray:
+        """Degree of every site, counting edges to periodic images of itself twice.
+
+        This is the degree of the node in the :py:class:`StructureGraph` multigraph.
+        """
+        n_sites = len(self)
+        return np.bincount(self.src, minlength=n_sites) + np.bincount(self.dst, minlength=n_sites)
+
+    def coordination_numbers(self) -> np.ndarray:
+        """Coordination number of every site.
+
+        This is the same as ``StructureGraph.get_coordination_of_site``.
+        """
+        loops = np.bincount(self.src[self.src == self.dst], minlength=len(self))
+        return self.degrees() - loops
+
+    def subgraph(self, indices: Iterable[int]) -> "CompactStructureGraph":
+        """Return the subgraph induced by the given sites.
+
+        The sites are renumbered in ascending order of their current index,
+        as ``StructureGraph.remove_nodes`` does.
+
+        Args:
+            indices (Iterable[int]): Indices of the sites to keep.
+
+        Returns:
+            CompactStructureGraph: Induced subgraph.
+        """
+        keep = np.zeros(len(self), dtype=bool)
+        keep[np.fromiter(indices, dtype=np.int64)] = True
+        new_index = np.cumsum(keep) - 1
+        edge_mask = keep[self.src] & keep[self.dst]
+        return CompactStructureGraph(
+            self.lattice,
+            self.frac_coords[keep],
+            self.numbers[keep],
+            new_index[self.src[edge_mask]],
+            new_index[self.dst[edge_mask]],
+            self.images[edge_mask],
+        )
+
+    def to_undirected_graph(self) -> nx.Graph:
+        """Return a simple undirected networkx graph without periodic information."""
+        graph = nx.Graph()
+        graph.add_nodes_from(range(len(self)))
+        graph.add_edges_from(zip(self.src.tolist(), self.dst.tolist()))
+        return graph
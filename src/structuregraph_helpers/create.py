@@ -1,8 +1,10 @@
 """Helpers for creating graphs."""
 import os
-from typing import Iterable, Tuple
+import weakref
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 import networkx as nx
+import numpy as np
 import yaml
 from pymatgen.analysis.graphs import StructureGraph
 from pymatgen.analysis.local_env import (
@@ -14,7 +16,9 @@ from pymatgen.analysis.local_env import (
     NearNeighbors,
     VoronoiNN,
 )
-from pymatgen.core import Structure
+from pymatgen.core import Element, Structure
+
+from .compact import CompactStructureGraph
 
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -51,9 +55,13 @@ __all__ = (
     "LICutoffDictNN",
     "get_local_env_method",
     "get_structure_graph",
+    "get_structure_graph_from_cutoffs",
+    "get_compact_structure_graph",
     "construct_clean_graph",
 )
 
+_CUTOFF_MATRICES = weakref.WeakKeyDictionary()
+
 
 def get_local_env_method(method: str) -> NearNeighbors:
     """Get a local environment method based on its name.
@@ -96,9 +104,137 @@ def get_local_env_method(method: str) -> NearNeighbors:
     return VoronoiNN()
 
 
+def _cutoff_matrix(cut_off_dict: Dict[Tuple[str, str], float]) -> np.ndarray:
+    """Convert a cutoff dictionary into a symmetric matrix indexed by atomic numbers.
+
+    Pairs that are not in the dictionary have a cutoff of zero, i.e., are never bonded.
+    Keys that are no element symbols (e.g., oxidation-state decorated species) are ignored.
+    """
+    cutoffs = {}
+    for (sp1, sp2), dist in cut_off_dict.items():
+        if Element.is_valid_symbol(sp1) and Element.is_valid_symbol(sp2):
+            cutoffs[(Element(sp1).Z, Element(sp2).Z)] = dist
+
+    size = max((max(pair) for pair in cutoffs), default=0) + 1
+    matrix = np.zeros((size, size))
+    for (z1, z2), dist in cutoffs.items():
+        matrix[z1, z2] = dist
+        matrix[z2, z1] = dist
+    return matrix
+
+
+def _get_cutoff_matrix(strategy: CutOffDictNN) -> np.ndarray:
+    if strategy not in _CUTOFF_MATRICES:
+        _CUTOFF_MATRICES[strategy] = _cutoff_matrix(strategy.cut_off_dict)
+    return _CUTOFF_MATRICES[strategy]
+
+
+def get_structure_graph_from_cutoffs(
+    structure: Structure, strategy: CutOffDictNN = VestaCutoffDictNN
+) -> StructureGraph:
+    """Build a StructureGraph from species-pair cutoffs with one neighbor search.
+
+    All neighbors within the largest relevant cutoff are found in a single
+    periodic cell-list search (:py:meth:`pymatgen.core.Structure.get_neighbor_list`),
+    filtered with a cutoff matrix indexed by atomic numbers and
+    added to the graph in bulk.
+    The result has the same edges as
+    ``StructureGraph.with_local_env_strategy(structure, strategy)``,
+    which queries the neighbors site by site and adds the edges one by one.
+
+    Structures with disorder or with species that are not plain elements
+    are passed on to pymatgen.
+
+    Args:
+        structure (Structure): pymatgen Structure
+        strategy (CutOffDictNN): Local environment method with the cutoffs.
+            Defaults to :py:data:`VestaCutoffDictNN`.
+
+    Returns:
+        StructureGraph: pymatgen StructureGraph
+
+    Example:
+        >>> from structuregraph_helpers.create import get_structure_graph_from_cutoffs
+        >>> get_structure_graph_from_cutoffs(structure, ATRCutoffDictNN)
+        <pymatgen.analysis.graphs.StructureGraph object at 0x...>
+    """
+    edges = _cutoff_edges(structure, strategy)
+    if edges is None:
+        return StructureGraph.with_local_env_strategy(structure, strategy)
+
+    sg = StructureGraph.with_empty_graph(structure, name="bonds")
+    sg.graph.add_edges_from((u, v, {"to_jimage": (a, b, c)}) for u, v, a, b, c in edges.tolist())
+    return sg
+
+
+def _cutoff_edges(structure: Structure, strategy: CutOffDictNN) -> Optional[np.ndarray]:
+    """Find the edges of a structure graph with species-pair cutoffs.
+
+    Returns:
+        np.ndarray: Array of shape (n_edges, 5) with from index, to index and image.
+            None if the structure is disordered or has species that are not elements.
+    """
+    if not structure.is_ordered or not all(isinstance(sp, Element) for sp in structure.species):
+        return None
+
+    no_edges = np.zeros((0, 5), dtype=int)
+    numbers = np.array(structure.atomic_numbers)
+    if len(numbers) == 0:
+        return no_edges
+
+    matrix = _get_cutoff_matrix(strategy)
+    present = np.unique(numbers)
+    present = present[present < len(matrix)]
+    max_cutoff = matrix[np.ix_(present, present)].max() if len(present) else 0
+    if max_cutoff == 0:
+        return no_edges
+
+    centers, neighbors, images, distances = structure.get_neighbor_list(max_cutoff)
+    pair_cutoffs = np.zeros(len(centers))
+    in_matrix = (numbers[centers] < len(matrix)) & (numbers[neighbors] < len(matrix))
+    pair_cutoffs[in_matrix] = matrix[numbers[centers[in_matrix]], numbers[neighbors[in_matrix]]]
+    bonded = distances < pair_cutoffs
+    return _canonical_edges(centers[bonded], neighbors[bonded], images[bonded].astype(int))
+
+
+def _canonical_edges(
+    from_index: np.ndarray, to_index: np.ndarray, images: np.ndarray
+) -> np.ndarray:
+    """Apply the edge conventions of ``StructureGraph.add_edge`` to arrays of edges.
+
+    Edges point from the lower to the higher index, edges between images of the
+    same site have a positive first non-zero image component and duplicates are
+    removed (keeping the first occurrence).
+
+    Returns:
+        np.ndarray: Array of shape (n_edges, 5) with from index, to index and image.
+    """
+    swap = to_index < from_index
+    from_index, to_index = np.minimum(from_index, to_index), np.maximum(from_index, to_index)
+    images = np.where(swap[:, None], -images, images)
+
+    self_edges = from_index == to_index
+    if self_edges.any():
+        nonzero = images != 0
+        first_nonzero = images[np.arange(len(images)), nonzero.argmax(axis=1)]
+        images = np.where((self_edges & (first_nonzero < 0))[:, None], -images, images)
+
+    edges = np.column_stack((from_index, to_index, images))
+    _, first = np.unique(edges, axis=0, return_index=True)
+    return edges[np.sort(first)]
+
+
 def get_structure_graph(structure: Structure, method: str = "vesta") -> StructureGraph:
-    """Get a structure graph for a structure."""
-    sg = StructureGraph.with_local_env_strategy(structure, get_local_env_method(method))
+    """Get a structure graph for a structure.
+
+    For the cutoff-based methods (``"vesta"``, ``"atr"`` and ``"li"``),
+    the graph is built with :py:func:`get_structure_graph_from_cutoffs`.
+    """
+    strategy = get_local_env_method(method)
+    if isinstance(strategy, CutOffDictNN):
+        sg = get_structure_graph_from_cutoffs(structure, strategy)
+    else:
+        sg = StructureGraph.with_local_env_strategy(structure, strategy)
     nx.set_node_attributes(
         sg.graph,
         name="idx",
@@ -107,6 +243,37 @@ def get_structure_graph(structure: Structure, method: str = "vesta") -> Structur
     return sg
 
 
+def get_compact_structure_graph(
+    structure: Structure, method: str = "vesta"
+) -> CompactStructureGraph:
+    """Get a compact structure graph for a structure.
+
+    For the cutoff-based methods (``"vesta"``, ``"atr"`` and ``"li"``),
+    the edges are found without creating a pymatgen StructureGraph.
+
+    Args:
+        structure (Structure): pymatgen Structure. Must be ordered.
+        method (str): Name of the local environment method.
+
+    Returns:
+        CompactStructureGraph: Graph with the same edges as :py:func:`get_structure_graph`.
+    """
+    strategy = get_local_env_method(method)
+    edges = _cutoff_edges(structure, strategy) if isinstance(strategy, CutOffDictNN) else None
+    if edges is None:
+        return CompactStructureGraph.from_structure_graph(
+            StructureGraph.with_local_env_strategy(structure, strategy)
+        )
+    return CompactStructureGraph(
+        structure.lattice,
+        structure.frac_coords,
+        structure.atomic_numbers,
+        edges[:, 0],
+        edges[:, 1],
+        edges[:, 2:],
+    )
+
+
 def get_nx_graph_from_edge_tuples(edge_tuples: Iterable[Tuple[int, int]]) -> nx.Graph:
     """Create a undirected graph from a list of edge tuples.
 
@@ -127,7 +294,9 @@ def get_nx_graph_from_edge_tuples(edge_tuples: Iterable[Tuple[int, int]]) -> nx.
 
 
 def construct_clean_graph(
-    structure_graph: StructureGraph, multigraph: bool = False, directed: bool = False
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    multigraph: bool = False,
+    directed: bool = False,
 ) -> nx.Graph:
     """Create a networkx graph with atom numbers and coordination numbers as node attributes.
 
@@ -138,7 +307,54 @@ def construct_clean_graph(
         based on the edge data.
 
     Args:
-        structure_graph (StructureGraph): StructureGraph to convert.
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): Graph to convert.
+        multigraph (bool): Whether to use return a multigraph.
+        directed (bool): Whether to use return adirected graph.
+
+    Returns:
+        nx.Graph: Networkx graph.
+    """
+    src, dst, images = _edge_arrays(structure_graph)
+    return _clean_graph_from_arrays(
+        src, dst, images, _species_strings(structure_graph), multigraph, directed
+    )
+
+
+def _edge_arrays(
+    structure_graph: Union[StructureGraph, CompactStructureGraph]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the first sites, second sites and images (``to_jimage``) of all edges."""
+    if isinstance(structure_graph, CompactStructureGraph):
+        return structure_graph.src, structure_graph.dst, structure_graph.images
+    edges = [(u, v, *d["to_jimage"]) for u, v, d in structure_graph.graph.edges(data=True)]
+    edges = np.array(edges, dtype=int).reshape(-1, 5)
+    return edges[:, 0], edges[:, 1], edges[:, 2:]
+
+
+def _species_strings(
+    structure_graph: Union[StructureGraph, CompactStructureGraph]
+) -> Sequence[str]:
+    """Return the species of all sites as strings."""
+    if isinstance(structure_graph, CompactStructureGraph):
+        return structure_graph.species
+    return [str(specie) for specie in structure_graph.structure.species]
+
+
+def _clean_graph_from_arrays(
+    src: np.ndarray,
+    dst: np.ndarray,
+    images: np.ndarray,
+    species: Sequence[str],
+    multigraph: bool = False,
+    directed: bool = False,
+) -> nx.Graph:
+    """Build the graph of :py:func:`construct_clean_graph` from edge arrays.
+
+    Args:
+        src (np.ndarray): Index of the first site of every edge.
+        dst (np.ndarray): Index of the second site of every edge.
+        images (np.ndarray): Image of the second site of every edge, shape (n_edges, 3).
+        species (Sequence[str]): Species of every site.
         multigraph (bool): Whether to use return a multigraph.
         directed (bool): Whether to use return adirected graph.
 
@@ -155,21 +371,56 @@ def construct_clean_graph(
             graph = nx.DiGraph()
         else:
             graph = nx.Graph()
-    for u, v, d in structure_graph.graph.edges(data=True):
-        voltage = _voltage(u, v, d["to_jimage"])
-        graph.add_edge(u, v, voltage=voltage)
-    for node in graph.nodes:
-
-        graph.nodes[node]["specie"] = str(structure_graph.structure[node].specie)
-        graph.nodes[node]["specie-cn"] = (
-            str(structure_graph.structure[node].specie)
-            + "-"
-            + str(structure_graph.get_coordination_of_site(node))
-        )
 
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    # nodes are added in order of their first appearance in the edge list,
+    # sites without edges are not part of the graph
+    n_sites = len(species)
+    endpoints = np.column_stack((src, dst)).reshape(-1)
+    nodes, first = np.unique(endpoints, return_index=True)
+    nodes = nodes[np.argsort(first)].tolist()
+
+    # coordination number as in StructureGraph.get_coordination_of_site,
+    # i.e., edges to periodic images of the site itself count once
+    loops = src == dst
+    coordination_numbers = (
+        np.bincount(src[~loops], minlength=n_sites) + np.bincount(dst, minlength=n_sites)
+    ).tolist()
+
+    graph.add_nodes_from(
+        (
+            node,
+            {
+                "specie": str(species[node]),
+                "specie-cn": f"{species[node]}-{coordination_numbers[node]}",
+            },
+        )
+        for node in nodes
+    )
+    graph.add_edges_from(
+        (u, v, {"voltage": voltage})
+        for u, v, voltage in zip(src.tolist(), dst.tolist(), _voltages(src, dst, images))
+    )
     return graph
 
 
+def _voltages(src: np.ndarray, dst: np.ndarray, images: np.ndarray) -> List[Tuple[int, int, int]]:
+    """Vectorized version of :py:func:`_voltage` for arrays of edges.
+
+    Args:
+        src (np.ndarray): Start nodes.
+        dst (np.ndarray): End nodes.
+        images (np.ndarray): Translation operations, shape (n_edges, 3).
+
+    Returns:
+        List[Tuple[int, int, int]]: The voltages of the edges.
+    """
+    images = np.asarray(images, dtype=int).reshape(-1, 3)
+    voltages = np.where((np.asarray(src) > np.asarray(dst))[:, None], -images, images)
+    return [tuple(voltage) for voltage in voltages.tolist()]
+
+
 def _voltage(u, v, to_jimage) -> Tuple[int, int, int]:
     """Voltage is the tuple describing the direction of the edge.
 
@@ -1,19 +1,27 @@
 """Helpers for deleting parts of graphs."""
-from collections import defaultdict
-from copy import deepcopy
-from typing import Iterable, Tuple
+from typing import Iterable, List, Sequence, Tuple, Union
 
 import networkx as nx
 import numpy as np
 from pymatgen.analysis.graphs import StructureGraph
+from pymatgen.analysis.local_env import CutOffDictNN
 from pymatgen.core import Structure
 
-from .analysis import get_leaf_nodes
+from .compact import CompactStructureGraph
+from .create import _edge_arrays, _get_cutoff_matrix, _species_strings, get_local_env_method
 
-__all__ = ("remove_all_nodes_not_in_indices",)
+__all__ = (
+    "get_induced_subgraphs",
+    "get_non_leaf_indices",
+    "get_scaffold_indices",
+    "remove_all_nodes_not_in_indices",
+    "remove_long_edges",
+)
 
 
-def remove_all_nodes_not_in_indices(graph: StructureGraph, indices: Iterable[int]) -> None:
+def remove_all_nodes_not_in_indices(
+    graph: Union[StructureGraph, CompactStructureGraph], indices: Iterable[int]
+) -> None:
     """Remove all nodes that are *not* in the given indices from the StructureGraph.
 
     .. note::
@@ -21,25 +29,323 @@ def remove_all_nodes_not_in_indices(graph: StructureGraph, indices: Iterable[int
         The StructureGraph is modified in place.
 
     Args:
-        graph (StructureGraph): pymatgen StructureGraph
+        graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         indices (Iterable[int]): Indices of nodes to keep
     """
-    to_delete = [i for i in range(len(graph)) if i not in indices]
-    graph.structure = Structure.from_sites(graph.structure.sites)
-    graph.remove_nodes(to_delete)
+    (subgraph,) = get_induced_subgraphs(graph, [indices])
+    if isinstance(graph, CompactStructureGraph):
+        for attribute in CompactStructureGraph.__slots__:
+            setattr(graph, attribute, getattr(subgraph, attribute))
+        return
+
+    graph.structure = subgraph.structure
+    graph.graph = subgraph.graph
+
+
+def get_induced_subgraphs(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    index_sets: Iterable[Iterable[int]],
+) -> List[Union[StructureGraph, CompactStructureGraph]]:
+    """Return the subgraphs induced by several sets of sites.
+
+    Membership is stored as one boolean mask per index set, and the edges of all
+    subgraphs are selected in a single pass over the edge list. The input graph is
+    neither copied nor modified. The sites of every subgraph are renumbered in ascending
+    order of their index, as ``StructureGraph.remove_nodes`` does, and the edges keep
+    their periodic images (``to_jimage``) and data.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        index_sets (Iterable[Iterable[int]]): Indices of the sites of every subgraph,
+            e.g., of the linkers, nodes and guests of a framework. The sets may overlap.
+
+    Returns:
+        List[Union[StructureGraph, CompactStructureGraph]]: Induced subgraphs in the order
+            of ``index_sets`` (CompactStructureGraphs if the input was compact).
+
+    Example:
+        >>> from structuregraph_helpers.delete import get_induced_subgraphs
+        >>> linker, node = get_induced_subgraphs(structure_graph, [[0, 1, 2], [3, 4]])
+    """
+    n_sites = len(structure_graph.structure)
+    index_sets = [np.fromiter(indices, dtype=np.int64) for indices in index_sets]
+    masks = np.zeros((len(index_sets), n_sites), dtype=bool)
+    for mask, indices in zip(masks, index_sets):
+        mask[indices] = True
+    new_indices = np.cumsum(masks, axis=1) - 1
+
+    src, dst, images = _edge_arrays(structure_graph)
+    edge_masks = masks[:, src] & masks[:, dst]
+
+    if isinstance(structure_graph, CompactStructureGraph):
+        return [
+            CompactStructureGraph(
+                structure_graph.lattice,
+                structure_graph.frac_coords[mask],
+                structure_graph.numbers[mask],
+                new_index[src[edge_mask]],
+                new_index[dst[edge_mask]],
+                images[edge_mask],
+            )
+            for mask, new_index, edge_mask in zip(masks, new_indices, edge_masks)
+        ]
+
+    sites = structure_graph.structure.sites
+    edge_data = [data for _, _, data in structure_graph.graph.edges(data=True)]
+    node_data = dict(structure_graph.graph.nodes(data=True))
+    subgraphs = []
+    for mask, new_index, edge_mask in zip(masks, new_indices, edge_masks):
+        kept = np.flatnonzero(mask).tolist()
+        subgraph = StructureGraph.with_empty_graph(
+            Structure.from_sites([sites[i] for i in kept]),
+            name=structure_graph.name,
+            edge_weight_name=structure_graph.edge_weight_name,
+            edge_weight_units=structure_graph.edge_weight_unit,
+        )
+        for new, old in enumerate(kept):
+            subgraph.graph.nodes[new].update(node_data[old])
+        edges = np.flatnonzero(edge_mask).tolist()
+        subgraph.graph.add_edges_from(
+            zip(
+                new_index[src[edges]].tolist(),
+                new_index[dst[edges]].tolist(),
+                (dict(edge_data[edge]) for edge in edges),
+            )
+        )
+        subgraphs.append(subgraph)
+    return subgraphs
+
+
+def _get_cutoff_strategy(method: Union[str, CutOffDictNN]) -> CutOffDictNN:
+    strategy = get_local_env_method(method) if isinstance(method, str) else method
+    if not isinstance(strategy, CutOffDictNN):
+        raise ValueError(
+            f"Edges can only be pruned with the cutoffs of a CutOffDictNN method, not {method}"
+        )
+    return strategy
+
+
+def _long_edge_mask(
+    lattice,
+    frac_coords: np.ndarray,
+    numbers: np.ndarray,
+    src: np.ndarray,
+    dst: np.ndarray,
+    images: np.ndarray,
+    strategy: CutOffDictNN,
+    tolerance: float = 0.0,
+) -> np.ndarray:
+    """Return which edges are longer than the cutoff of the species pair (plus tolerance).
+
+    All edge lengths are computed at once from the coordinate arrays.
+    Pairs without a cutoff in the table are never pruned.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    if len(src) == 0:
+        return np.zeros(0, dtype=bool)
+    images = np.asarray(images).reshape(-1, 3)
+    vectors = lattice.get_cartesian_coords(frac_coords[dst] + images - frac_coords[src])
+    lengths = np.linalg.norm(vectors, axis=1)
+
+    cutoff_matrix = _get_cutoff_matrix(strategy)
+    numbers = np.asarray(numbers, dtype=np.int64)
+    size = max(len(cutoff_matrix), int(numbers.max()) + 1)
+    if size > len(cutoff_matrix):
+        cutoff_matrix = np.pad(cutoff_matrix, (0, size - len(cutoff_matrix)))
+    cutoffs = cutoff_matrix[numbers[src], numbers[dst]]
+    return (cutoffs > 0) & (lengths > cutoffs + tolerance)
+
+
+def remove_long_edges(
+    graph: Union[StructureGraph, CompactStructureGraph],
+    method: Union[str, CutOffDictNN] = "vesta",
+    tolerance: float = 0.0,
+) -> int:
+    """Remove all edges that are longer than the cutoff of the species pair they connect.
+
+    The cutoffs are the ones of the cutoff-based local environment method
+    (``"vesta"``, ``"atr"`` or ``"li"``) that was used to create the graph.
+    Edge lengths are computed for all edges at once, and the offending edges are removed
+    in one call. Hence, this is also fast for large supercell graphs
+    (e.g., ``structure_graph * (3, 3, 3)``). Pairs of species without a cutoff are kept.
+
+    .. note::
+
+        The graph is modified in place.
+
+    Args:
+        graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        method (Union[str, CutOffDictNN]): Name of the local environment method,
+            or the CutOffDictNN instance. Defaults to "vesta".
+        tolerance (float): Edges are only removed if they are longer than
+            the cutoff plus this value in Angstrom. Defaults to 0.
+
+    Raises:
+        ValueError: If the method is not based on a cutoff dictionary.
+
+    Returns:
+        int: Number of removed edges.
+
+    Example:
+        >>> from structuregraph_helpers.delete import remove_long_edges
+        >>> remove_long_edges(structure_graph * (3, 3, 3), "vesta")
+        0
+    """
+    strategy = _get_cutoff_strategy(method)
+    if isinstance(graph, CompactStructureGraph):
+        long_edges = _long_edge_mask(
+            graph.lattice,
+            graph.frac_coords,
+            graph.numbers,
+            graph.src,
+            graph.dst,
+            graph.images,
+            strategy,
+            tolerance,
+        )
+        graph.src = graph.src[~long_edges]
+        graph.dst = graph.dst[~long_edges]
+        graph.images = graph.images[~long_edges]
+        return int(long_edges.sum())
+
+    structure = graph.structure
+    edges = list(graph.graph.edges(keys=True, data="to_jimage"))
+    edge_array = np.array([(u, v, *image) for u, v, _, image in edges], dtype=np.int64).reshape(
+        -1, 5
+    )
+    long_edges = _long_edge_mask(
+        structure.lattice,
+        structure.frac_coords,
+        structure.atomic_numbers,
+        edge_array[:, 0],
+        edge_array[:, 1],
+        edge_array[:, 2:],
+        strategy,
+        tolerance,
+    )
+    graph.graph.remove_edges_from(
+        [edge[:3] for edge, is_long in zip(edges, long_edges.tolist()) if is_long]
+    )
+    return int(long_edges.sum())
+
+
+def _species_graph(
+    src: np.ndarray, dst: np.ndarray, species: Sequence[str], coordination_numbers: np.ndarray
+) -> nx.Graph:
+    """Create the simple graph with species and coordination numbers returned by the deletions."""
+    simple_graph = nx.Graph()
+    simple_graph.add_edges_from(set(zip(src.tolist(), dst.tolist())))
+    coordination_numbers = np.asarray(coordination_numbers).tolist()
+    for node in simple_graph.nodes:
+        simple_graph.nodes[node]["specie"] = str(species[node])
+        simple_graph.nodes[node]["specie-cn"] = f"{species[node]}-{coordination_numbers[node]}"
+    return simple_graph
+
+
+def _leaf_mask(
+    n_sites: int, src: np.ndarray, dst: np.ndarray, iterative: bool = False
+) -> np.ndarray:
+    """Return which sites are leaves, i.e., have degree one in the multigraph.
+
+    If ``iterative`` is True, the leaves are stripped in rounds until no leaves are left,
+    as repeated calls of the one-round version would do. Only the neighbors of the sites
+    stripped in a round are candidates for the next round, i.e., the work is linear
+    in the size of the graph.
+    """
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    degrees = np.bincount(src, minlength=n_sites) + np.bincount(dst, minlength=n_sites)
+    leaves = degrees == 1
+    if not iterative:
+        return leaves
+
+    indptr, neighbors, _ = _adjacency(n_sites, src, dst)
+    degrees = degrees.tolist()
+    removed = leaves.tolist()
+    front = np.flatnonzero(leaves).tolist()
+    while front:
+        touched = []
+        for x in front:
+            for y in neighbors[indptr[x] : indptr[x + 1]]:
+                if not removed[y]:
+                    degrees[y] -= 1
+                    touched.append(y)
+        front = []
+        for y in touched:
+            if degrees[y] == 1 and not removed[y]:
+                removed[y] = True
+                front.append(y)
+    return np.array(removed, dtype=bool)
+
+
+def get_non_leaf_indices(
+    structure_graph: Union[StructureGraph, CompactStructureGraph], iterative: bool = False
+) -> np.ndarray:
+    """Return the indices of the sites that are not leaves.
+
+    Leaves are sites with exactly one edge. The degrees are computed for all
+    sites at once from the edge arrays, no graph is copied.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        iterative (bool): If True, strip leaves repeatedly until no leaves are left,
+            which removes hanging chains (e.g., alkyl groups) completely.
+            Defaults to False, in which case only the leaves of the input are removed.
+
+    Returns:
+        np.ndarray: Sorted indices of the sites that are kept.
+
+    Example:
+        >>> from structuregraph_helpers.delete import get_non_leaf_indices
+        >>> get_non_leaf_indices(structure_graph, iterative=True)
+        array([ 0,  1,  2, ...])
+    """
+    src, dst, _ = _edge_arrays(structure_graph)
+    return np.flatnonzero(~_leaf_mask(len(structure_graph.structure), src, dst, iterative))
+
+
+def _prune(
+    structure_graph: Union[StructureGraph, CompactStructureGraph], keep: np.ndarray
+) -> Tuple[Union[StructureGraph, CompactStructureGraph], nx.Graph]:
+    """Return the subgraph induced by the kept sites and its simple species graph.
+
+    The ``specie-cn`` attributes contain the coordination numbers in the input graph.
+    """
+    src, dst, _ = _edge_arrays(structure_graph)
+    n_sites = len(structure_graph.structure)
+    loops = src == dst
+    coordination_numbers = np.bincount(src[~loops], minlength=n_sites) + np.bincount(
+        dst, minlength=n_sites
+    )
+
+    graph_ = get_induced_subgraphs(structure_graph, [keep])[0]
+    src, dst, _ = _edge_arrays(graph_)
+    return graph_, _species_graph(src, dst, _species_strings(graph_), coordination_numbers[keep])
 
 
 def get_structure_graph_without_leaf_nodes(
-    structure_graph: StructureGraph,
-) -> Tuple[StructureGraph, nx.Graph]:
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    iterative: bool = False,
+) -> Tuple[Union[StructureGraph, CompactStructureGraph], nx.Graph]:
     """
     Return a StructureGraph without leaf nodes.
 
+    If only the remaining sites are needed, use :py:func:`get_non_leaf_indices`.
+
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        iterative (bool): If True, strip leaves repeatedly until no leaves are left.
+            Defaults to False.
 
     Returns:
         StructureGraph: StructureGraph without leaf nodes
+            (a CompactStructureGraph if the input was compact)
         nx.Graph: Graph without leaf nodes
 
     Example:
@@ -47,40 +353,147 @@ def get_structure_graph_without_leaf_nodes(
         >>> get_structure_graph_without_leaf_nodes(structure_graph)
         (StructureGraph, nx.Graph)
     """
-    leaf_sites = get_leaf_nodes(structure_graph.graph)
-
-    graph_ = structure_graph.__copy__()
-    graph_.structure = Structure.from_sites(graph_.structure.sites)
-    graph_.remove_nodes(leaf_sites)
-
-    edges = {(u, v) for u, v, _ in graph_.graph.edges(keys=False, data=True)}
-    graph = nx.Graph()
-    graph.add_edges_from(edges)
-    for node in graph.nodes:
-
-        graph.nodes[node]["specie"] = str(graph_.structure[node].specie)
-        graph.nodes[node]["specie-cn"] = (
-            str(graph_.structure[node].specie)
-            + "-"
-            + str(structure_graph.get_coordination_of_site(node))
-        )
+    return _prune(structure_graph, get_non_leaf_indices(structure_graph, iterative))
+
 
-    return graph_, graph
+def _adjacency(
+    n_sites: int, u: np.ndarray, v: np.ndarray
+) -> Tuple[List[int], List[int], List[int]]:
+    """CSR adjacency of an undirected graph: offsets, neighbors and edge index of every half-edge."""
+    heads = np.concatenate((u, v))
+    order = np.argsort(heads, kind="stable")
+    neighbors = np.concatenate((v, u))[order].tolist()
+    edge_ids = np.tile(np.arange(len(u)), 2)[order].tolist()
+    indptr = np.searchsorted(heads[order], np.arange(n_sites + 1)).tolist()
+    return indptr, neighbors, edge_ids
+
+
+def _bridges(n_sites: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Return which edges of a simple undirected graph are bridges.
+
+    Iterative version of Tarjan's algorithm: the edge to a child in the depth-first tree
+    is a bridge if no edge from the subtree of the child leads back to the parent or above.
+    """
+    indptr, neighbors, edge_ids = _adjacency(n_sites, u, v)
+    discovery = [-1] * n_sites
+    low = [0] * n_sites
+    parent_edge = [-1] * n_sites
+    next_half_edge = indptr[:-1]
+    is_bridge = [False] * len(u)
+    time = 0
+    for root in range(n_sites):
+        if discovery[root] >= 0:
+            continue
+        discovery[root] = low[root] = time
+        time += 1
+        stack = [root]
+        while stack:
+            x = stack[-1]
+            k = next_half_edge[x]
+            if k < indptr[x + 1]:
+                next_half_edge[x] = k + 1
+                if edge_ids[k] == parent_edge[x]:
+                    continue
+                y = neighbors[k]
+                if discovery[y] < 0:
+                    discovery[y] = low[y] = time
+                    time += 1
+                    parent_edge[y] = edge_ids[k]
+                    stack.append(y)
+                elif discovery[y] < low[x]:
+                    low[x] = discovery[y]
+            else:
+                stack.pop()
+                if stack:
+                    parent = stack[-1]
+                    if low[x] < low[parent]:
+                        low[parent] = low[x]
+                    if low[x] > discovery[parent]:
+                        is_bridge[parent_edge[x]] = True
+    return np.array(is_bridge, dtype=bool)
+
+
+def _connected_components(n_sites: int, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Label the connected components, numbered in the order of their lowest site."""
+    indptr, neighbors, _ = _adjacency(n_sites, u, v)
+    labels = [-1] * n_sites
+    n_components = 0
+    for root in range(n_sites):
+        if labels[root] >= 0:
+            continue
+        labels[root] = n_components
+        stack = [root]
+        while stack:
+            x = stack.pop()
+            for y in neighbors[indptr[x] : indptr[x + 1]]:
+                if labels[y] < 0:
+                    labels[y] = n_components
+                    stack.append(y)
+        n_components += 1
+    return np.array(labels, dtype=np.int64)
+
+
+def _scaffold_sites(n_sites: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Return the sites of the largest component after breaking all bridges.
+
+    Bridges are searched in the simple graph, i.e., edges to periodic images of the
+    site itself are ignored and parallel edges to several images are merged.
+    Ties are broken in favor of the component with the lowest site index.
+    """
+    if n_sites == 0:
+        return np.zeros(0, dtype=np.int64)
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    loops = src == dst
+    pairs = np.unique(
+        np.column_stack((np.minimum(src, dst), np.maximum(src, dst)))[~loops], axis=0
+    ).reshape(-1, 2)
+    bridges = _bridges(n_sites, pairs[:, 0], pairs[:, 1])
+    labels = _connected_components(n_sites, pairs[~bridges, 0], pairs[~bridges, 1])
+    return np.flatnonzero(labels == np.argmax(np.bincount(labels)))
+
+
+def get_scaffold_indices(
+    structure_graph: Union[StructureGraph, CompactStructureGraph]
+) -> np.ndarray:
+    """Return the indices of the sites of the scaffold of a structure graph.
+
+    The scaffold is the largest connected component that is left after breaking
+    all bridges, see :py:func:`get_structure_graph_with_broken_bridges`.
+    Bridges and components are found on the edge arrays, no graph is copied.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph.
+
+    Returns:
+        np.ndarray: Sorted indices of the sites in the scaffold.
+
+    Example:
+        >>> from structuregraph_helpers.delete import get_scaffold_indices
+        >>> get_scaffold_indices(structure_graph)
+        array([ 0,  1,  2, ...])
+    """
+    src, dst, _ = _edge_arrays(structure_graph)
+    return _scaffold_sites(len(structure_graph.structure), src, dst)
 
 
 def get_structure_graph_with_broken_bridges(
-    structure_graph: StructureGraph,
-) -> Tuple[StructureGraph, nx.Graph]:
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+) -> Tuple[Union[StructureGraph, CompactStructureGraph], nx.Graph]:
     """
     Return a StructureGraph without the small subgraphs one obtains after breaking edges.
 
     In chemical terms, this is supposed to remove hydrogen atoms and functional groups.
+    If only the scaffold sites are needed, use :py:func:`get_scaffold_indices`.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph.
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph.
 
     Returns:
-        StructureGraph: StructureGraph without subgraphs connected via bridges.
+        StructureGraph: StructureGraph without subgraphs connected via bridges
+            (a CompactStructureGraph if the input was compact).
         nx.Graph: Graph without subgraphs connected via bridges.
 
     Example:
@@ -88,48 +501,4 @@ def get_structure_graph_with_broken_bridges(
         >>> get_structure_graph_with_broken_bridges(structure_graph)
         (StructureGraph, nx.Graph)
     """
-    g = nx.DiGraph(deepcopy(structure_graph.graph)).to_undirected()
-    bridges = _generate_bridges(g)
-    for k, v in bridges.items():
-        for neighbor in v:
-            g.remove_edge(k, neighbor)
-
-    subgraphs = [sg for sg in nx.connected_components(g)]
-
-    subgraphs_len = [len(sg) for sg in subgraphs]
-    longest_subgraph = np.argmax(subgraphs_len)
-
-    # going via remove nodes seems easier than removing the edges
-    # (for which we'd need to deal with the periodic attributes)
-    to_delete = []
-    for i, sg in enumerate(subgraphs):
-        if i != longest_subgraph:
-            to_delete.extend(sg)
-
-    graph_ = structure_graph.__copy__()
-    graph_.structure = Structure.from_sites(graph_.structure.sites)
-    graph_.remove_nodes(to_delete)
-
-    edges = {(u, v) for u, v, d in graph_.graph.edges(keys=False, data=True)}
-    graph = nx.Graph()
-    graph.add_edges_from(edges)
-    for node in graph.nodes:
-
-        graph.nodes[node]["specie"] = str(graph_.structure[node].specie)
-        graph.nodes[node]["specie-cn"] = (
-            str(graph_.structure[node].specie)
-            + "-"
-            + str(structure_graph.get_coordination_of_site(node))
-        )
-
-    return graph_, graph
-
-
-def _generate_bridges(nx_graph: nx.Graph) -> dict:
-    """Find all bridges in a graph."""
-    bridges = list(nx.bridges(nx_graph))
-
-    bridges_dict = defaultdict(list)
-    for key, value in bridges:
-        bridges_dict[key].append(value)
-    return dict(bridges_dict)
+    return _prune(structure_graph, get_scaffold_indices(structure_graph))
@@ -0,0 +1,427 @@
+"""Sparse count matrices of Weisfeiler-Lehman subgraph hashes for machine learning.
+
+Every structure graph is described by the number of its atoms with each WL subgraph hash
+(see :py:func:`~structuregraph_helpers.similarity.wl_feature_counts`). The columns of the
+matrix are the hashes in the vocabulary of the featurizer, in the order in which they
+were first seen. The graphs are processed in chunks: every chunk is split between the
+workers, every worker counts the features of its graphs with its own local vocabulary,
+and the local vocabularies are merged into the global one afterwards. One pool of workers
+featurizes all chunks of a call, and only the edge arrays and species of the graphs
+are sent to the workers.
+"""
+import os
+from collections import deque
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from pymatgen.analysis.graphs import StructureGraph
+from scipy import sparse
+
+from ._pool import supervised_imap_unordered
+from .compact import CompactStructureGraph
+from .create import _edge_arrays, _species_strings
+from .similarity import _wl_feature_counts_from_arrays
+
+__all__ = ("WLFeaturizer", "kernel_matrix", "wl_kernel_matrix")
+
+_Graph = Union[StructureGraph, CompactStructureGraph]
+_GraphArrays = Tuple[np.ndarray, np.ndarray, np.ndarray, Sequence[str]]
+
+
+def _graph_arrays(graph: _Graph) -> _GraphArrays:
+    """Return the edge arrays and species of a graph, which are cheap to pickle."""
+    return (*_edge_arrays(graph), _species_strings(graph))
+
+
+def _featurize_graphs(
+    graphs: List[_GraphArrays], variant: str, decorated: bool, lqg: bool, iterations: int
+) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Count the features of graphs as CSR arrays over a local vocabulary."""
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    data = []
+    for graph in graphs:
+        counts = _wl_feature_counts_from_arrays(*graph, variant, decorated, lqg, iterations)
+        for feature, count in counts.items():
+            indices.append(vocabulary.setdefault(feature, len(vocabulary)))
+            data.append(count)
+        indptr.append(len(indices))
+    return (
+        list(vocabulary),
+        np.array(indptr, dtype=np.int64),
+        np.array(indices, dtype=np.int64),
+        np.array(data, dtype=np.int64),
+    )
+
+
+class WLFeaturizer:
+    """Featurize structure graphs as sparse counts of WL subgraph hashes.
+
+    Args:
+        variant (str): Graph to describe, ``"graph"``, ``"no_leaf"`` or ``"scaffold"``
+            as for the hashes in :py:mod:`~structuregraph_helpers.hash`.
+            Defaults to "graph".
+        decorated (bool): If True, the species are used as node labels. Defaults to True.
+        lqg (bool): If True, use the labeled quotient graph. Defaults to False.
+        iterations (int): Number of WL iterations. Defaults to 3.
+        n_jobs (int): Number of worker processes. Defaults to 1,
+            in which case the graphs are featurized in the current process.
+        chunk_size (int): Number of graphs that are featurized at once.
+            Defaults to 1000.
+
+    Example:
+        >>> featurizer = WLFeaturizer(variant="scaffold")
+        >>> matrix = featurizer.fit_transform(structure_graphs)
+        >>> matrix.shape[0] == len(structure_graphs)
+        True
+        >>> featurizer.save_npz("features.npz", matrix)
+    """
+
+    def __init__(
+        self,
+        variant: str = "graph",
+        decorated: bool = True,
+        lqg: bool = False,
+        iterations: int = 3,
+        n_jobs: int = 1,
+        chunk_size: int = 1000,
+    ):
+        if variant not in ("graph", "no_leaf", "scaffold"):
+            raise ValueError(f"Unknown variant {variant}")
+        self.variant = variant
+        self.decorated = decorated
+        self.lqg = lqg
+        self.iterations = iterations
+        self.n_jobs = n_jobs
+        self.chunk_size = chunk_size
+        self.vocabulary_ = {}
+
+    @property
+    def settings(self) -> Dict[str, Union[str, bool, int]]:
+        """Settings that determine the features."""
+        return {
+            "variant": self.variant,
+            "decorated": self.decorated,
+            "lqg": self.lqg,
+            "iterations": self.iterations,
+        }
+
+    @property
+    def feature_names(self) -> List[str]:
+        """Features of the columns, of the form ``"<depth>:<hash>"``."""
+        return list(self.vocabulary_)
+
+    def _chunks(self, graphs: Iterable[_Graph]) -> Iterator[List[_Graph]]:
+        graphs = iter(graphs)
+        while True:
+            chunk = list(islice(graphs, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _count(self, chunks: Iterable[List[_Graph]]) -> Iterator[Tuple[int, List[tuple]]]:
+        """Yield the size of every chunk and the local vocabularies and CSR arrays of its parts.
+
+        The chunks are yielded in order. With several workers, every chunk is split into
+        one part per worker and one pool featurizes the parts of all chunks.
+        """
+        args = (self.variant, self.decorated, self.lqg, self.iterations)
+        chunks = iter(chunks)
+        first = next(chunks, None)
+        if first is None:
+            return
+        chunks = chain([first], chunks)
+        n_workers = self.n_jobs or os.cpu_count() or 1
+        if len(first) < self.chunk_size:
+            # the only chunk
+            n_workers = min(n_workers, len(first))
+        if n_workers <= 1:
+            for chunk in chunks:
+                yield len(chunk), [_featurize_graphs(list(map(_graph_arrays, chunk)), *args)]
+            return
+
+        sizes = deque()  # number of graphs and parts of the chunks that are not yielded yet
+        ranges = {}  # graphs of the parts that are not done yet, for the error message
+
+        def tasks() -> Iterator[List[Tuple[int, tuple]]]:
+            index = offset = 0
+            for chunk in chunks:
+                bounds = np.linspace(0, len(chunk), min(n_workers, len(chunk)) + 1).astype(int)
+                sizes.append((len(chunk), len(bounds) - 1))
+                for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                    ranges[index] = (offset + start, offset + stop)
+                    part = [_graph_arrays(graph) for graph in chunk[start:stop]]
+                    yield [(index, (part,) + args)]
+                    index += 1
+                offset += len(chunk)
+
+        results = {}
+        done = 0
+        for i, result, reason in supervised_imap_unordered(_featurize_graphs, tasks(), n_workers):
+            start, stop = ranges.pop(i)
+            if reason is not None:
+                raise RuntimeError(f"Featurizing graphs {start}-{stop} failed: {reason}")
+            results[i] = result
+            while sizes and all(done + j in results for j in range(sizes[0][1])):
+                n_graphs, n_parts = sizes.popleft()
+                yield n_graphs, [results.pop(done + j) for j in range(n_parts)]
+                done += n_parts
+
+    def _transform_chunk(self, n_graphs: int, parts: List[tuple], grow: bool) -> sparse.csr_matrix:
+        """Merge the local vocabularies of a chunk into the vocabulary and return the counts."""
+        indptrs = [np.zeros(1, dtype=np.int64)]
+        indices = []
+        data = []
+        for labels, part_indptr, part_indices, part_data in parts:
+            if grow:
+                for label in labels:
+                    self.vocabulary_.setdefault(label, len(self.vocabulary_))
+            columns = np.array(
+                [self.vocabulary_.get(label, -1) for label in labels], dtype=np.int64
+            )
+            part_indices = columns[part_indices]
+            known = part_indices >= 0
+            # drop the features that are not in the vocabulary
+            kept = np.concatenate(([0], np.cumsum(known)))[part_indptr]
+            indptrs.append(indptrs[-1][-1] + kept[1:])
+            indices.append(part_indices[known])
+            data.append(part_data[known])
+        return sparse.csr_matrix(
+            (
+                np.concatenate(data),
+                np.concatenate(indices),
+                np.concatenate(indptrs),
+            ),
+            shape=(n_graphs, len(self.vocabulary_)),
+        )
+
+    def partial_fit(self, graphs: Iterable[_Graph]) -> "WLFeaturizer":
+        """Add the features of graphs to the vocabulary.
+
+        Args:
+            graphs (Iterable[Union[StructureGraph, CompactStructureGraph]]): Structure graphs.
+
+        Returns:
+            WLFeaturizer: The featurizer.
+        """
+        for _, parts in self._count(self._chunks(graphs)):
+            for labels, *_ in parts:
+                for label in labels:
+                    self.vocabulary_.setdefault(label, len(self.vocabulary_))
+        return self
+
+    def fit(self, graphs: Iterable[_Graph]) -> "WLFeaturizer":
+        """Build the vocabulary from scratch, see :py:meth:`partial_fit`."""
+        self.vocabulary_ = {}
+        return self.partial_fit(graphs)
+
+    def iter_transform(self, graphs: Iterable[_Graph]) -> Iterator[sparse.csr_matrix]:
+        """Featurize graphs chunk by chunk.
+
+        Features that are not in the vocabulary are ignored.
+
+        Args:
+            graphs (Iterable[Union[StructureGraph, CompactStructureGraph]]): Structure graphs,
+                consumed lazily.
+
+        Yields:
+            sparse.csr_matrix: Counts of the features of the graphs of one chunk,
+                one row per graph and one column per feature in the vocabulary.
+        """
+        for n_graphs, parts in self._count(self._chunks(graphs)):
+            yield self._transform_chunk(n_graphs, parts, grow=False)
+
+    def transform(self, graphs: Iterable[_Graph]) -> sparse.csr_matrix:
+        """Featurize graphs, see :py:meth:`iter_transform`.
+
+        Returns:
+            sparse.csr_matrix: Counts of the features, one row per graph.
+        """
+        matrices = list(self.iter_transform(graphs))
+        if not matrices:
+            return sparse.csr_matrix((0, len(self.vocabulary_)), dtype=np.int64)
+        return sparse.vstack(matrices, format="csr")
+
+    def fit_transform(self, graphs: Iterable[_Graph]) -> sparse.csr_matrix:
+        """Build the vocabulary and featurize graphs in one pass over the graphs.
+
+        Args:
+            graphs (Iterable[Union[StructureGraph, CompactStructureGraph]]): Structure graphs,
+                consumed lazily.
+
+        Returns:
+            sparse.csr_matrix: Counts of the features, one row per graph
+                and one column per feature in the vocabulary.
+        """
+        self.vocabulary_ = {}
+        matrices = [
+            self._transform_chunk(n_graphs, parts, grow=True)
+            for n_graphs, parts in self._count(self._chunks(graphs))
+        ]
+        for matrix in matrices:
+            # the vocabulary grew after the earlier chunks were featurized
+            matrix.resize(matrix.shape[0], len(self.vocabulary_))
+        if not matrices:
+            return sparse.csr_matrix((0, 0), dtype=np.int64)
+        return sparse.vstack(matrices, format="csr")
+
+    def save_npz(self, path: Union[str, os.PathLike], matrix: sparse.spmatrix) -> None:
+        """Write a feature matrix together with the vocabulary and settings.
+
+        Args:
+            path (Union[str, os.PathLike]): Path to the ``.npz`` file.
+            matrix (sparse.spmatrix): Feature matrix computed with this featurizer.
+        """
+        matrix = sparse.csr_matrix(matrix)
+        if matrix.shape[1] != len(self.vocabulary_):
+            raise ValueError(
+                f"Matrix has {matrix.shape[1]} columns, but there are "
+                f"{len(self.vocabulary_)} features"
+            )
+        np.savez_compressed(
+            path,
+            data=matrix.data,
+            indices=matrix.indices,
+            indptr=matrix.indptr,
+            shape=np.array(matrix.shape),
+            feature_names=np.array(self.feature_names, dtype=str),
+            **{key: np.array(value) for key, value in self.settings.items()},
+        )
+
+    @classmethod
+    def load_npz(
+        cls, path: Union[str, os.PathLike], **kwargs
+    ) -> Tuple[sparse.csr_matrix, "WLFeaturizer"]:
+        """Read a feature matrix written with :py:meth:`save_npz`.
+
+        Args:
+            path (Union[str, os.PathLike]): Path to the ``.npz`` file.
+            **kwargs: Further arguments of the featurizer, e.g., ``n_jobs``.
+
+        Returns:
+            Tuple[sparse.csr_matrix, WLFeaturizer]: Feature matrix and a featurizer
+                with the same vocabulary and settings, e.g., to featurize more graphs.
+        """
+        with np.load(path) as npz:
+            matrix = sparse.csr_matrix(
+                (npz["data"], npz["indices"], npz["indptr"]), shape=tuple(npz["shape"])
+            )
+            featurizer = cls(
+                variant=str(npz["variant"]),
+                decorated=bool(npz["decorated"]),
+                lqg=bool(npz["lqg"]),
+                iterations=int(npz["iterations"]),
+                **kwargs,
+            )
+            featurizer.vocabulary_ = {
+                name: i for i, name in enumerate(npz["feature_names"].tolist())
+            }
+        return matrix, featurizer
+
+
+def _block_size(n_rows: int, max_memory: int) -> int:
+    """Number of rows of the square kernel blocks that fit into the memory budget."""
+    # dense float64 block plus the sparse product (value, column and row index per entry)
+    return int(max(1, min(n_rows, (max_memory / 32) ** 0.5)))
+
+
+def kernel_matrix(
+    features: sparse.spmatrix,
+    normalize: bool = True,
+    out: Optional[Union[str, os.PathLike]] = None,
+    max_memory: int = 2**30,
+) -> np.ndarray:
+    """Compute the linear kernel between the rows of a sparse feature matrix.
+
+    The kernel is computed in square blocks with sparse matrix products. Only the blocks
+    on and above the diagonal are computed, the others are mirrored.
+
+    Args:
+        features (sparse.spmatrix): Feature matrix, e.g., from :py:class:`WLFeaturizer`.
+        normalize (bool): If True, normalize the kernel to ``K[i, j] / sqrt(K[i, i] K[j, j])``,
+            i.e., to the cosine similarity of the rows. Defaults to True.
+        out (Union[str, os.PathLike], optional): Path to a ``.npy`` file to which the
+            kernel is written as memory-mapped array. Defaults to None, in which case
+            the kernel is kept in memory.
+        max_memory (int): Memory budget in bytes for one block, the output is not
+            counted. Defaults to 1 GiB.
+
+    Returns:
+        np.ndarray: Kernel matrix (float64), a :py:class:`numpy.memmap` if ``out`` is given.
+    """
+    features = sparse.csr_matrix(features, dtype=np.float64)
+    n_rows = features.shape[0]
+    if out is None:
+        kernel = np.empty((n_rows, n_rows))
+    else:
+        kernel = np.lib.format.open_memmap(out, mode="w+", dtype=np.float64, shape=(n_rows, n_rows))
+    scale = None
+    if normalize:
+        norms = np.sqrt(np.asarray(features.multiply(features).sum(axis=1)).reshape(-1))
+        scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+    block = _block_size(n_rows, max_memory)
+    for start in range(0, n_rows, block):
+        stop = min(start + block, n_rows)
+        rows = features[start:stop]
+        for other_start in range(start, n_rows, block):
+            other_stop = min(other_start + block, n_rows)
+            values = (rows @ features[other_start:other_stop].T).toarray()
+            if scale is not None:
+                values *= scale[start:stop, None]
+                values *= scale[None, other_start:other_stop]
+            kernel[start:stop, other_start:other_stop] = values
+            if other_start != start:
+                kernel[other_start:other_stop, start:stop] = values.T
+    if out is not None:
+        kernel.flush()
+    return kernel
+
+
+def wl_kernel_matrix(
+    graphs: Iterable[_Graph],
+    iterations: int = 3,
+    variant: str = "graph",
+    decorated: bool = True,
+    lqg: bool = False,
+    normalize: bool = True,
+    out: Optional[Union[str, os.PathLike]] = None,
+    max_memory: int = 2**30,
+    n_jobs: int = 1,
+) -> np.ndarray:
+    """Compute the Weisfeiler-Lehman subtree kernel between structure graphs.
+
+    The kernel between two graphs is the number of pairs of atoms, one from each graph,
+    that have the same WL subgraph hash, summed over the iterations. It is computed as
+    product of the sparse feature matrix of :py:class:`WLFeaturizer` with itself,
+    see :py:func:`kernel_matrix`.
+
+    Args:
+        graphs (Iterable[Union[StructureGraph, CompactStructureGraph]]): Structure graphs.
+        iterations (int): Number of WL iterations. Defaults to 3.
+        variant (str): Graph to describe, ``"graph"``, ``"no_leaf"`` or ``"scaffold"``.
+            Defaults to "graph".
+        decorated (bool): If True, the species are used as node labels. Defaults to True.
+        lqg (bool): If True, use the labeled quotient graph. Defaults to False.
+        normalize (bool): If True, normalize the kernel such that the diagonal is one.
+            Defaults to True.
+        out (Union[str, os.PathLike], optional): Path to a ``.npy`` file to which the
+            kernel is written as memory-mapped array. Defaults to None.
+        max_memory (int): Memory budget in bytes for one block. Defaults to 1 GiB.
+        n_jobs (int): Number of worker processes for the features. Defaults to 1.
+
+    Returns:
+        np.ndarray: N x N kernel matrix.
+
+    Example:
+        >>> kernel = wl_kernel_matrix(structure_graphs, out="kernel.npy")
+        >>> np.allclose(np.diag(kernel), 1)
+        True
+    """
+    featurizer = WLFeaturizer(
+        variant=variant, decorated=decorated, lqg=lqg, iterations=iterations, n_jobs=n_jobs
+    )
+    features = featurizer.fit_transform(graphs)
+    return kernel_matrix(features, normalize=normalize, out=out, max_memory=max_memory)
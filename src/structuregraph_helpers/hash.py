@@ -5,22 +5,65 @@ cannot have non-isomorphic unlabeled quotient graphs.
 Hence, computing a hash of the Weisfeiler-Lehman canonical form
 of the UQG will yield always lead to too many duplicates, not too few.
 """
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Sequence, Tuple, Union
+
 import networkx as nx
+import numpy as np
 from pymatgen.analysis.graphs import StructureGraph
 
 from ._hasher import weisfeiler_lehman_graph_hash
-from .create import construct_clean_graph
-from .delete import get_structure_graph_with_broken_bridges, get_structure_graph_without_leaf_nodes
-
-
-def generate_hash(g: nx.Graph, node_decorated: bool, edge_decorated: bool, iterations: int) -> str:
+from .compact import CompactStructureGraph
+from .create import _clean_graph_from_arrays, _edge_arrays, _species_strings
+from .delete import _leaf_mask, _scaffold_sites
+
+__all__ = (
+    "HASH_KINDS",
+    "HASH_VERSION",
+    "compute_hashes",
+    "generate_hash",
+    "undecorated_graph_hash",
+    "decorated_graph_hash",
+    "undecorated_no_leaf_hash",
+    "decorated_no_leaf_hash",
+    "undecorated_scaffold_hash",
+    "decorated_scaffold_hash",
+)
+
+#: Names of the hashes that can be computed with :func:`compute_hashes`.
+HASH_KINDS = (
+    "undecorated_graph_hash",
+    "undecorated_no_leaf_hash",
+    "undecorated_scaffold_hash",
+    "decorated_graph_hash",
+    "decorated_no_leaf_hash",
+    "decorated_scaffold_hash",
+)
+
+#: Version of the hashing algorithm. Increase it whenever the digests change,
+#: cached hashes computed with another version are not reused.
+HASH_VERSION = 3
+
+
+def generate_hash(
+    g: nx.Graph,
+    node_decorated: bool,
+    edge_decorated: bool,
+    iterations: Optional[int],
+    compat: bool = True,
+) -> str:
     """Run the Weisfeiler-Lehman algorithm on the graph.
 
     Args:
         g (nx.Graph): Graph to hash
         node_decorated (bool): If True, decorate the nodes with the species.
         edge_decorated (bool): If True, decorate the edges with the image tuples
-        iterations (int): Number of iterations to run the algorithm.
+        iterations (int, optional): Number of iterations to run the algorithm.
+            If None, iterate until the partition of the nodes is stable.
+        compat (bool): If True, reproduce the digests of the string-based
+            implementation that was used in versions up to 0.0.9. If False, hash the
+            histograms of the integer node classes instead, which distinguishes the same
+            graphs but gives other digests. Defaults to True.
 
     Returns:
         str: Hash string for the graph.
@@ -32,58 +75,182 @@ def generate_hash(g: nx.Graph, node_decorated: bool, edge_decorated: bool, itera
     if edge_decorated:
         edge_attr = "voltage"
     return weisfeiler_lehman_graph_hash(
-        g, iterations=iterations, edge_attr=edge_attr, node_attr=node_attr
+        g, iterations=iterations, edge_attr=edge_attr, node_attr=node_attr, compat=compat
+    )
+
+
+def _variant_clean_graph(
+    src: np.ndarray,
+    dst: np.ndarray,
+    images: np.ndarray,
+    species: Sequence[str],
+    variant: str,
+    lqg: bool,
+) -> nx.Graph:
+    """Return the networkx graph on which a hash variant is computed.
+
+    The leaf-pruned and scaffold subgraphs are induced on the edge arrays,
+    without copying the StructureGraph or the Structure.
+    """
+    n_sites = len(species)
+    if variant == "no_leaf":
+        keep = ~_leaf_mask(n_sites, src, dst)
+    elif variant == "scaffold":
+        keep = np.zeros(n_sites, dtype=bool)
+        keep[_scaffold_sites(n_sites, src, dst)] = True
+    else:
+        return _clean_graph_from_arrays(src, dst, images, species, multigraph=lqg, directed=lqg)
+    new_index = np.cumsum(keep) - 1
+    edge_mask = keep[src] & keep[dst]
+    return _clean_graph_from_arrays(
+        new_index[src[edge_mask]],
+        new_index[dst[edge_mask]],
+        np.asarray(images)[edge_mask],
+        [specie for specie, kept in zip(species, keep.tolist()) if kept],
+        multigraph=lqg,
+        directed=lqg,
     )
 
 
-def undecorated_graph_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def _parse_hash_kind(kind: str) -> Tuple[bool, str]:
+    """Split a hash kind into the decoration flag and the graph variant.
+
+    Args:
+        kind (str): One of :py:data:`HASH_KINDS`.
+
+    Raises:
+        ValueError: If the kind is unknown.
+
+    Returns:
+        Tuple[bool, str]: Whether the nodes are decorated and the graph variant
+            (``"graph"``, ``"no_leaf"`` or ``"scaffold"``).
+    """
+    if kind not in HASH_KINDS:
+        raise ValueError(f"Unknown hash kind {kind}. Choose from {HASH_KINDS}.")
+    decoration, variant = kind[: -len("_hash")].split("_", 1)
+    return decoration == "decorated", variant
+
+
+def compute_hashes(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    kinds: Optional[Iterable[str]] = None,
+    lqg: bool = True,
+    compat: bool = True,
+    iterations: Optional[int] = 6,
+) -> Dict[str, str]:
+    """Compute several hashes of a StructureGraph in one pass.
+
+    The edges are read from the StructureGraph once. The full, leaf-pruned and
+    scaffold graphs are built from these arrays only once and then
+    shared between the decorated and undecorated hashes.
+    Only the variants that are needed for the requested kinds are built.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        kinds (Iterable[str], optional): Hashes to compute, any of
+            :py:data:`HASH_KINDS`. Defaults to None, in which case all hashes are computed.
+        lqg (bool): If True, computed the hashes on the labeled quotient graph.
+            Otherwise, computed the hashes on the undirected quotient graph.
+        compat (bool): If True, reproduce the digests of the string-based
+            implementation that was used in versions up to 0.0.9. If False, hash the
+            histograms of the integer node classes instead, which distinguishes the same
+            graphs but gives other digests. Defaults to True.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable,
+            which adapts the work to the complexity of the structure.
+            Defaults to 6.
+
+    Returns:
+        Dict[str, str]: Hash strings keyed by hash kind, in the order of ``kinds``.
+
+    Example:
+        >>> from structuregraph_helpers.hash import compute_hashes
+        >>> compute_hashes(structure_graph, kinds=["decorated_graph_hash"])
+        OrderedDict([('decorated_graph_hash', '...')])
+    """
+    kinds = HASH_KINDS if kinds is None else tuple(kinds)
+    parsed_kinds = [_parse_hash_kind(kind) for kind in kinds]
+
+    src, dst, images = _edge_arrays(structure_graph)
+    species = _species_strings(structure_graph)
+    graphs = {}
+    hashes = OrderedDict()
+    for kind, (node_decorated, variant) in zip(kinds, parsed_kinds):
+        if variant not in graphs:
+            graphs[variant] = _variant_clean_graph(src, dst, images, species, variant, lqg)
+        hashes[kind] = generate_hash(
+            graphs[variant],
+            node_decorated=node_decorated,
+            edge_decorated=lqg,
+            iterations=iterations,
+            compat=compat,
+        )
+    return hashes
+
+
+def _single_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    kind: str,
+    lqg: bool,
+    iterations: Optional[int],
+) -> str:
+    return compute_hashes(structure_graph, kinds=(kind,), lqg=lqg, iterations=iterations)[kind]
+
+
+def undecorated_graph_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a undecorated hash string for a StructureGraph.
 
     Undecorated means that the hash is  based on the structure graph,
     but ignoring the atomic species.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    if lqg:
-        g = construct_clean_graph(structure_graph, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(structure_graph)
-
-    edge_decorated = True if lqg else False
-    node_decorated = False
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "undecorated_graph_hash", lqg, iterations)
 
 
-def decorated_graph_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def decorated_graph_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a decorated hash string for a StructureGraph.
 
     Decorated means that the hash is based on the structure graph,
     and the atomic species.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    if lqg:
-        g = construct_clean_graph(structure_graph, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(structure_graph)
-    edge_decorated = True if lqg else False
-    node_decorated = True
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "decorated_graph_hash", lqg, iterations)
 
 
-def undecorated_no_leaf_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def undecorated_no_leaf_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a undecorated no-leaf hash string for a StructureGraph.
 
     Undecorated means that the hash is  based on the structure graph,
@@ -91,24 +258,24 @@ def undecorated_no_leaf_hash(structure_graph: StructureGraph, lqg: bool = True)
     No-leaf means that leaf nodes are not included in the hash computation.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    sg, _ = get_structure_graph_without_leaf_nodes(structure_graph)
-    if lqg:
-        g = construct_clean_graph(sg, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(sg)
-    edge_decorated = True if lqg else False
-    node_decorated = False
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "undecorated_no_leaf_hash", lqg, iterations)
 
 
-def decorated_no_leaf_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def decorated_no_leaf_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a undecorated no-leaf hash string for a StructureGraph.
 
     Decorated means that the hash is based on the structure graph,
@@ -116,24 +283,24 @@ def decorated_no_leaf_hash(structure_graph: StructureGraph, lqg: bool = True) ->
     No-leaf means that leaf nodes are not included in the hash computation.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    sg, _ = get_structure_graph_without_leaf_nodes(structure_graph)
-    if lqg:
-        g = construct_clean_graph(sg, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(sg)
-    edge_decorated = True if lqg else False
-    node_decorated = True
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "decorated_no_leaf_hash", lqg, iterations)
 
 
-def undecorated_scaffold_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def undecorated_scaffold_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a undecorated scaffold hash string for a StructureGraph.
 
     Undecorated means that the hash is based on the structure graph,
@@ -142,24 +309,24 @@ def undecorated_scaffold_hash(structure_graph: StructureGraph, lqg: bool = True)
     framenwork are not included in the hash computation.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    sg, _ = get_structure_graph_with_broken_bridges(structure_graph)
-    if lqg:
-        g = construct_clean_graph(sg, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(sg)
-    edge_decorated = True if lqg else False
-    node_decorated = False
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "undecorated_scaffold_hash", lqg, iterations)
 
 
-def decorated_scaffold_hash(structure_graph: StructureGraph, lqg: bool = True) -> str:
+def decorated_scaffold_hash(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    lqg: bool = True,
+    iterations: Optional[int] = 6,
+) -> str:
     """Create a decorated scaffold hash string for a StructureGraph.
 
     Decorated means that the hash is based on the structure graph,
@@ -168,18 +335,14 @@ def decorated_scaffold_hash(structure_graph: StructureGraph, lqg: bool = True) -
     framenwork are not included in the hash computation.
 
     Args:
-        structure_graph (StructureGraph): pymatgen StructureGraph
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
         lqg (bool): If True, computed the hash on the labeled quotient graph.
             Otherwise, computed the hash on the undirected quotient graph.
+        iterations (int, optional): Number of Weisfeiler-Lehman iterations.
+            If None, iterate until the partition of the nodes is stable.
 
     Returns:
         str: Hash string for the StructureGraph.
     """
-    sg, _ = get_structure_graph_with_broken_bridges(structure_graph)
-    if lqg:
-        g = construct_clean_graph(sg, multigraph=True, directed=True)
-    else:
-        g = construct_clean_graph(sg)
-    edge_decorated = True if lqg else False
-    node_decorated = True
-    return generate_hash(g, node_decorated, edge_decorated, iterations=6)
+    return _single_hash(structure_graph, "decorated_scaffold_hash", lqg, iterations)
@@ -0,0 +1,326 @@
+"""Persistent index from structure hashes to structure names for duplicate lookup.
+
+The index is a SQLite database with the hashes of every structure and a few cheap
+prefilter keys (reduced formula, number of sites and number of edges) of the graph that
+is hashed, i.e., without unbonded sites and, for ``lqg=False``, with the edges between
+the same pair of sites counted once. Structures with the same graph hash also have the
+same prefilter keys. Hence, a new structure whose keys are not in the index
+is not a duplicate and does not need to be hashed.
+"""
+import os
+import sqlite3
+from collections import Counter, OrderedDict, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+from pymatgen.analysis.graphs import StructureGraph
+from pymatgen.core import Composition, Structure
+
+from .compact import CompactStructureGraph
+from .create import _edge_arrays, _species_strings, get_compact_structure_graph
+from .hash import HASH_KINDS, HASH_VERSION, _parse_hash_kind, compute_hashes
+
+__all__ = ("PREFILTER_KEYS", "HashIndex", "prefilter_keys")
+
+#: Keys that are stored next to the hashes to prefilter lookups.
+PREFILTER_KEYS = ("formula", "n_sites", "n_edges")
+
+
+def prefilter_keys(
+    structure_graph: Union[StructureGraph, CompactStructureGraph], lqg: bool
+) -> Dict[str, str]:
+    """Compute the prefilter keys of a structure graph.
+
+    The keys describe the graph that is hashed: sites without edges are not counted and,
+    if ``lqg`` is False, edges between the same pair of sites (to different images)
+    are counted once. The values are strings such that they can be stored with the hashes,
+    e.g., in the :py:class:`~structuregraph_helpers.cache.HashCache`.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): Structure graph.
+        lqg (bool): Whether the hashes are computed on the labeled quotient graph.
+
+    Returns:
+        Dict[str, str]: Reduced formula, number of sites and number of edges.
+    """
+    src, dst, _ = _edge_arrays(structure_graph)
+    species = _species_strings(structure_graph)
+    bonded = np.unique(np.concatenate((src, dst))).tolist()
+    if lqg:
+        n_edges = len(src)
+    else:
+        n_edges = len({(min(u, v), max(u, v)) for u, v in zip(src.tolist(), dst.tolist())})
+    formula = Composition(Counter(species[i] for i in bonded)).reduced_formula if bonded else ""
+    return OrderedDict(formula=formula, n_sites=str(len(bonded)), n_edges=str(n_edges))
+
+
+def _prefilter_columns(kinds: Iterable[str]) -> Tuple[str, ...]:
+    """Return the prefilter keys that agree for all structures with the same hashes.
+
+    Leaf-pruned and scaffold hashes ignore parts of the structure, and undecorated
+    hashes ignore the species. Hence, only the keys that are determined by the
+    hashed graph can be used.
+    """
+    parsed = [_parse_hash_kind(kind) for kind in kinds]
+    if not parsed or any(variant != "graph" for _, variant in parsed):
+        return ()
+    if any(decorated for decorated, _ in parsed):
+        return PREFILTER_KEYS
+    return ("n_sites", "n_edges")
+
+
+class HashIndex:
+    """On-disk index of the hashes of many structures.
+
+    All structures in an index must be hashed with the same local environment method
+    and ``lqg`` flag, which are stored in the index when the first structure is added.
+
+    Args:
+        path (Union[str, os.PathLike]): Path to the SQLite database, created if needed.
+            Use ``":memory:"`` for an index that is not stored.
+
+    Example:
+        >>> with HashIndex("index.sqlite") as index:
+        ...     index.add("ABC", {"decorated_graph_hash": "abc"}, method="vesta", lqg=False)
+        ...     index.lookup({"decorated_graph_hash": "abc"})
+        ['ABC']
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path if str(path) == ":memory:" else Path(path)
+        if isinstance(self.path, Path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS structures "
+                "(name TEXT PRIMARY KEY, formula TEXT, n_sites INTEGER, n_edges INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS structures_keys "
+                "ON structures (n_sites, n_edges, formula)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS hashes "
+                "(name TEXT NOT NULL, kind TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (name, kind))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS hashes_value ON hashes (kind, value)"
+            )
+
+    @property
+    def settings(self) -> Dict[str, str]:
+        """Local environment method, ``lqg`` flag and hash version of the index."""
+        return dict(self._connection.execute("SELECT key, value FROM meta").fetchall())
+
+    def _check_settings(self, method: str, lqg: bool) -> None:
+        settings = {"method": method, "lqg": str(int(lqg)), "hash_version": str(HASH_VERSION)}
+        existing = self.settings
+        if not existing:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)", settings.items()
+                )
+        elif existing != settings:
+            raise ValueError(f"Index {self.path} was created with {existing}, not {settings}")
+
+    def add(self, name: str, hashes: Dict[str, str], method: str, lqg: bool) -> None:
+        """Add the hashes of one structure, see :py:meth:`add_many`."""
+        self.add_many([(name, hashes)], method=method, lqg=lqg)
+
+    def add_many(
+        self, records: Iterable[Tuple[str, Dict[str, str]]], method: str, lqg: bool
+    ) -> int:
+        """Add the hashes of several structures.
+
+        Values that are not strings, e.g., NaN for structures for which the hashing failed,
+        are not stored. The prefilter keys (:py:data:`PREFILTER_KEYS`) are taken from
+        the records if they are present. Existing entries are replaced.
+
+        Args:
+            records (Iterable[Tuple[str, Dict[str, str]]]): Names of the structures
+                and their hashes, e.g., from
+                :py:func:`~structuregraph_helpers.cli.iter_hashes_for_folder`.
+            method (str): Local environment method used to create the structure graphs.
+            lqg (bool): Whether the hashes are computed on the labeled quotient graph.
+
+        Raises:
+            ValueError: If the index was created with another method or ``lqg`` flag.
+
+        Returns:
+            int: Number of added structures.
+        """
+        self._check_settings(method, lqg)
+        structures = []
+        hashes = []
+        for name, record in records:
+            keys = [record.get(key) for key in PREFILTER_KEYS]
+            keys = [None if not isinstance(key, str) else key for key in keys]
+            formula, n_sites, n_edges = keys
+            structures.append(
+                (
+                    name,
+                    formula,
+                    None if n_sites is None else int(n_sites),
+                    None if n_edges is None else int(n_edges),
+                )
+            )
+            hashes.extend(
+                (name, kind, value)
+                for kind, value in record.items()
+                if kind in HASH_KINDS and isinstance(value, str)
+            )
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM hashes WHERE name = ?", [(name,) for name, *_ in structures]
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO structures (name, formula, n_sites, n_edges) "
+                "VALUES (?, ?, ?, ?)",
+                structures,
+            )
+            self._connection.executemany(
+                "INSERT INTO hashes (name, kind, value) VALUES (?, ?, ?)", hashes
+            )
+        return len(structures)
+
+    def names(self) -> List[str]:
+        """Return the names of all structures in the index."""
+        return [row[0] for row in self._connection.execute("SELECT name FROM structures")]
+
+    def has_candidates(self, keys: Dict[str, str], kinds: Iterable[str]) -> bool:
+        """Return whether a structure with these prefilter keys can have the same hashes.
+
+        Structures that were added with hashes but without prefilter keys
+        are always candidates.
+
+        Args:
+            keys (Dict[str, str]): Prefilter keys, see :py:func:`prefilter_keys`.
+                Keys that are missing are not used.
+            kinds (Iterable[str]): Hash kinds that will be compared.
+
+        Returns:
+            bool: False if no structure in the index can have the same hashes.
+        """
+        columns = [column for column in _prefilter_columns(kinds) if column in keys]
+        if not columns:
+            return True
+        conditions = " AND ".join(f"{column} = ?" for column in columns)
+        values = [keys[column] if column == "formula" else int(keys[column]) for column in columns]
+        row = self._connection.execute(
+            f"SELECT 1 FROM structures WHERE ({conditions}) OR (n_sites IS NULL AND EXISTS "  # noqa: S608
+            "(SELECT 1 FROM hashes WHERE hashes.name = structures.name)) LIMIT 1",
+            values,
+        ).fetchone()
+        return row is not None
+
+    def lookup(self, hashes: Dict[str, str]) -> List[str]:
+        """Return the names of the structures that have all the given hashes.
+
+        Args:
+            hashes (Dict[str, str]): Hashes keyed by hash kind. Other keys are ignored.
+
+        Returns:
+            List[str]: Sorted names of the matching structures.
+        """
+        hashes = {kind: value for kind, value in hashes.items() if kind in HASH_KINDS}
+        if not hashes or not all(isinstance(value, str) for value in hashes.values()):
+            return []
+        names = None
+        for kind, value in hashes.items():
+            rows = self._connection.execute(
+                "SELECT name FROM hashes WHERE kind = ? AND value = ?", (kind, value)
+            ).fetchall()
+            found = {name for name, in rows}
+            names = found if names is None else names & found
+            if not names:
+                return []
+        return sorted(names)
+
+    def find(
+        self,
+        structure: Union[Structure, str, os.PathLike],
+        kinds: Iterable[str] = ("decorated_graph_hash",),
+    ) -> List[str]:
+        """Find the structures in the index that are duplicates of a structure.
+
+        The structure graph is created with the settings of the index. The prefilter keys
+        are checked before the hashes are computed, i.e., structures whose hashed graph
+        has a new composition or size are rejected without hashing.
+
+        Args:
+            structure (Union[Structure, str, os.PathLike]): pymatgen Structure or
+                path to a structure file.
+            kinds (Iterable[str]): Hash kinds that must agree.
+                Defaults to ("decorated_graph_hash",).
+
+        Returns:
+            List[str]: Sorted names of the duplicates, empty if there are none.
+        """
+        settings = self.settings
+        if not settings:
+            return []
+        kinds = tuple(kinds)
+        if not isinstance(structure, Structure):
+            structure = Structure.from_file(structure)
+        lqg = bool(int(settings["lqg"]))
+        structure_graph = get_compact_structure_graph(structure, method=settings["method"])
+        if not self.has_candidates(prefilter_keys(structure_graph, lqg), kinds):
+            return []
+        hashes = compute_hashes(structure_graph, kinds=kinds, lqg=lqg)
+        return self.lookup(hashes)
+
+    def groups(self, kinds: Iterable[str] = ("decorated_graph_hash",)) -> List[List[str]]:
+        """Cluster the structures into groups of duplicates.
+
+        Args:
+            kinds (Iterable[str]): Hash kinds that must agree for duplicates.
+                Defaults to ("decorated_graph_hash",).
+
+        Returns:
+            List[List[str]]: Sorted groups with more than one structure,
+                ordered by their first name.
+        """
+        kinds = tuple(kinds)
+        placeholders = ", ".join("?" * len(kinds))
+        rows = self._connection.execute(
+            f"SELECT name, kind, value FROM hashes WHERE kind IN ({placeholders})",  # noqa: S608
+            kinds,
+        )
+        values = defaultdict(dict)
+        for name, kind, value in rows:
+            values[name][kind] = value
+        clusters = defaultdict(list)
+        for name, hashes in values.items():
+            if len(hashes) == len(kinds):
+                clusters[tuple(hashes[kind] for kind in kinds)].append(name)
+        return sorted(sorted(names) for names in clusters.values() if len(names) > 1)
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM structures").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        row = self._connection.execute(
+            "SELECT 1 FROM structures WHERE name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    def __repr__(self) -> str:
+        return f"HashIndex({str(self.path)!r})"
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def __enter__(self) -> "HashIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
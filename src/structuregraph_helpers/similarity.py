@@ -0,0 +1,445 @@
+"""Near-duplicate search with MinHash sketches of Weisfeiler-Lehman subgraph hashes.
+
+Every structure graph is described by the set of the WL subgraph hashes of its nodes
+(see :py:func:`~structuregraph_helpers._hasher.weisfeiler_lehman_subgraph_hashes`),
+i.e., by the environments of its atoms up to a few bonds away. Functionalized variants
+of a framework share most of these environments. The Jaccard similarity of the sets is
+estimated with MinHash sketches, and the sketches are stored in the bands of a
+locality-sensitive hashing (LSH) table, such that a query only compares the
+structures that share at least one band with it instead of all structures.
+"""
+import os
+import sqlite3
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+from pymatgen.analysis.graphs import StructureGraph
+
+from ._hasher import weisfeiler_lehman_subgraph_hash_counts
+from .compact import CompactStructureGraph
+from .create import _edge_arrays, _species_strings
+from .hash import _variant_clean_graph
+
+__all__ = (
+    "SimilarityIndex",
+    "estimate_jaccard",
+    "lsh_parameters",
+    "minhash",
+    "wl_feature_counts",
+    "wl_features",
+)
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_DEFAULT_SETTINGS = {
+    "threshold": repr(0.9),
+    "num_perm": "128",
+    "seed": "1",
+    "variant": "scaffold",
+    "decorated": "1",
+    "lqg": "0",
+    "iterations": "3",
+}
+
+
+def wl_feature_counts(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    variant: str = "scaffold",
+    decorated: bool = True,
+    lqg: bool = False,
+    iterations: int = 3,
+) -> Dict[str, int]:
+    """Return the number of nodes with each WL subgraph hash of a structure graph.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        variant (str): Graph to describe, ``"graph"``, ``"no_leaf"`` or ``"scaffold"``
+            as for the hashes in :py:mod:`~structuregraph_helpers.hash`.
+            Defaults to "scaffold".
+        decorated (bool): If True, the species are used as node labels. Defaults to True.
+        lqg (bool): If True, use the labeled quotient graph, i.e., the voltages
+            are used as edge labels. Defaults to False.
+        iterations (int): Number of WL iterations, i.e., the environments
+            of the atoms reach up to ``2 * iterations`` bonds. Defaults to 3.
+
+    Returns:
+        Dict[str, int]: Counts of the features of the form ``"<depth>:<hash>"``.
+    """
+    src, dst, images = _edge_arrays(structure_graph)
+    return _wl_feature_counts_from_arrays(
+        src, dst, images, _species_strings(structure_graph), variant, decorated, lqg, iterations
+    )
+
+
+def _wl_feature_counts_from_arrays(
+    src: np.ndarray,
+    dst: np.ndarray,
+    images: np.ndarray,
+    species: Sequence[str],
+    variant: str,
+    decorated: bool,
+    lqg: bool,
+    iterations: int,
+) -> Dict[str, int]:
+    """Return the counts of :py:func:`wl_feature_counts` from the edge arrays and species."""
+    graph = _variant_clean_graph(src, dst, images, species, variant, lqg)
+    histograms = weisfeiler_lehman_subgraph_hash_counts(
+        graph,
+        edge_attr="voltage" if lqg else None,
+        node_attr="specie" if decorated else None,
+        iterations=iterations,
+    )
+    return {
+        f"{depth}:{label}": count
+        for depth, histogram in enumerate(histograms)
+        for label, count in histogram
+    }
+
+
+def wl_features(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    variant: str = "scaffold",
+    decorated: bool = True,
+    lqg: bool = False,
+    iterations: int = 3,
+) -> Set[str]:
+    """Return the set of WL subgraph hashes of all nodes of a structure graph.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): pymatgen StructureGraph
+            or CompactStructureGraph
+        variant (str): Graph to describe, see :py:func:`wl_feature_counts`.
+            Defaults to "scaffold".
+        decorated (bool): If True, the species are used as node labels. Defaults to True.
+        lqg (bool): If True, use the labeled quotient graph. Defaults to False.
+        iterations (int): Number of WL iterations. Defaults to 3.
+
+    Returns:
+        Set[str]: Features of the form ``"<depth>:<hash>"``.
+    """
+    return set(wl_feature_counts(structure_graph, variant, decorated, lqg, iterations))
+
+
+def _permutations(num_perm: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash(features: Iterable[str], num_perm: int = 128, seed: int = 1) -> np.ndarray:
+    """Compute the MinHash sketch of a set of features.
+
+    The fraction of equal entries of two sketches is an unbiased estimate of the
+    Jaccard similarity of the two sets, see :py:func:`estimate_jaccard`.
+
+    Args:
+        features (Iterable[str]): Features, e.g., from :py:func:`wl_features`.
+        num_perm (int): Number of hash permutations, i.e., the length of the sketch.
+            Defaults to 128.
+        seed (int): Seed of the permutations. Only sketches with the same
+            ``num_perm`` and ``seed`` can be compared. Defaults to 1.
+
+    Returns:
+        np.ndarray: Sketch, array of ``num_perm`` unsigned integers.
+    """
+    values = np.array(
+        [
+            int.from_bytes(blake2b(feature.encode("utf8"), digest_size=4).digest(), "little")
+            for feature in set(features)
+        ],
+        dtype=np.uint64,
+    )
+    if len(values) == 0:
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint64)
+    a, b = _permutations(num_perm, seed)
+    with np.errstate(over="ignore"):
+        permuted = ((values[:, None] * a + b) % _MERSENNE_PRIME) & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def estimate_jaccard(sketch1: np.ndarray, sketch2: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two sets from their MinHash sketches."""
+    return float(np.mean(np.asarray(sketch1) == np.asarray(sketch2)))
+
+
+def _integrate(function, a: float, b: float, n_points: int = 101) -> float:
+    x = np.linspace(a, b, n_points)
+    y = function(x)
+    return float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2)
+
+
+def lsh_parameters(
+    threshold: float, num_perm: int, false_positive_weight: float = 0.5
+) -> Tuple[int, int]:
+    """Choose the number of bands and rows per band of an LSH table.
+
+    Two sketches are candidates if all rows of at least one band agree, which happens
+    with probability ``1 - (1 - s**rows)**bands`` for sets with Jaccard similarity ``s``.
+    The parameters minimize the weighted sum of the probabilities of false positives
+    (similarity below the threshold) and false negatives (similarity above).
+
+    Args:
+        threshold (float): Jaccard similarity threshold.
+        num_perm (int): Length of the sketches.
+        false_positive_weight (float): Weight of the false positives, the false negatives
+            have weight ``1 - false_positive_weight``. Defaults to 0.5.
+
+    Returns:
+        Tuple[int, int]: Number of bands and number of rows per band.
+    """
+    best = None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positives = _integrate(lambda s: 1 - (1 - s**rows) ** bands, 0.0, threshold)
+            false_negatives = _integrate(lambda s: (1 - s**rows) ** bands, threshold, 1.0)
+            error = (
+                false_positive_weight * false_positives
+                + (1 - false_positive_weight) * false_negatives
+            )
+            if best is None or error < best[0]:
+                best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class SimilarityIndex:
+    """On-disk LSH table of MinHash sketches of WL features for near-duplicate search.
+
+    The settings are stored in the index when it is created and are used
+    when it is opened again. Settings that are None are taken from an existing
+    index, or set to their defaults for a new index.
+
+    Args:
+        path (Union[str, os.PathLike]): Path to the SQLite database, created if needed.
+            Use ``":memory:"`` for an index that is not stored.
+        threshold (float, optional): Jaccard similarity for which the LSH table is tuned.
+            Queries with lower thresholds miss candidates. Defaults to 0.9.
+        num_perm (int, optional): Length of the sketches. Defaults to 128.
+        seed (int, optional): Seed of the MinHash permutations. Defaults to 1.
+        variant (str, optional): Graph variant of the features, see :py:func:`wl_features`.
+            Defaults to "scaffold".
+        decorated (bool, optional): Whether the features use the species. Defaults to True.
+        lqg (bool, optional): Whether the features use the voltages. Defaults to False.
+        iterations (int, optional): Number of WL iterations of the features. Defaults to 3.
+
+    Raises:
+        ValueError: If a setting differs from the one of the existing index.
+
+    Example:
+        >>> with SimilarityIndex("similarity.sqlite", threshold=0.5, variant="graph") as index:
+        ...     index.add("MOF-74-Zr", mof_74_zr_graph)
+        ...     index.query(mof_74_zr_nh2_graph)
+        [('MOF-74-Zr', 0.609375)]
+    """
+
+    def __init__(
+        self,
+        path: Union[str, os.PathLike],
+        threshold: Optional[float] = None,
+        num_perm: Optional[int] = None,
+        seed: Optional[int] = None,
+        variant: Optional[str] = None,
+        decorated: Optional[bool] = None,
+        lqg: Optional[bool] = None,
+        iterations: Optional[int] = None,
+    ):
+        self.path = path if str(path) == ":memory:" else Path(path)
+        if isinstance(self.path, Path):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path), timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS sketches (name TEXT PRIMARY KEY, sketch BLOB NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS bands "
+                "(band INTEGER NOT NULL, key INTEGER NOT NULL, name TEXT NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (band, key)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS bands_name ON bands (name)")
+
+        requested = {
+            "threshold": None if threshold is None else repr(float(threshold)),
+            "num_perm": None if num_perm is None else str(num_perm),
+            "seed": None if seed is None else str(seed),
+            "variant": variant,
+            "decorated": None if decorated is None else str(int(decorated)),
+            "lqg": None if lqg is None else str(int(lqg)),
+            "iterations": None if iterations is None else str(iterations),
+        }
+        settings = dict(self._connection.execute("SELECT key, value FROM meta").fetchall())
+        if settings:
+            conflicts = {
+                key: value
+                for key, value in requested.items()
+                if value is not None and settings[key] != value
+            }
+            if conflicts:
+                existing = {key: settings[key] for key in conflicts}
+                self._connection.close()
+                raise ValueError(f"Index {self.path} was created with {existing}, not {conflicts}")
+        else:
+            settings = {
+                key: _DEFAULT_SETTINGS[key] if value is None else value
+                for key, value in requested.items()
+            }
+            bands, rows = lsh_parameters(float(settings["threshold"]), int(settings["num_perm"]))
+            settings.update(bands=str(bands), rows=str(rows))
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)", settings.items()
+                )
+        self.threshold = float(settings["threshold"])
+        self.num_perm = int(settings["num_perm"])
+        self.seed = int(settings["seed"])
+        self.bands = int(settings["bands"])
+        self.rows = int(settings["rows"])
+        self.variant = settings["variant"]
+        self.decorated = bool(int(settings["decorated"]))
+        self.lqg = bool(int(settings["lqg"]))
+        self.iterations = int(settings["iterations"])
+
+    def sketch(self, structure_graph: Union[StructureGraph, CompactStructureGraph]) -> np.ndarray:
+        """Compute the MinHash sketch of a structure graph with the settings of the index."""
+        features = wl_features(
+            structure_graph,
+            variant=self.variant,
+            decorated=self.decorated,
+            lqg=self.lqg,
+            iterations=self.iterations,
+        )
+        return minhash(features, num_perm=self.num_perm, seed=self.seed)
+
+    def _as_sketch(
+        self, item: Union[StructureGraph, CompactStructureGraph, np.ndarray]
+    ) -> np.ndarray:
+        if isinstance(item, (StructureGraph, CompactStructureGraph)):
+            return self.sketch(item)
+        sketch = np.asarray(item, dtype=np.uint64)
+        if sketch.shape != (self.num_perm,):
+            raise ValueError(f"Expected a sketch of length {self.num_perm}, got {sketch.shape}")
+        return sketch
+
+    def _band_keys(self, sketch: np.ndarray) -> List[int]:
+        bands = sketch[: self.bands * self.rows].reshape(self.bands, self.rows)
+        return [
+            int.from_bytes(blake2b(band.tobytes(), digest_size=7).digest(), "little")
+            for band in bands
+        ]
+
+    def add(
+        self, name: str, item: Union[StructureGraph, CompactStructureGraph, np.ndarray]
+    ) -> None:
+        """Add a structure, see :py:meth:`add_many`."""
+        self.add_many([(name, item)])
+
+    def add_many(
+        self,
+        records: Iterable[Tuple[str, Union[StructureGraph, CompactStructureGraph, np.ndarray]]],
+    ) -> int:
+        """Add several structures. Existing entries are replaced.
+
+        Args:
+            records (Iterable[Tuple[str, Union[StructureGraph, CompactStructureGraph, np.ndarray]]]):
+                Names of the structures and their structure graphs or sketches
+                (computed with :py:meth:`sketch`).
+
+        Returns:
+            int: Number of added structures.
+        """
+        sketches = []
+        bands = []
+        for name, item in records:
+            sketch = self._as_sketch(item)
+            sketches.append((name, sketch.tobytes()))
+            bands.extend((band, key, name) for band, key in enumerate(self._band_keys(sketch)))
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM bands WHERE name = ?", [(name,) for name, _ in sketches]
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO sketches (name, sketch) VALUES (?, ?)", sketches
+            )
+            self._connection.executemany(
+                "INSERT INTO bands (band, key, name) VALUES (?, ?, ?)", bands
+            )
+        return len(sketches)
+
+    def candidates(
+        self, item: Union[StructureGraph, CompactStructureGraph, np.ndarray]
+    ) -> Set[str]:
+        """Return the names of the structures that share at least one band with a structure."""
+        sketch = self._as_sketch(item)
+        names = set()
+        for band, key in enumerate(self._band_keys(sketch)):
+            rows = self._connection.execute(
+                "SELECT name FROM bands WHERE band = ? AND key = ?", (band, key)
+            )
+            names.update(name for name, in rows)
+        return names
+
+    def query(
+        self,
+        item: Union[StructureGraph, CompactStructureGraph, np.ndarray],
+        threshold: Optional[float] = None,
+    ) -> List[Tuple[str, float]]:
+        """Find the structures that are similar to a structure.
+
+        Only the candidates from the LSH table are compared, i.e., the cost does not grow
+        with the number of dissimilar structures in the index.
+
+        Args:
+            item (Union[StructureGraph, CompactStructureGraph, np.ndarray]): Structure graph
+                or sketch.
+            threshold (float, optional): Minimum estimated Jaccard similarity.
+                Defaults to None, in which case the threshold of the index is used.
+
+        Returns:
+            List[Tuple[str, float]]: Names and estimated similarities,
+                most similar first.
+        """
+        sketch = self._as_sketch(item)
+        threshold = self.threshold if threshold is None else threshold
+        names = sorted(self.candidates(sketch))
+        results = []
+        for start in range(0, len(names), 500):
+            chunk = names[start : start + 500]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = self._connection.execute(
+                f"SELECT name, sketch FROM sketches WHERE name IN ({placeholders})",  # noqa: S608
+                chunk,
+            )
+            for name, blob in rows:
+                similarity = estimate_jaccard(sketch, np.frombuffer(blob, dtype=np.uint64))
+                if similarity >= threshold:
+                    results.append((name, similarity))
+        return sorted(results, key=lambda result: (-result[1], result[0]))
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM sketches").fetchone()[0]
+
+    def __contains__(self, name: str) -> bool:
+        row = self._connection.execute("SELECT 1 FROM sketches WHERE name = ?", (name,)).fetchone()
+        return row is not None
+
+    def __repr__(self) -> str:
+        return f"SimilarityIndex({str(self.path)!r}, threshold={self.threshold})"
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def __enter__(self) -> "SimilarityIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,250 @@
+"""Find and read structure files in folders and archives.
+
+Structures are identified by a name, the path of the file relative to the folder
+without the format and compression suffixes, e.g., ``sub/ABC`` for ``sub/ABC.cif.gz``.
+Members of archives are named by the path of the archive and the path of the member
+in the archive, e.g., ``dump.tar.gz/ABC`` for ``ABC.cif`` in ``dump.tar.gz``.
+Files whose names would collide, e.g., ``ABC.cif`` and ``ABC.cif.gz`` in the same folder,
+are named by their full path instead, e.g., ``ABC.cif`` and ``ABC.cif.gz``.
+"""
+import bz2
+import gzip
+import lzma
+import os
+import posixpath
+import tarfile
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from pymatgen.core import Structure
+
+__all__ = (
+    "ARCHIVE_SUFFIXES",
+    "StructureSource",
+    "structure_format",
+    "is_archive",
+    "find_structures",
+    "iter_archive",
+    "iter_structure_sources",
+    "read_structure",
+)
+
+#: Suffixes of the archives that are searched for structures.
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+
+_DECOMPRESS = {".gz": gzip.decompress, ".bz2": bz2.decompress, ".xz": lzma.decompress}
+
+
+class StructureSource(NamedTuple):
+    """A structure file on disk or a member of an archive.
+
+    Args:
+        name (str): Name of the structure.
+        filename (str): Path of the file, or of the member in the archive.
+            Determines the format.
+        path (str, optional): Path to the file on disk, None for members of archives.
+        data (bytes, optional): Contents of members of archives, None for files on disk.
+        size (int): Size of the file in bytes, used as estimate of the cost.
+    """
+
+    name: str
+    filename: str
+    path: Optional[str]
+    data: Optional[bytes]
+    size: int
+
+
+def _split_compression(filename: str) -> Tuple[str, Optional[str]]:
+    for suffix in _DECOMPRESS:
+        if filename.lower().endswith(suffix):
+            return filename[: -len(suffix)], suffix
+    return filename, None
+
+
+def structure_format(filename: str) -> Optional[str]:
+    """Return the pymatgen format of a structure file based on its name.
+
+    CIF (``*.cif``), VASP (``POSCAR*``, ``CONTCAR*``, ``*.vasp``) and XSF (``*.xsf``) files
+    are recognized, also if they are compressed with gzip, bzip2 or xz.
+
+    Args:
+        filename (str): Name of the file.
+
+    Returns:
+        Optional[str]: ``"cif"``, ``"poscar"`` or ``"xsf"``, None if the file is not recognized.
+    """
+    name, _ = _split_compression(os.path.basename(filename))
+    lower = name.lower()
+    if lower.endswith(".cif"):
+        return "cif"
+    if lower.endswith(".vasp") or name.startswith(("POSCAR", "CONTCAR")):
+        return "poscar"
+    if lower.endswith(".xsf"):
+        return "xsf"
+    return None
+
+
+def is_archive(filename: str) -> bool:
+    """Return whether a file is an archive that can be searched for structures."""
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _structure_name(filename: str) -> str:
+    name, _ = _split_compression(filename)
+    stem, suffix = os.path.splitext(name)
+    if suffix.lower() in (".cif", ".vasp", ".xsf"):
+        return stem
+    return name
+
+
+def find_structures(
+    folder: Union[str, os.PathLike], recursive: bool = True
+) -> Tuple[List[StructureSource], List[str]]:
+    """Find structure files and archives in a folder.
+
+    Args:
+        folder (Union[str, os.PathLike]): Folder to search.
+        recursive (bool): If True, also search the subfolders. Defaults to True.
+
+    Raises:
+        ValueError: If the names of the structures are not unique,
+            even with the full paths of the colliding files.
+
+    Returns:
+        Tuple[List[StructureSource], List[str]]: Structure files and paths to archives,
+            both sorted by path.
+    """
+    files = []
+    archives = []
+    for root, dirs, filenames in os.walk(folder):
+        dirs.sort()
+        if not recursive:
+            dirs.clear()
+        for filename in sorted(filenames):
+            path = os.path.join(root, filename)
+            relative = Path(path).relative_to(folder).as_posix()
+            if is_archive(filename):
+                archives.append(path)
+            elif structure_format(filename) is not None:
+                size = os.path.getsize(path)
+                files.append(StructureSource(_structure_name(relative), path, path, None, size))
+
+    counts = Counter(source.name for source in files)
+    files = [
+        source._replace(name=Path(source.path).relative_to(folder).as_posix())
+        if counts[source.name] > 1
+        else source
+        for source in files
+    ]
+    _check_unique(source.name for source in files)
+    return files, archives
+
+
+def _check_unique(names: Iterable[str]) -> None:
+    duplicates = [name for name, count in Counter(names).items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Structure names are not unique: {sorted(duplicates)}")
+
+
+def iter_archive(
+    path: Union[str, os.PathLike], name: Optional[str] = None, read: bool = True
+) -> Iterator[StructureSource]:
+    """Iterate over the structure files in an archive without extracting it.
+
+    Tar archives are read as a stream, i.e., every member is read once
+    and in the order in which it is stored.
+
+    Args:
+        path (Union[str, os.PathLike]): Path to the archive.
+        name (str, optional): Name of the archive used as prefix of the names
+            of the structures. Defaults to None, in which case the path is used.
+        read (bool): If False, the contents of the members are not read
+            and ``data`` is None. Defaults to True.
+
+    Yields:
+        StructureSource: Structure files in the archive.
+    """
+    prefix = Path(path).as_posix() if name is None else name
+    names = set()
+
+    def unique_name(filename: str) -> str:
+        # members that would share a name keep their full path, e.g., c.cif and c.cif.gz
+        member_name = f"{prefix}/{_structure_name(filename)}"
+        if member_name in names:
+            member_name = f"{prefix}/{filename}"
+        if member_name in names:
+            raise ValueError(f"Structure names are not unique: {[member_name]}")
+        names.add(member_name)
+        return member_name
+
+    if str(path).lower().endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or structure_format(info.filename) is None:
+                    continue
+                data = archive.read(info) if read else None
+                yield StructureSource(
+                    unique_name(info.filename),
+                    info.filename,
+                    None,
+                    data,
+                    info.file_size,
+                )
+        return
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or structure_format(member.name) is None:
+                continue
+            filename = posixpath.normpath(member.name)
+            data = archive.extractfile(member).read() if read else None
+            yield StructureSource(unique_name(filename), filename, None, data, member.size)
+
+
+def iter_structure_sources(
+    folder: Union[str, os.PathLike], recursive: bool = True, read: bool = True
+) -> Iterator[StructureSource]:
+    """Iterate over all structure files in a folder, including the ones in archives.
+
+    The files on disk come first, followed by the members of the archives.
+
+    Args:
+        folder (Union[str, os.PathLike]): Folder to search.
+        recursive (bool): If True, also search the subfolders. Defaults to True.
+        read (bool): If False, the contents of the members of archives are not read.
+            Defaults to True.
+
+    Yields:
+        StructureSource: Structure files.
+    """
+    files, archives = find_structures(folder, recursive=recursive)
+    yield from files
+    for archive in archives:
+        yield from iter_archive(archive, Path(archive).relative_to(folder).as_posix(), read=read)
+
+
+def read_structure(filename: str, data: Optional[bytes] = None) -> Structure:
+    """Read a structure from a file or from the contents of a file.
+
+    Args:
+        filename (str): Path of the file. Determines the format and compression.
+        data (bytes, optional): Contents of the file. Defaults to None,
+            in which case the file is read from disk.
+
+    Raises:
+        ValueError: If the format of the file is not recognized.
+
+    Returns:
+        Structure: pymatgen Structure.
+    """
+    fmt = structure_format(filename)
+    if fmt is None:
+        raise ValueError(f"Unknown structure format of {filename}")
+    if data is None:
+        with open(filename, "rb") as handle:
+            data = handle.read()
+    _, compression = _split_compression(filename)
+    if compression is not None:
+        data = _DECOMPRESS[compression](data)
+    return Structure.from_str(data.decode("utf8", errors="replace"), fmt=fmt)
@@ -1,27 +1,34 @@
 """Extract subgraphs from structure graphs."""
 import warnings
-from collections import defaultdict
-from typing import List, Tuple
+from collections import Counter, defaultdict
+from typing import Callable, Hashable, List, Optional, Sequence, Tuple, Union
 
 import networkx as nx
 import numpy as np
 from pymatgen.analysis.graphs import MoleculeGraph, StructureGraph
-from pymatgen.core import Element, Molecule, Structure
+from pymatgen.core import Element, Molecule, Species
 
-__all__ = ("get_subgraphs_as_molecules",)
+from ._hasher import weisfeiler_lehman_graph_hashes
+from .compact import CompactStructureGraph
+from .delete import _get_cutoff_strategy, _long_edge_mask
 
+__all__ = (
+    "MoleculeRecord",
+    "get_periodic_components",
+    "get_molecule_records",
+    "get_subgraphs_as_molecules",
+)
 
-def _is_in_cell(frac_coords: np.ndarray) -> bool:
-    return (frac_coords <= 1).all()
+#: Atomic masses indexed by atomic number.
+_ATOMIC_MASSES = np.array([0.0] + [float(Element.from_Z(z).atomic_mass) for z in range(1, 119)])
 
 
-def _is_any_atom_in_cell(frac_coords: np.ndarray) -> bool:
-    return any(_is_in_cell(row) for row in frac_coords)
-
-
-def _get_mass(atomic_symbol: str) -> float:
-    elem = Element(atomic_symbol)
-    return elem.atomic_mass
+def _warn_filter_in_cell() -> None:
+    warnings.warn(
+        "filter_in_cell is deprecated and has no effect, every molecule is returned once",
+        DeprecationWarning,
+        stacklevel=3,
+    )
 
 
 def com(xyz: np.ndarray, mass: np.ndarray) -> float:
@@ -30,235 +37,442 @@ def com(xyz: np.ndarray, mass: np.ndarray) -> float:
     return (xyz * mass).mean(0)
 
 
-def _select_parts_in_cell(
-    molecules: List[Molecule],
-    graphs: List[MoleculeGraph],
-    indices: List[List[int]],
-    indices_here: List[List[int]],
-    centers: List[np.ndarray],
-    fractional_coordinates: np.ndarray,
-    coordinates: np.ndarray,
-) -> Tuple[List[Molecule], List[MoleculeGraph], List[List[int]]]:
-    valid_indices = defaultdict(list)
-    for i, ind in enumerate(indices_here):
-        frac_coords = fractional_coordinates[ind]
-
-        if _is_any_atom_in_cell(frac_coords):
-            sorted_idx = sorted(indices[i])
-            valid_indices[str(sorted_idx)].append(i)
-
-    molecules_ = []
-    selected_indices = []
-    graphs_ = []
-    centers_ = []
-    coordinates_ = []
-
-    for _, v in valid_indices.items():
-        for index in v:
-            selected_indices.append(indices[index])
-            molecules_.append(molecules[index])
-            graphs_.append(graphs[index])
-            centers_.append(centers[index])
-            coordinates_.append(coordinates[index])
-
-    return molecules_, graphs_, selected_indices, centers_, coordinates_
-
-
-def get_subgraphs_as_molecules(  # noqa:C901
-    structure_graph: StructureGraph,
-    use_weights: bool = False,
-    return_unique: bool = True,
-    disable_boundary_crossing_check: bool = False,
-    filter_in_cell: bool = True,
-    prune_long_edges: bool = False,
-) -> Tuple[
-    List[Molecule], List[MoleculeGraph], List[List[int]], List[np.ndarray], List[np.ndarray]
-]:
-    """Isolates connected components as molecules from a StructureGraph.
+class MoleculeRecord:
+    """One molecule (finite connected component) found in a structure graph.
 
-    Copied from http://pymatgen.org/_modules/pymatgen/analysis/graphs.html#StructureGraph.get_subgraphs_as_molecules
-    and removed the duplicate check and added pruning of long edges that seem to cause
-    issues in some cases.
+    Only arrays are stored. The pymatgen :py:class:`Molecule`, the :py:class:`MoleculeGraph`
+    and the networkx graph are only built when they are requested.
 
-    This function also returns more info than the original function.
+    Args:
+        indices (np.ndarray): Index (``idx`` node attribute) of every atom
+            in the structure graph.
+        numbers (np.ndarray): Atomic number of every atom.
+        coords (np.ndarray): Unwrapped Cartesian coordinates of every atom, shape (n_atoms, 3).
+        src (np.ndarray): Index of the first atom (in the molecule) of every bond.
+        dst (np.ndarray): Index of the second atom (in the molecule) of every bond.
+        images (np.ndarray): Remaining lattice translation of every bond, shape (n_bonds, 3).
+            Zero for all bonds of molecules.
+        edge_data (List[dict], optional): Attributes of every bond, e.g., weights.
+            Defaults to None, in which case the bonds have no attributes besides ``to_jimage``.
+        species (Sequence[Species], optional): Species of every atom, used instead of the
+            atomic numbers to build the Molecule (e.g., to keep oxidation states).
+            Defaults to None.
+    """
 
-    .. warning::
+    __slots__ = (
+        "indices",
+        "numbers",
+        "coords",
+        "src",
+        "dst",
+        "images",
+        "edge_data",
+        "_species",
+        "_graph",
+    )
 
-        This edge pruning is a hack and should be removed when the underlying issue is fixed.
+    def __init__(
+        self,
+        indices: np.ndarray,
+        numbers: np.ndarray,
+        coords: np.ndarray,
+        src: np.ndarray,
+        dst: np.ndarray,
+        images: np.ndarray,
+        edge_data: Optional[List[dict]] = None,
+        species: Optional[Sequence[Species]] = None,
+    ):
+        self.indices = np.asarray(indices)
+        self.numbers = np.asarray(numbers, dtype=np.uint8)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 3)
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+        self.images = np.asarray(images, dtype=np.int64).reshape(-1, 3)
+        self.edge_data = edge_data
+        self._species = species
+        self._graph = None
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def __repr__(self) -> str:
+        return f"MoleculeRecord(n_atoms={len(self)}, n_bonds={len(self.src)})"
+
+    @property
+    def species(self) -> List[Union[Element, Species]]:
+        """Species of the atoms."""
+        if self._species is not None:
+            return list(self._species)
+        return [Element.from_Z(int(z)) for z in self.numbers.tolist()]
+
+    @property
+    def masses(self) -> np.ndarray:
+        """Atomic masses of the atoms."""
+        return _ATOMIC_MASSES[self.numbers]
+
+    @property
+    def center(self) -> np.ndarray:
+        """Mass-weighted center of the atoms, see :py:func:`com`."""
+        return com(self.coords, self.masses)
+
+    @property
+    def graph(self) -> nx.MultiDiGraph:
+        """networkx graph with ``idx``, ``specie`` and ``coord`` node attributes."""
+        if self._graph is None:
+            graph = nx.MultiDiGraph()
+            species = self.species
+            indices = self.indices.tolist()
+            for i in range(len(self)):
+                graph.add_node(i, idx=indices[i], specie=str(species[i]), coord=self.coords[i])
+            edge_data = self.edge_data or [{}] * len(self.src)
+            for u, v, image, data in zip(
+                self.src.tolist(), self.dst.tolist(), self.images.tolist(), edge_data
+            ):
+                graph.add_edge(u, v, **dict(data, to_jimage=tuple(image)))
+            self._graph = graph
+        return self._graph
+
+    def to_molecule(self, centered: bool = False) -> Molecule:
+        """Build a pymatgen Molecule.
+
+        Args:
+            centered (bool): If True, the center of mass is moved to the origin.
+                Defaults to False.
+
+        Returns:
+            Molecule: pymatgen Molecule.
+        """
+        molecule = Molecule(self.species, self.coords)
+        if centered:
+            molecule = molecule.get_centered_molecule()
+        return molecule
+
+    def to_molecule_graph(self, molecule: Optional[Molecule] = None) -> MoleculeGraph:
+        """Build a pymatgen MoleculeGraph.
+
+        Args:
+            molecule (Molecule, optional): Molecule of the graph.
+                Defaults to None, in which case :py:meth:`to_molecule` is used.
+
+        Returns:
+            MoleculeGraph: pymatgen MoleculeGraph.
+        """
+        molecule = self.to_molecule() if molecule is None else molecule
+        return MoleculeGraph(molecule, nx.readwrite.json_graph.adjacency_data(self.graph))
+
+
+def get_periodic_components(
+    n_sites: int, src: np.ndarray, dst: np.ndarray, images: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the connected components of a periodic graph.
+
+    The quotient graph is traversed once and every site is assigned the lattice
+    translation (offset) that places it in one connected copy of its component.
+    An edge from ``u`` to the image ``to_jimage`` of ``v`` is consistent with these offsets
+    if ``offsets[v] - offsets[u] == to_jimage``. Inconsistent edges close cycles with a
+    non-zero net translation, i.e., the component is periodic (a chain, layer or net).
+    All other components are finite (molecules), and the offsets unwrap them.
 
     Args:
-        structure_graph (StructureGraph): Structuregraph
-        use_weights (bool): If True, use weights for the edge matching
-        return_unique (bool): If true, it only returns the unique molecules.
-            If False, it will return all molecules that
-            are completely included in the unit cell
-            and fragments of the ones that are only partly in the cell
-        disable_boundary_crossing_check (bool): If true, it will not check
-            if the molecules are crossing the boundary of the unit cell.
-            Default is False.
-        filter_in_cell (bool): If True, it will only return molecules
-            that have at least one atom in the cell
-        prune_long_edges (bool): If True, it will remove long edges.
-            This is somewhat of a hack to workaround a bug i suspect
-            in the __mul__ method of StructureGraph.
+        n_sites (int): Number of sites.
+        src (np.ndarray): Index of the first site of every edge.
+        dst (np.ndarray): Index of the second site of every edge.
+        images (np.ndarray): Image of the second site of every edge, shape (n_edges, 3).
 
     Returns:
-        Tuple[List[Molecule], List[MoleculeGraph], List[List[int]], List[np.ndarray], List[np.ndarray]]:
-            A tuple of (molecules, graphs, indices, centers, coordinates)
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Component label of every site,
+            offset of every site (shape (n_sites, 3)), and whether every component is periodic.
+            Components are numbered in the order of their lowest site index,
+            which has a zero offset.
     """
-    # creating a supercell is an easy way to extract
-    # molecules (and not, e.g., layers of a 2D crystal)
-    # without adding extra logic
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    images = np.asarray(images, dtype=np.int64).reshape(-1, 3)
+
+    # half-edges in both directions, sorted by their first site
+    heads = np.concatenate((src, dst))
+    order = np.argsort(heads, kind="stable")
+    tails = np.concatenate((dst, src))[order].tolist()
+    shifts = np.concatenate((images, -images))[order].tolist()
+    indptr = np.searchsorted(heads[order], np.arange(n_sites + 1)).tolist()
+
+    labels = [-1] * n_sites
+    offsets = [(0, 0, 0)] * n_sites
+    n_components = 0
+    for root in range(n_sites):
+        if labels[root] >= 0:
+            continue
+        labels[root] = n_components
+        stack = [root]
+        while stack:
+            u = stack.pop()
+            a, b, c = offsets[u]
+            for k in range(indptr[u], indptr[u + 1]):
+                v = tails[k]
+                if labels[v] < 0:
+                    labels[v] = n_components
+                    x, y, z = shifts[k]
+                    offsets[v] = (a + x, b + y, c + z)
+                    stack.append(v)
+        n_components += 1
+
+    labels = np.array(labels, dtype=np.int64)
+    offsets = np.array(offsets, dtype=np.int64).reshape(-1, 3)
+    inconsistent = (offsets[dst] - offsets[src] != images).any(axis=1)
+    periodic = np.zeros(n_components, dtype=bool)
+    periodic[labels[src[inconsistent]]] = True
+    return labels, offsets, periodic
+
+
+def _first_of_each_isomorphism_class(
+    keys: Sequence[Hashable],
+    get_graph: Callable[[int], nx.MultiDiGraph],
+    node_match: Callable,
+    edge_match: Callable,
+) -> List[int]:
+    """Return the indices of the graphs that are not isomorphic to any graph before them.
+
+    Isomorphic graphs have the same invariants (e.g. species and number of edges)
+    and the same Weisfeiler-Lehman hash.
+    Hence, the graphs are sorted into buckets with equal ``keys``
+    and the exact (VF2) isomorphism test is only run within a bucket.
+    Graphs are only built (with ``get_graph``) for buckets with more than one member,
+    and their WL hashes are computed in one batch.
 
-    sg = structure_graph.__copy__()
-    sg.structure = Structure.from_sites(sg.structure.sites)
+    Args:
+        keys (Sequence[Hashable]): Isomorphism invariant of each graph.
+        get_graph (Callable[[int], nx.MultiDiGraph]): Returns the graph with a given index.
+            Nodes need a ``specie`` attribute.
+        node_match (Callable): Node match function for :py:func:`networkx.is_isomorphic`.
+        edge_match (Callable): Edge match function for :py:func:`networkx.is_isomorphic`.
 
-    try:
-        node_attributes = nx.get_node_attributes(sg.graph, "idx")
-        if len(node_attributes) == 0:
-            raise KeyError("No node attributes found")
-    except KeyError:
-        warnings.warn("No node attributes found. Using indices as node attributes.")
-        nx.set_node_attributes(
-            sg.graph,
-            name="idx",
-            values=dict(zip(range(len(structure_graph)), range(len(structure_graph)))),
+    Returns:
+        List[int]: Indices of the first graph of each isomorphism class.
+    """
+    key_counts = Counter(keys)
+    shared = [i for i, key in enumerate(keys) if key_counts[key] > 1]
+    undirected = {i: nx.MultiGraph(get_graph(i)) for i in shared}
+    wl_hashes = dict(
+        zip(
+            shared,
+            weisfeiler_lehman_graph_hashes([undirected[i] for i in shared], node_attr="specie"),
         )
-
-    # This the __mul__ method seems buggy.
-    # potentially this issue here https://github.com/materialsproject/pymatgen/issues/1309
-    supercell_sg = sg * (3, 3, 3)
-    s_indices = np.arange(len(supercell_sg.structure))
-    nx.set_node_attributes(
-        supercell_sg.graph, dict(zip(s_indices, supercell_sg.structure.cart_coords)), "coords"
     )
 
-    # make undirected to find connected subgraphs
-    supercell_sg.graph = nx.Graph(supercell_sg.graph)
-
-    if prune_long_edges:
-        edges_to_remove = []
-        for u, v, _ in supercell_sg.graph.edges(data=True):
-            # ToDo: make this dependent on the cutoffidct
-            if (
-                np.linalg.norm(
-                    supercell_sg.graph.nodes(data=True)[u]["coords"]
-                    - supercell_sg.graph.nodes(data=True)[v]["coords"]
-                )
-                > 3
-            ):
-                edges_to_remove.append((u, v))
-
-        for edge_to_remove in edges_to_remove:
-            supercell_sg.graph.remove_edge(*edge_to_remove)
-
-    # find subgraphs
-    all_subgraphs = [
-        supercell_sg.graph.subgraph(c).copy() for c in nx.connected_components(supercell_sg.graph)
-    ]
-
-    # discount subgraphs that lie across *supercell* boundaries
-    # these will subgraphs representing crystals
-    molecule_subgraphs = []
-
-    for subgraph in all_subgraphs:
-        if disable_boundary_crossing_check:
-            molecule_subgraphs.append(nx.MultiDiGraph(subgraph))
-        else:
-            intersects_boundary = any(
-                (d["to_jimage"] != (0, 0, 0) for u, v, d in subgraph.edges(data=True))
-            )
-            if not intersects_boundary:
-                molecule_subgraphs.append(nx.MultiDiGraph(subgraph))
-
-    # add specie names to graph to be able to test for isomorphism
-    for subgraph in molecule_subgraphs:
-        for node in subgraph:
-            subgraph.add_node(
-                node,
-                specie=str(supercell_sg.structure[node].specie),
-                coord=supercell_sg.structure[node].coords,
+    buckets = defaultdict(list)
+    unique = []
+    for i, key in enumerate(keys):
+        if key_counts[key] == 1:
+            unique.append(i)
+            continue
+        bucket = buckets[key]
+        candidates = [j for j in bucket if wl_hashes[j] == wl_hashes[i]]
+        if not any(
+            nx.is_isomorphic(
+                undirected[i], undirected[j], node_match=node_match, edge_match=edge_match
             )
+            for j in candidates
+        ):
+            bucket.append(i)
+            unique.append(i)
+    return unique
 
-    unique_subgraphs = []
 
-    def node_match(n1, n2):
-        return n1["specie"] == n2["specie"]
+def get_molecule_records(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    use_weights: bool = False,
+    return_unique: bool = True,
+    disable_boundary_crossing_check: bool = False,
+    filter_in_cell: Optional[bool] = None,
+    prune_long_edges: Union[bool, str] = False,
+) -> List[MoleculeRecord]:
+    """Find the molecules in a structure graph as lightweight records.
 
-    def edge_match(e1, e2):
-        if use_weights:
-            return e1["weight"] == e2["weight"]
-        return True
+    Same as :py:func:`get_subgraphs_as_molecules`, but the molecules are returned as
+    :py:class:`MoleculeRecord` objects, which only hold arrays and build pymatgen
+    objects on demand. Use this if only the indices, coordinates or centers are needed.
 
-    if return_unique:
-        for subgraph in molecule_subgraphs:
-            already_present = [
-                nx.is_isomorphic(subgraph, g, node_match=node_match, edge_match=edge_match)
-                for g in unique_subgraphs
-            ]
-
-            if not any(already_present):
-                unique_subgraphs.append(subgraph)
-
-    def make_mols(molecule_subgraphs=None, center=False):
-        if molecule_subgraphs is None:
-            molecule_subgraphs = molecule_subgraphs
-        molecules = []
-        indices = []
-        indices_here = []
-        mol_centers = []
-        coordinates = []
-        for subgraph in molecule_subgraphs:
-            idx = [subgraph.nodes[n]["idx"] for n in subgraph.nodes()]
-            coords = np.array([subgraph.nodes()[i]["coord"] for i in subgraph.nodes()])
-            species = [supercell_sg.structure[n].specie for n in subgraph.nodes()]
-            idx_here = list(subgraph.nodes())
-            molecule = Molecule(species, coords)  # site_properties={"binding": binding}
-
-            masses = np.array(
-                [_get_mass(str(supercell_sg.structure[idx].specie)) for idx in idx_here]
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): Structuregraph
+        use_weights (bool): If True, use weights for the edge matching
+        return_unique (bool): If true, it only returns the unique molecules.
+            If False, it will return all molecules in the unit cell.
+        disable_boundary_crossing_check (bool): If true, it will also return
+            (one unwrapped copy of the sites of) periodic components.
+            Default is False.
+        filter_in_cell (bool, optional): Deprecated and ignored. Every molecule is
+            returned exactly once, with its atom of lowest index in the unit cell.
+        prune_long_edges (Union[bool, str]): If True or the name of a cutoff-based
+            local environment method (e.g., "vesta", which is used for True),
+            ignore edges that are longer than the cutoff of the species pair,
+            see :py:func:`~structuregraph_helpers.delete.remove_long_edges`.
+            The structure graph itself is not modified. Defaults to False.
+
+    Returns:
+        List[MoleculeRecord]: Molecules, ordered by the lowest index of their atoms.
+
+    Example:
+        >>> from structuregraph_helpers.subgraph import get_molecule_records
+        >>> [record.center for record in get_molecule_records(structure_graph)]
+        [array([...])]
+    """
+    if filter_in_cell is not None:
+        _warn_filter_in_cell()
+    if isinstance(structure_graph, CompactStructureGraph):
+        structure = structure_graph.structure
+        src, dst, images = structure_graph.src, structure_graph.dst, structure_graph.images
+        edge_data = None
+        idx = np.arange(len(structure))
+    else:
+        structure = structure_graph.structure
+        edges = list(structure_graph.graph.edges(data=True))
+        edge_array = np.array(
+            [(u, v, *d["to_jimage"]) for u, v, d in edges], dtype=np.int64
+        ).reshape(-1, 5)
+        src, dst, images = edge_array[:, 0], edge_array[:, 1], edge_array[:, 2:]
+        edge_data = [
+            {key: value for key, value in d.items() if key != "to_jimage"} for _, _, d in edges
+        ]
+        node_attributes = nx.get_node_attributes(structure_graph.graph, "idx")
+        if len(node_attributes) == 0:
+            warnings.warn("No node attributes found. Using indices as node attributes.")
+        idx = np.array([node_attributes.get(i, i) for i in range(len(structure))])
+
+    numbers = np.array(structure.atomic_numbers, dtype=np.uint8)
+    if prune_long_edges:
+        strategy = _get_cutoff_strategy("vesta" if prune_long_edges is True else prune_long_edges)
+        keep = ~_long_edge_mask(
+            structure.lattice, structure.frac_coords, numbers, src, dst, images, strategy
+        )
+        src, dst, images = src[keep], dst[keep], images[keep]
+        if edge_data is not None:
+            edge_data = [data for data, kept in zip(edge_data, keep.tolist()) if kept]
+
+    labels, offsets, periodic = get_periodic_components(len(structure), src, dst, images)
+    frac_coords = structure.frac_coords + offsets
+    cart_coords = structure.lattice.get_cartesian_coords(frac_coords)
+    # only keep the species objects if they carry more than the element
+    species = structure.species
+    if all(isinstance(specie, Element) for specie in species):
+        species = None
+    # edges that close a cycle with a non-zero translation keep their remaining translation
+    residual_images = offsets[src] + images - offsets[dst]
+
+    site_order = np.argsort(labels, kind="stable")
+    site_counts = np.bincount(labels, minlength=len(periodic))
+    site_starts = np.concatenate(([0], np.cumsum(site_counts)[:-1]))
+    # position of every site within its component
+    local = np.empty(len(labels), dtype=np.int64)
+    local[site_order] = np.arange(len(labels)) - site_starts[labels[site_order]]
+    edge_order = np.argsort(labels[src], kind="stable")
+    edge_counts = np.bincount(labels[src], minlength=len(periodic))
+    edge_starts = np.concatenate(([0], np.cumsum(edge_counts)[:-1]))
+
+    records = []
+    for component in range(len(periodic)):
+        if periodic[component] and not disable_boundary_crossing_check:
+            continue
+        sites = site_order[site_starts[component] : site_starts[component] + site_counts[component]]
+        edges = edge_order[edge_starts[component] : edge_starts[component] + edge_counts[component]]
+        records.append(
+            MoleculeRecord(
+                idx[sites],
+                numbers[sites],
+                cart_coords[sites],
+                local[src[edges]],
+                local[dst[edges]],
+                residual_images[edges],
+                None if edge_data is None else [edge_data[edge] for edge in edges.tolist()],
+                None if species is None else [species[site] for site in sites.tolist()],
             )
-            mol_centers.append(com(supercell_sg.structure.cart_coords[idx_here], masses))
-            # shift so origin is at center of mass
-            if center:
-                molecule = molecule.get_centered_molecule()
-            indices.append(idx)
-            molecules.append(molecule)
-            indices_here.append(idx_here)
-            coordinates.append(coords)
-            assert len(subgraph) == len(coords) == len(idx) == len(idx_here)
-        return molecules, indices, indices_here, mol_centers, coordinates
-
-    def relabel_graph(multigraph):
-        mapping = dict(zip(multigraph, range(0, len(multigraph.nodes()))))
-        return nx.readwrite.json_graph.adjacency_data(nx.relabel_nodes(multigraph, mapping))
+        )
 
     if return_unique:
-        mol, idx, indices_here, centers, coordinates = make_mols(unique_subgraphs, center=True)
-        return_subgraphs = unique_subgraphs
-        return (
-            mol,
-            [MoleculeGraph(mol, relabel_graph(graph)) for mol, graph in zip(mol, return_subgraphs)],
-            idx,
-            centers,
-            coordinates,
-        )
 
-    mol, idx, indices_here, centers, coordinates = make_mols(molecule_subgraphs)
-
-    return_subgraphs = [
-        MoleculeGraph(mol, relabel_graph(graph)) for mol, graph in zip(mol, molecule_subgraphs)
-    ]
-
-    if filter_in_cell:
-        mol, return_subgraphs, idx, centers, coordinates = _select_parts_in_cell(
-            mol,
-            return_subgraphs,
-            idx,
-            indices_here,
-            centers,
-            sg.structure.lattice.get_fractional_coords(supercell_sg.structure.cart_coords),
-            coordinates,
+        def node_match(n1, n2):
+            return n1["specie"] == n2["specie"]
+
+        def edge_match(e1, e2):
+            if use_weights:
+                return e1["weight"] == e2["weight"]
+            return True
+
+        keys = [
+            (tuple(sorted(Counter(record.numbers.tolist()).items())), len(record.src))
+            for record in records
+        ]
+        keep = _first_of_each_isomorphism_class(
+            keys, lambda i: records[i].graph, node_match, edge_match
         )
+        records = [records[i] for i in keep]
+
+    return records
+
+
+def get_subgraphs_as_molecules(
+    structure_graph: Union[StructureGraph, CompactStructureGraph],
+    use_weights: bool = False,
+    return_unique: bool = True,
+    disable_boundary_crossing_check: bool = False,
+    filter_in_cell: Optional[bool] = None,
+    prune_long_edges: Union[bool, str] = False,
+) -> Tuple[
+    List[Molecule], List[MoleculeGraph], List[List[int]], List[np.ndarray], List[np.ndarray]
+]:
+    """Isolates connected components as molecules from a StructureGraph.
+
+    Based on http://pymatgen.org/_modules/pymatgen/analysis/graphs.html#StructureGraph.get_subgraphs_as_molecules
+    without the duplicate check. Instead of finding the components of a 3x3x3 supercell,
+    the components of the structure graph are found with :py:func:`get_periodic_components`.
+    Every molecule is returned once, unwrapped such that the atom with the lowest index
+    is in the unit cell and all bonds are between neighboring atoms.
+
+    This function also returns more info than the original function.
+    If only indices, centers or coordinates are needed, :py:func:`get_molecule_records`
+    avoids building the pymatgen objects.
+
+    Args:
+        structure_graph (Union[StructureGraph, CompactStructureGraph]): Structuregraph
+        use_weights (bool): If True, use weights for the edge matching
+        return_unique (bool): If true, it only returns the unique molecules.
+            If False, it will return all molecules in the unit cell.
+        disable_boundary_crossing_check (bool): If true, it will also return
+            (one unwrapped copy of the sites of) periodic components.
+            Default is False.
+        filter_in_cell (bool, optional): Deprecated and ignored. Every molecule is
+            returned exactly once, with its atom of lowest index in the unit cell.
+        prune_long_edges (Union[bool, str]): If True or the name of a cutoff-based
+            local environment method (e.g., "vesta", which is used for True),
+            ignore edges that are longer than the cutoff of the species pair,
+            see :py:func:`~structuregraph_helpers.delete.remove_long_edges`.
+            The structure graph itself is not modified. Defaults to False.
+
+    Returns:
+        Tuple[List[Molecule], List[MoleculeGraph], List[List[int]], List[np.ndarray], List[np.ndarray]]:
+            A tuple of (molecules, graphs, indices, centers, coordinates)
+    """
+    if filter_in_cell is not None:
+        _warn_filter_in_cell()
+    records = get_molecule_records(
+        structure_graph,
+        use_weights=use_weights,
+        return_unique=return_unique,
+        disable_boundary_crossing_check=disable_boundary_crossing_check,
+        prune_long_edges=prune_long_edges,
+    )
 
-    return mol, return_subgraphs, idx, centers, coordinates
+    molecules = []
+    graphs = []
+    indices = []
+    centers = []
+    coordinates = []
+    for record in records:
+        # shift so origin is at center of mass
+        molecule = record.to_molecule(centered=return_unique)
+        molecules.append(molecule)
+        graphs.append(record.to_molecule_graph(molecule))
+        indices.append(record.indices.tolist())
+        centers.append(record.center)
+        coordinates.append(record.coords)
+
+    return molecules, graphs, indices, centers, coordinates
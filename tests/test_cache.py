@@ -0,0 +1,79 @@
+import os
+import shutil
+
+from structuregraph_helpers.cache import HashCache, file_digest
+from structuregraph_helpers.cli import compute_hashes_for_folder, create_hashes_for_structure
+
+from .conftest import _THIS_DIR
+
+_MOF_74 = os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif")
+
+
+def test_hash_cache(tmp_path):
+    with HashCache(tmp_path / "cache.sqlite", max_entries=2) as cache:
+        cache.set("a", {"decorated_graph_hash": "1", "undecorated_graph_hash": "2"}, "vesta", False)
+        cache.set(
+            "b",
+            {"decorated_graph_hash": "3", "undecorated_graph_hash": float("nan")},
+            "vesta",
+            False,
+        )
+        assert len(cache) == 3
+
+        kinds = ["decorated_graph_hash", "undecorated_graph_hash"]
+        assert cache.get("b", kinds, "vesta", False) == {"decorated_graph_hash": "3"}
+        assert cache.get("a", kinds, "vesta", False) == dict(zip(kinds, "12"))
+        assert cache.get("a", kinds, "vesta", True) == {}
+        assert cache.get("a", kinds, "jmol", False) == {}
+
+        # the hashes of "a" were read after the one of "b" was written
+        assert cache.evict() == 1
+        assert cache.get("b", kinds, "vesta", False) == {}
+        assert len(cache.get("a", kinds, "vesta", False)) == 2
+
+
+def test_hash_cache_lookups_do_not_write(tmp_path):
+    kinds = ["decorated_graph_hash"]
+    with HashCache(tmp_path / "cache.sqlite", max_entries=1) as cache:
+        cache.set("a", {kinds[0]: "1"}, "vesta", False)
+        cache.set("b", {kinds[0]: "2"}, "vesta", False)
+        changes = cache._connection.total_changes
+        for _ in range(10):
+            assert cache.get("a", kinds, "vesta", False) == {kinds[0]: "1"}
+        assert cache._connection.total_changes == changes
+        # the access times are written before the eviction, "b" is the oldest entry
+        assert cache.evict() == 1
+        assert cache.get("a", kinds, "vesta", False) == {kinds[0]: "1"}
+        assert cache.get("b", kinds, "vesta", False) == {}
+
+
+def test_create_hashes_with_cache(tmp_path):
+    kinds = ["decorated_graph_hash", "undecorated_scaffold_hash"]
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        hashes = create_hashes_for_structure(_MOF_74, kinds=kinds, cache=cache)
+        assert hashes == create_hashes_for_structure(_MOF_74, kinds=kinds)
+        assert len(cache) == 2
+
+        # the second call is answered from the cache
+        cache.set(file_digest(_MOF_74), {"decorated_graph_hash": "cached"}, "vesta", False)
+        hashes = create_hashes_for_structure(_MOF_74, kinds=kinds, cache=cache)
+        assert hashes["decorated_graph_hash"] == "cached"
+
+
+def test_compute_hashes_for_folder_with_cache(tmp_path):
+    folder = tmp_path / "cifs"
+    folder.mkdir()
+    shutil.copy(_MOF_74, folder / "a.cif")
+    shutil.copy(_MOF_74, folder / "b.cif")
+    kinds = ["decorated_scaffold_hash"]
+
+    with HashCache(tmp_path / "cache.sqlite") as cache:
+        hashes = compute_hashes_for_folder(folder, None, kinds=kinds, cache=cache)
+        assert hashes == compute_hashes_for_folder(folder, None, kinds=kinds)
+        assert hashes["a"] == hashes["b"]
+        # both files have the same contents, hence, share the cache entry
+        assert len(cache) == 1
+
+        cache.set(file_digest(folder / "a.cif"), {kinds[0]: "cached"}, "vesta", False)
+        hashes = compute_hashes_for_folder(folder, None, kinds=kinds, cache=cache)
+        assert hashes["a"][kinds[0]] == hashes["b"][kinds[0]] == "cached"
@@ -1,14 +1,140 @@
+import json
 import os
+import shutil
 
+import numpy as np
+import pytest
 from click.testing import CliRunner
 
-from structuregraph_helpers.cli import get_hash
+from structuregraph_helpers.cli import (
+    _schedule,
+    compute_hashes_for_folder,
+    get_hash,
+    get_hashes,
+    in_shard,
+    merge,
+    merge_hash_files,
+)
 
 from .conftest import _THIS_DIR
 
 
+@pytest.fixture(autouse=True)
+def _cache_home(tmp_path, monkeypatch):
+    """Keep the default hash cache out of the home directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+
 def test_cli_get_hash():
     runner = CliRunner()
     result = runner.invoke(get_hash, str(os.path.join(_THIS_DIR, "test_files", "HKUST-1.cif")))
     assert result.exit_code == 0
     assert "decorated_graph_hash" in result.output
+
+
+def test_cli_get_hash_kinds():
+    runner = CliRunner()
+    result = runner.invoke(
+        get_hash,
+        [
+            str(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif")),
+            "--kind",
+            "decorated_scaffold_hash",
+        ],
+    )
+    assert result.exit_code == 0
+    assert "decorated_scaffold_hash" in result.output
+    assert "decorated_graph_hash" not in result.output
+
+
+def test_cli_get_hash_cache(tmp_path):
+    runner = CliRunner()
+    cache_path = tmp_path / "hashes.sqlite"
+    structure_file = str(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif"))
+    for _ in range(2):
+        result = runner.invoke(get_hash, [structure_file, "--cache", str(cache_path)])
+        assert result.exit_code == 0
+        assert "decorated_graph_hash" in result.output
+    assert cache_path.exists()
+
+    result = runner.invoke(get_hash, [structure_file, "--no-cache"])
+    assert result.exit_code == 0
+
+
+def test_compute_hashes_for_folder_jsonl(tmp_path):
+    folder = tmp_path / "cifs"
+    folder.mkdir()
+    for name in ("a", "b", "c"):
+        shutil.copy(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif"), folder / f"{name}.cif")
+    kinds = ["decorated_scaffold_hash"]
+    expected = compute_hashes_for_folder(folder, None, kinds=kinds)
+
+    outname = tmp_path / "hashes.jsonl"
+    assert compute_hashes_for_folder(folder, outname, kinds=kinds) is None
+    lines = outname.read_text().splitlines()
+    assert {json.loads(line)["name"]: json.loads(line)[kinds[0]] for line in lines} == {
+        name: hashes[kinds[0]] for name, hashes in expected.items()
+    }
+
+    # simulate a run that crashed while writing the second line
+    outname.write_text(lines[0] + "\n" + lines[1][:10])
+    compute_hashes_for_folder(folder, outname, kinds=kinds, resume=True)
+    assert sorted(outname.read_text().splitlines()) == sorted(lines)
+
+
+def test_schedule():
+    costs = [1, 100, 2, 1, 50, 1, 1]
+    chunks = _schedule(costs, n_workers=2, chunks_per_worker=2)
+    assert sorted(i for chunk in chunks for i in chunk) == list(range(len(costs)))
+    # the expensive tasks come first and on their own
+    assert chunks[:2] == [[1], [4]]
+    assert chunks[-1] == [2, 0, 3, 5, 6]
+
+
+def test_compute_hashes_for_folder_skipped(tmp_path):
+    shutil.copy(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif"), tmp_path / "good.cif")
+    (tmp_path / "bad.cif").write_text("not a cif")
+    kinds = ["decorated_graph_hash"]
+
+    hashes = compute_hashes_for_folder(tmp_path, None, kinds=kinds, timeout=60)
+    assert "skipped" not in hashes["good"]
+    assert np.isnan(hashes["bad"][kinds[0]])
+    assert hashes["bad"]["skipped"].startswith("error: ")
+
+    hashes = compute_hashes_for_folder(tmp_path, None, kinds=kinds, fallback_method="li")
+    assert hashes["bad"]["skipped"].count("error: ") == 2
+
+
+def test_shards_and_merge(tmp_path):
+    folder = tmp_path / "cifs"
+    folder.mkdir()
+    names = [f"structure_{i}" for i in range(12)]
+    for name in names:
+        shutil.copy(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif"), folder / f"{name}.cif")
+
+    # every structure is in exactly one shard
+    assert all(sum(in_shard(name, (i, 3)) for i in range(3)) == 1 for name in names)
+
+    runner = CliRunner()
+    outputs = []
+    for i in range(3):
+        outputs.append(str(tmp_path / f"shard_{i}.jsonl"))
+        args = [str(folder), outputs[-1], "--shard", f"{i}/3", "--kind", "decorated_graph_hash"]
+        result = runner.invoke(get_hashes, args)
+        assert result.exit_code == 0
+    assert runner.invoke(get_hashes, [str(folder), outputs[0], "--shard", "3/3"]).exit_code != 0
+
+    report = merge_hash_files(outputs, tmp_path / "merged.json", folder=folder)
+    assert report["n_structures"] == len(names)
+    assert report["missing"] == report["duplicates"] == report["conflicts"] == []
+    with open(tmp_path / "merged.json") as handle:
+        assert sorted(json.load(handle)) == sorted(names)
+
+    # one shard twice, one shard missing
+    result = runner.invoke(
+        merge, [str(tmp_path / "merged.jsonl"), outputs[0], outputs[0], "--folder", str(folder)]
+    )
+    assert result.exit_code == 1
+    assert "missing" in result.output
+    report = merge_hash_files([outputs[0], outputs[0]], folder=folder)
+    assert len(report["missing"]) + len(report["duplicates"]) == len(names)
@@ -0,0 +1,58 @@
+import numpy as np
+from pymatgen.analysis.graphs import StructureGraph
+
+from structuregraph_helpers.compact import CompactStructureGraph
+from structuregraph_helpers.create import (
+    VestaCutoffDictNN,
+    construct_clean_graph,
+    get_compact_structure_graph,
+)
+from structuregraph_helpers.delete import (
+    get_structure_graph_with_broken_bridges,
+    get_structure_graph_without_leaf_nodes,
+    remove_all_nodes_not_in_indices,
+)
+from structuregraph_helpers.hash import compute_hashes
+
+
+def test_compact_structure_graph_roundtrip(bcc_graph):
+    compact = CompactStructureGraph.from_structure_graph(bcc_graph)
+    assert len(compact) == 2
+    assert compact.n_edges == len(bcc_graph.graph.edges)
+    assert compact.images.dtype == np.int8
+    assert compact.to_structure_graph() == bcc_graph
+
+    for site in range(len(bcc_graph)):
+        assert compact.coordination_numbers()[site] == bcc_graph.get_coordination_of_site(site)
+        assert compact.degrees()[site] == bcc_graph.graph.degree(site)
+
+    subgraph = compact.subgraph([1])
+    assert len(subgraph) == 1
+    assert subgraph.n_edges == 0
+
+    remove_all_nodes_not_in_indices(compact, [0])
+    assert len(compact) == 1
+    assert compact.n_edges == 2
+
+
+def test_compact_structure_graph_hashes(mof_74_zr_nh2):
+    sg = StructureGraph.with_local_env_strategy(mof_74_zr_nh2, VestaCutoffDictNN)
+    compact = get_compact_structure_graph(mof_74_zr_nh2)
+    assert compact.to_structure_graph() == sg
+
+    clean_graph = construct_clean_graph(sg, multigraph=True, directed=True)
+    compact_clean_graph = construct_clean_graph(compact, multigraph=True, directed=True)
+    assert sorted(clean_graph.edges(data="voltage")) == sorted(
+        compact_clean_graph.edges(data="voltage")
+    )
+    assert dict(clean_graph.nodes(data="specie")) == dict(compact_clean_graph.nodes(data="specie"))
+
+    for lqg in (True, False):
+        assert compute_hashes(compact, lqg=lqg) == compute_hashes(sg, lqg=lqg)
+
+    for delete in (get_structure_graph_without_leaf_nodes, get_structure_graph_with_broken_bridges):
+        compact_pruned, _ = delete(compact)
+        pruned, _ = delete(sg)
+        assert isinstance(compact_pruned, CompactStructureGraph)
+        assert compact_pruned.structure.composition == pruned.structure.composition
+        assert compact_pruned.n_edges == len(pruned.graph.edges)
@@ -2,10 +2,15 @@ import networkx as nx
 from pymatgen.analysis.graphs import StructureGraph
 
 from structuregraph_helpers.create import (
+    ATRCutoffDictNN,
+    LICutoffDictNN,
     VestaCutoffDictNN,
+    _voltage,
     construct_clean_graph,
     get_local_env_method,
     get_nx_graph_from_edge_tuples,
+    get_structure_graph,
+    get_structure_graph_from_cutoffs,
 )
 
 
@@ -19,6 +24,19 @@ def test_vesta_cutoffs(ag_n_structure):
     )
 
 
+def test_get_structure_graph_from_cutoffs(ag_n_structure, mof_74_zr_nh2):
+    for structure in (ag_n_structure, mof_74_zr_nh2):
+        for strategy in (VestaCutoffDictNN, ATRCutoffDictNN, LICutoffDictNN):
+            expected = StructureGraph.with_local_env_strategy(structure, strategy)
+            sg = get_structure_graph_from_cutoffs(structure, strategy)
+            assert sg == expected
+            assert len(sg.graph.edges) == len(expected.graph.edges)
+
+    sg = get_structure_graph(ag_n_structure)
+    assert len(sg.get_connected_sites(0)) == 6
+    assert sg.graph.nodes[3]["idx"] == 3
+
+
 def test_get_nx_graph_from_edge_tuples():
     edge_tuples = [(0, 0), (0, 1), (1, 0), (1, 1)]
     graph = get_nx_graph_from_edge_tuples(edge_tuples)
@@ -66,3 +84,20 @@ def test_construct_clean_graph(bcc_graph):
     assert isinstance(graph, nx.MultiDiGraph)
     assert len(graph.nodes) == 2
     assert len(graph.edges) == 6  # there are duplicates in the original graph
+
+
+def test_construct_clean_graph_attributes(mof_74_zr_nh2):
+    """The bulk construction must agree with the per-site StructureGraph methods."""
+    structure_graph = get_structure_graph(mof_74_zr_nh2, "vesta")
+    graph = construct_clean_graph(structure_graph, multigraph=True)
+
+    for node in graph.nodes:
+        specie = str(structure_graph.structure[node].specie)
+        coordination_number = structure_graph.get_coordination_of_site(node)
+        assert graph.nodes[node]["specie"] == specie
+        assert graph.nodes[node]["specie-cn"] == f"{specie}-{coordination_number}"
+
+    expected = sorted(
+        _voltage(u, v, d["to_jimage"]) for u, v, d in structure_graph.graph.edges(data=True)
+    )
+    assert sorted(d["voltage"] for _, _, d in graph.edges(data=True)) == expected
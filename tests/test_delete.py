@@ -1,9 +1,21 @@
 import networkx as nx
+import numpy as np
+import pytest
 from pymatgen.analysis.graphs import StructureGraph
+from pymatgen.core import Lattice, Structure
 
+from structuregraph_helpers.compact import CompactStructureGraph
+from structuregraph_helpers.create import get_structure_graph
 from structuregraph_helpers.delete import (
+    _leaf_mask,
+    _scaffold_sites,
+    get_induced_subgraphs,
+    get_non_leaf_indices,
+    get_scaffold_indices,
+    get_structure_graph_with_broken_bridges,
     get_structure_graph_without_leaf_nodes,
     remove_all_nodes_not_in_indices,
+    remove_long_edges,
 )
 
 
@@ -27,3 +39,105 @@ def test_get_structure_graph_without_leaf_nodes(hkust_graph):
     assert new_comp["Cu"] == 48
     assert new_comp["O"] == 192
     assert new_comp["C"] == 288.0
+
+
+def test_remove_long_edges():
+    structure = Structure(
+        Lattice.cubic(8),
+        ["C", "O", "C", "O"],
+        [[0, 0, 0], [0.14, 0, 0], [0.5, 0.5, 0.5], [0.64, 0.5, 0.5]],
+    )
+    sg = get_structure_graph(structure, "vesta")
+    assert len(sg.graph.edges) == 2
+    # C-O distance of about 7.6 A, longer than the VESTA cutoff
+    sg.add_edge(0, 3, to_jimage=(0, 0, 0))
+    compact = CompactStructureGraph.from_structure_graph(sg)
+
+    supercell = sg * (3, 3, 3)
+    assert remove_long_edges(supercell) == 27
+    assert len(supercell.graph.edges) == 54
+
+    assert remove_long_edges(sg, tolerance=10) == 0
+    assert remove_long_edges(sg, "vesta") == 1
+    assert len(sg.graph.edges) == 2
+
+    assert remove_long_edges(compact) == 1
+    assert compact.n_edges == 2
+
+    with pytest.raises(ValueError):
+        remove_long_edges(sg, "crystalnn")
+
+
+def test_get_scaffold_indices(mof_74_zr_nh2, monkeypatch):
+    # two triangles joined by a bridge, and a chain hanging from the second one
+    src = [0, 1, 2, 2, 3, 4, 5, 6]
+    dst = [1, 2, 0, 3, 4, 5, 3, 7]
+    assert _scaffold_sites(8, src, dst).tolist() == [0, 1, 2]
+    # a loop (edge to an image of the site itself) is no cycle in the simple graph
+    assert _scaffold_sites(3, [0, 0, 1], [0, 1, 2]).tolist() == [0]
+    # two parallel edges to different images are merged
+    assert _scaffold_sites(2, [0, 0], [1, 1]).tolist() == [0]
+
+    sg = get_structure_graph(mof_74_zr_nh2, "vesta")
+    scaffold, _ = get_structure_graph_with_broken_bridges(sg)
+    indices = get_scaffold_indices(sg)
+    assert len(indices) == len(scaffold.structure)
+    assert [str(sg.structure[i].specie) for i in indices] == [
+        str(specie) for specie in scaffold.structure.species
+    ]
+    assert np.array_equal(
+        indices, get_scaffold_indices(CompactStructureGraph.from_structure_graph(sg))
+    )
+
+    # the scaffold is the induced subgraph, without copying the input graph
+    monkeypatch.setattr(StructureGraph, "__copy__", lambda self: pytest.fail("copied"))
+    scaffold, simple_graph = get_structure_graph_with_broken_bridges(sg)
+    compact_scaffold, _ = get_structure_graph_with_broken_bridges(
+        CompactStructureGraph.from_structure_graph(sg)
+    )
+    assert scaffold.structure == compact_scaffold.structure
+    assert len(scaffold.graph.edges) == compact_scaffold.n_edges
+    assert sorted(simple_graph.nodes) == list(range(len(indices)))
+
+
+def test_get_non_leaf_indices(hkust_graph, monkeypatch):
+    # a triangle with a chain of three sites and a water-like group (sites 6 to 8)
+    src = [0, 1, 2, 2, 3, 4, 6, 6]
+    dst = [1, 2, 0, 3, 4, 5, 7, 8]
+    assert np.flatnonzero(_leaf_mask(9, src, dst)).tolist() == [5, 7, 8]
+    # the center of the water-like group is isolated after the first round, not a leaf
+    assert np.flatnonzero(_leaf_mask(9, src, dst, iterative=True)).tolist() == [3, 4, 5, 7, 8]
+
+    indices = get_non_leaf_indices(hkust_graph)
+    assert "H" not in {str(hkust_graph.structure[i].specie) for i in indices}
+    assert np.array_equal(
+        indices, get_non_leaf_indices(CompactStructureGraph.from_structure_graph(hkust_graph))
+    )
+    new_sg, _ = get_structure_graph_without_leaf_nodes(hkust_graph, iterative=True)
+    assert len(new_sg.structure) == len(get_non_leaf_indices(hkust_graph, iterative=True))
+
+    # the pruned graph is the induced subgraph, without copying the input graph
+    monkeypatch.setattr(StructureGraph, "__copy__", lambda self: pytest.fail("copied"))
+    new_sg, simple_graph = get_structure_graph_without_leaf_nodes(hkust_graph)
+    induced = get_induced_subgraphs(hkust_graph, [indices])[0]
+    assert new_sg.structure == induced.structure
+    assert sorted(new_sg.graph.edges) == sorted(induced.graph.edges)
+    assert simple_graph.number_of_nodes() == len(indices)
+
+
+def test_get_induced_subgraphs(bcc_graph):
+    compact = CompactStructureGraph.from_structure_graph(bcc_graph)
+    both, hydrogen, helium = get_induced_subgraphs(bcc_graph, [[0, 1], [0], {1}])
+    assert len(both.graph.edges) == len(bcc_graph.graph.edges)
+    # the edges of the H site to its own images are kept with their images
+    assert sorted(image for _, _, image in hydrogen.graph.edges(data="to_jimage")) == sorted(
+        image for u, v, image in bcc_graph.graph.edges(data="to_jimage") if u == v == 0
+    )
+    assert len(helium.structure) == 1 and len(helium.graph.edges) == 0
+    # the input graph is not modified
+    assert len(bcc_graph.structure) == 2
+
+    compact_subgraphs = get_induced_subgraphs(compact, [[0, 1], [0], {1}])
+    assert [graph.n_edges for graph in compact_subgraphs] == [
+        len(graph.graph.edges) for graph in (both, hydrogen, helium)
+    ]
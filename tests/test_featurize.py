@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from scipy import sparse
+
+from structuregraph_helpers._pool import SupervisedPool
+from structuregraph_helpers.create import get_compact_structure_graph
+from structuregraph_helpers.featurize import WLFeaturizer, wl_kernel_matrix
+from structuregraph_helpers.similarity import wl_feature_counts
+
+
+@pytest.mark.parametrize("variant", ["graph", "scaffold"])
+def test_wl_featurizer(tmp_path, monkeypatch, variant, mof_74_zr, mof_74_zr_nh2, mof_74_zn):
+    graphs = [
+        get_compact_structure_graph(structure, "vesta")
+        for structure in (mof_74_zr, mof_74_zr_nh2, mof_74_zn)
+    ]
+    featurizer = WLFeaturizer(variant=variant, chunk_size=2)
+    matrix = featurizer.fit_transform(graphs)
+    assert matrix.shape == (3, len(featurizer.feature_names))
+    for row, graph in zip(matrix, graphs):
+        counts = wl_feature_counts(graph, variant=variant)
+        assert dict(zip([featurizer.feature_names[i] for i in row.indices], row.data)) == counts
+        if variant == "graph":
+            # every node has one feature per iteration
+            assert row.sum() == 3 * len(graph)
+
+    # the vocabulary is merged from the workers in a fixed order
+    parallel = WLFeaturizer(variant=variant, n_jobs=2).fit(graphs)
+    assert parallel.feature_names == featurizer.feature_names
+    assert (parallel.transform(graphs) != matrix).nnz == 0
+
+    # one pool featurizes all chunks, which are yielded in order
+    started = []
+    init = SupervisedPool.__init__
+
+    def counting_init(self, *args, **kwargs):
+        started.append(args)
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(SupervisedPool, "__init__", counting_init)
+    chunked = WLFeaturizer(variant=variant, n_jobs=2, chunk_size=1)
+    chunked.vocabulary_ = featurizer.vocabulary_
+    chunks = list(chunked.iter_transform(graphs))
+    assert len(started) == 1
+    assert [chunk.shape[0] for chunk in chunks] == [1, 1, 1]
+    assert (sparse.vstack(chunks) != matrix).nnz == 0
+
+    # features that are not in the vocabulary are ignored
+    partial = WLFeaturizer(variant=variant).fit(graphs[:1])
+    chunks = list(partial.iter_transform(graphs))
+    assert [chunk.shape for chunk in chunks] == [(3, len(partial.feature_names))]
+    assert (chunks[0][0] != matrix[0, : len(partial.feature_names)]).nnz == 0
+
+    path = tmp_path / "features.npz"
+    featurizer.save_npz(path, matrix)
+    loaded, loaded_featurizer = WLFeaturizer.load_npz(path)
+    assert (loaded != matrix).nnz == 0
+    assert loaded_featurizer.settings == featurizer.settings
+    assert loaded_featurizer.feature_names == featurizer.feature_names
+
+
+def test_wl_kernel_matrix(tmp_path, mof_74_zr, mof_74_zr_nh2, mof_74_zn, hkust_graph):
+    graphs = [
+        get_compact_structure_graph(structure, "vesta")
+        for structure in (mof_74_zr, mof_74_zr_nh2, mof_74_zn)
+    ] + [hkust_graph]
+    counts = [wl_feature_counts(graph, variant="graph") for graph in graphs]
+    expected = np.array(
+        [[sum(a[key] * b.get(key, 0) for key in a) for b in counts] for a in counts], dtype=float
+    )
+    assert np.array_equal(wl_kernel_matrix(graphs, normalize=False), expected)
+
+    # blocks of one row, written to disk
+    path = tmp_path / "kernel.npy"
+    kernel = wl_kernel_matrix(graphs, out=path, max_memory=1)
+    norms = np.sqrt(np.diag(expected))
+    assert np.allclose(np.load(path), expected / np.outer(norms, norms))
+    assert np.allclose(np.diag(kernel), 1)
+    # the functionalized framework is closest to its parent
+    assert np.argmax(kernel[1, [0, 2, 3]]) == 0
@@ -1,8 +1,18 @@
+import networkx as nx
+import pytest
 from pymatgen.analysis.graphs import StructureGraph
 from pymatgen.transformations.standard_transformations import RotationTransformation
 
+from structuregraph_helpers._hasher import (
+    weisfeiler_lehman_array_hash,
+    weisfeiler_lehman_graph_hash,
+    weisfeiler_lehman_graph_hashes,
+    weisfeiler_lehman_subgraph_hashes,
+)
 from structuregraph_helpers.create import VestaCutoffDictNN
 from structuregraph_helpers.hash import (
+    HASH_KINDS,
+    compute_hashes,
     decorated_graph_hash,
     decorated_no_leaf_hash,
     decorated_scaffold_hash,
@@ -79,3 +89,159 @@ def test_hash_matches(mof_74_zn, mof_74_zr, mof_74_zr_nh2):
     assert mof_74_zn_undecorated_scaffold_hash == mof_74_zr_undecorated_scaffold_hash
     assert mof_74_zn_undecorated_scaffold_hash == mof_74_zr_nh2_undecorated_scaffold_hash
     assert mof_74_zr_undecorated_scaffold_hash == mof_74_zr_nh2_undecorated_scaffold_hash
+
+
+def test_compute_hashes(mof_74_zr_nh2):
+    sg = StructureGraph.with_local_env_strategy(mof_74_zr_nh2, VestaCutoffDictNN)
+    single_hash_functions = {
+        "undecorated_graph_hash": undecorated_graph_hash,
+        "undecorated_no_leaf_hash": undecorated_no_leaf_hash,
+        "undecorated_scaffold_hash": undecorated_scaffold_hash,
+        "decorated_graph_hash": decorated_graph_hash,
+        "decorated_no_leaf_hash": decorated_no_leaf_hash,
+        "decorated_scaffold_hash": decorated_scaffold_hash,
+    }
+    for lqg in (True, False):
+        hashes = compute_hashes(sg, lqg=lqg)
+        assert tuple(hashes) == HASH_KINDS
+        for kind, hash_func in single_hash_functions.items():
+            assert hashes[kind] == hash_func(sg, lqg=lqg)
+
+    subset = compute_hashes(sg, kinds=["decorated_scaffold_hash", "undecorated_graph_hash"])
+    assert list(subset) == ["decorated_scaffold_hash", "undecorated_graph_hash"]
+
+    with pytest.raises(ValueError):
+        compute_hashes(sg, kinds=["scaffold"])
+
+
+def test_weisfeiler_lehman_compat():
+    """The compat mode must reproduce the networkx digests."""
+    graph = nx.Graph()
+    graph.add_edges_from(
+        [
+            (1, 2, {"label": "A"}),
+            (2, 3, {"label": "A"}),
+            (3, 1, {"label": "A"}),
+            (1, 4, {"label": "B"}),
+            (4, 5, {"label": "A"}),
+        ]
+    )
+    for kwargs in ({}, {"edge_attr": "label"}, {"iterations": 5}):
+        assert weisfeiler_lehman_graph_hash(
+            graph, compat=True, **kwargs
+        ) == nx.weisfeiler_lehman_graph_hash(graph, **kwargs)
+        assert weisfeiler_lehman_subgraph_hashes(
+            graph, **kwargs
+        ) == nx.weisfeiler_lehman_subgraph_hashes(graph, **kwargs)
+
+    # the compat mode does not change which graphs share a hash
+    other = nx.relabel_nodes(graph, {1: "a", 2: "b", 3: "c", 4: "d", 5: "e"})
+    assert weisfeiler_lehman_graph_hash(graph) == weisfeiler_lehman_graph_hash(other)
+    other.add_edge("a", "e")
+    assert weisfeiler_lehman_graph_hash(graph) != weisfeiler_lehman_graph_hash(other)
+
+
+def test_compute_hashes_compat(mof_74_zn):
+    sg = StructureGraph.with_local_env_strategy(mof_74_zn, VestaCutoffDictNN)
+    # digest of the string-based implementation in version 0.0.9, which is the default
+    assert (
+        compute_hashes(sg, kinds=["decorated_graph_hash"], compat=True)["decorated_graph_hash"]
+        == "430fec6d0ec75839bb9ce987d8ed4db6"
+    )
+    assert decorated_graph_hash(sg) == "430fec6d0ec75839bb9ce987d8ed4db6"
+    assert compute_hashes(sg, compat=False) != compute_hashes(sg)
+
+
+def test_weisfeiler_lehman_parallel_edges():
+    """Every parallel edge is counted, unless the networkx behavior is requested."""
+    graph = nx.MultiDiGraph()
+    graph.add_edge(0, 1, voltage=(0, 0, 0))
+    graph.add_edge(0, 1, voltage=(1, 0, 0))
+    other = nx.MultiDiGraph()
+    other.add_edge(0, 1, voltage=(0, 0, 0))
+    other.add_edge(0, 1, voltage=(0, 1, 0))
+
+    assert weisfeiler_lehman_graph_hash(graph, edge_attr="voltage") != weisfeiler_lehman_graph_hash(
+        other, edge_attr="voltage"
+    )
+    assert weisfeiler_lehman_graph_hash(
+        graph, edge_attr="voltage", compat=True
+    ) == weisfeiler_lehman_graph_hash(other, edge_attr="voltage", compat=True)
+
+
+def test_weisfeiler_lehman_array_hash(mof_74_zn):
+    sg = StructureGraph.with_local_env_strategy(mof_74_zn, VestaCutoffDictNN)
+    graph = nx.MultiDiGraph(sg.graph)
+    nx.set_node_attributes(
+        graph, {i: str(site.specie) for i, site in enumerate(sg.structure)}, "specie"
+    )
+    for u, v, k, d in graph.edges(keys=True, data=True):
+        graph.edges[u, v, k]["image"] = str(d["to_jimage"])
+
+    src, dst, images = zip(*graph.edges(data="image"))
+    species = [str(site.specie) for site in sg.structure]
+    for directed in (True, False):
+        expected = weisfeiler_lehman_graph_hash(
+            graph if directed else graph.to_undirected(),
+            node_attr="specie",
+            edge_attr="image",
+            iterations=4,
+        )
+        assert (
+            weisfeiler_lehman_array_hash(src, dst, species, images, directed=directed, iterations=4)
+            == expected
+        )
+
+
+def test_weisfeiler_lehman_adaptive_depth(mof_74_zn):
+    # all nodes of a cycle are equivalent, the partition is stable right away
+    cycle = nx.cycle_graph(20)
+    digest, depth = weisfeiler_lehman_graph_hash(cycle, iterations=None, return_depth=True)
+    assert depth == 1
+    assert digest == weisfeiler_lehman_graph_hash(cycle, iterations=depth)
+
+    path = nx.path_graph(20)
+    digest, depth = weisfeiler_lehman_graph_hash(path, iterations=None, return_depth=True)
+    assert depth == 9
+    assert digest == weisfeiler_lehman_graph_hash(path, iterations=depth)
+    for compat in (True, False):
+        assert weisfeiler_lehman_graph_hash(
+            path, iterations=None, compat=compat
+        ) == weisfeiler_lehman_graph_hash(path, iterations=depth, compat=compat)
+
+    sg = StructureGraph.with_local_env_strategy(mof_74_zn, VestaCutoffDictNN)
+    hashes = compute_hashes(sg, iterations=None)
+    assert hashes["undecorated_graph_hash"] == undecorated_graph_hash(sg, iterations=None)
+
+
+def test_weisfeiler_lehman_graph_hashes(mof_74_zn):
+    sg = StructureGraph.with_local_env_strategy(mof_74_zn, VestaCutoffDictNN)
+    graph = nx.MultiDiGraph(sg.graph)
+    nx.set_node_attributes(
+        graph, {i: str(site.specie) for i, site in enumerate(sg.structure)}, "specie"
+    )
+    graphs = [
+        graph,
+        graph.to_undirected(),
+        nx.MultiGraph(),
+        nx.cycle_graph(20),
+        nx.path_graph(20),
+        nx.relabel_nodes(nx.path_graph(20), {0: "a"}),
+    ]
+    for other in graphs[3:]:
+        species = {node: "C" if i % 3 else "O" for i, node in enumerate(other)}
+        nx.set_node_attributes(other, species, "specie")
+
+    for kwargs in (
+        {},
+        {"node_attr": "specie"},
+        {"node_attr": "specie", "edge_attr": "to_jimage", "iterations": 5},
+        {"iterations": None, "return_depth": True},
+    ):
+        for compat in (False, True):
+            # only the multigraphs have the edge attribute
+            batch = graphs[:3] if "edge_attr" in kwargs else graphs
+            assert weisfeiler_lehman_graph_hashes(batch, compat=compat, **kwargs) == [
+                weisfeiler_lehman_graph_hash(graph, compat=compat, **kwargs) for graph in batch
+            ]
+    assert weisfeiler_lehman_graph_hashes([]) == []
@@ -0,0 +1,111 @@
+import os
+import shutil
+
+import pytest
+from click.testing import CliRunner
+from pymatgen.core import Lattice, Structure
+
+from structuregraph_helpers.cli import dedupe, index_folder
+from structuregraph_helpers.create import get_compact_structure_graph
+from structuregraph_helpers.hash import compute_hashes
+from structuregraph_helpers.index import HashIndex, prefilter_keys
+
+from .conftest import _THIS_DIR
+
+
+@pytest.fixture()
+def folder(tmp_path):
+    folder = tmp_path / "cifs"
+    folder.mkdir()
+    for name in ("MOF-74-Zn", "MOF-74-Zr"):
+        shutil.copy(os.path.join(_THIS_DIR, "test_files", f"{name}.cif"), folder / f"{name}.cif")
+    shutil.copy(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif"), folder / "copy.cif")
+    return folder
+
+
+def test_hash_index(tmp_path):
+    with HashIndex(tmp_path / "index.sqlite") as index:
+        index.add("a", {"decorated_graph_hash": "1", "formula": "H2O"}, method="vesta", lqg=False)
+        index.add_many(
+            [("b", {"decorated_graph_hash": "1"}), ("c", {"decorated_graph_hash": float("nan")})],
+            method="vesta",
+            lqg=False,
+        )
+        assert len(index) == 3
+        assert "c" in index
+        assert index.lookup({"decorated_graph_hash": "1"}) == ["a", "b"]
+        assert index.lookup({"decorated_graph_hash": "2"}) == []
+        assert index.groups() == [["a", "b"]]
+        with pytest.raises(ValueError):
+            index.add("d", {"decorated_graph_hash": "1"}, method="vesta", lqg=True)
+
+
+def test_index_folder(folder, tmp_path):
+    with HashIndex(tmp_path / "index.sqlite") as index:
+        assert index_folder(folder, index, kinds=["decorated_graph_hash"]) == 3
+        # structures that are already in the index are not hashed again
+        assert index_folder(folder, index, kinds=["decorated_graph_hash"]) == 0
+        assert index.groups() == [["MOF-74-Zn", "copy"]]
+
+        assert index.find(os.path.join(_THIS_DIR, "test_files", "MOF-74-Zr.cif")) == ["MOF-74-Zr"]
+        # rejected by the prefilter keys without hashing
+        assert index.find(os.path.join(_THIS_DIR, "test_files", "HKUST-1.cif")) == []
+
+
+@pytest.mark.parametrize("lqg", [False, True])
+def test_find_agrees_with_lookup(tmp_path, lqg):
+    """The prefilter must not reject structures whose hashed graphs are the same."""
+    folder = tmp_path / "cifs"
+    folder.mkdir()
+    shutil.copy(os.path.join(_THIS_DIR, "test_files", "HKUST-1.cif"), folder / "hkust.cif")
+    floating = os.path.join(_THIS_DIR, "test_files", "HKUST_floating.cif")
+    # the floating atom is not part of the hashed graph
+    assert len(Structure.from_file(floating)) != len(Structure.from_file(folder / "hkust.cif"))
+
+    with HashIndex(tmp_path / "index.sqlite") as index:
+        index_folder(folder, index, lqg=lqg, kinds=["decorated_graph_hash"], cache=None)
+        hashes = compute_hashes(
+            get_compact_structure_graph(Structure.from_file(floating), "vesta"),
+            kinds=["decorated_graph_hash"],
+            lqg=lqg,
+        )
+        assert index.lookup(hashes) == ["hkust"]
+        assert index.find(floating) == ["hkust"]
+
+
+def test_find_collapsed_edges():
+    """Without the voltages, a molecule and a chain can have the same hash."""
+    molecule = Structure(
+        Lattice.cubic(10), ["C", "O"], [[0, 0, 0], [1.2, 0, 0]], coords_are_cartesian=True
+    )
+    chain = Structure(
+        Lattice.orthorhombic(2.4, 10, 10),
+        ["C", "O"],
+        [[0, 0, 0], [1.2, 0, 0]],
+        coords_are_cartesian=True,
+    )
+    with HashIndex(":memory:") as index:
+        for name, structure in (("molecule", molecule), ("chain", chain)):
+            sg = get_compact_structure_graph(structure, "vesta")
+            assert sg.n_edges == (1 if name == "molecule" else 2)
+            record = compute_hashes(sg, kinds=["decorated_graph_hash"], lqg=False)
+            record.update(prefilter_keys(sg, lqg=False))
+            if name == "molecule":
+                index.add(name, record, method="vesta", lqg=False)
+        assert index.lookup(record) == ["molecule"]
+        assert index.find(chain) == ["molecule"]
+        index.add("chain", record, method="vesta", lqg=False)
+        assert index.groups() == [["chain", "molecule"]]
+
+
+def test_cli_dedupe(folder, tmp_path):
+    runner = CliRunner()
+    index_path = str(tmp_path / "index.sqlite")
+    result = runner.invoke(dedupe, [str(folder), "--index", index_path, "--no-cache"])
+    assert result.exit_code == 0, result.output
+    assert "Found 1 groups with 1 duplicates among 3 structures" in result.output
+    assert "MOF-74-Zn copy" in result.output
+
+    result = runner.invoke(dedupe, [index_path, "--output", str(tmp_path / "groups.json")])
+    assert result.exit_code == 0, result.output
+    assert (tmp_path / "groups.json").exists()
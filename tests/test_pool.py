@@ -0,0 +1,54 @@
+import os
+import time
+
+import numpy as np
+
+from structuregraph_helpers._pool import supervised_imap_unordered
+
+
+def _work(task):
+    if task == "sleep":
+        time.sleep(60)
+    elif task == "crash":
+        os._exit(1)
+    elif task == "error":
+        raise ValueError("bad structure")
+    elif task == "memory":
+        memory = np.ones(40_000_000)  # noqa: F841, 320 MB
+        time.sleep(60)
+    return os.getpid()
+
+
+def _run(chunks, **kwargs):
+    chunks = [[(index, (task,)) for index, task in chunk] for chunk in chunks]
+    return {
+        index: (result, reason)
+        for index, result, reason in supervised_imap_unordered(_work, chunks, **kwargs)
+    }
+
+
+def test_supervised_imap_unordered_limits():
+    start = time.monotonic()
+    results = _run(
+        [[(0, "sleep"), (1, "ok")], [(2, "crash"), (3, "ok")], [(4, "error"), (5, "memory")]],
+        n_workers=2,
+        timeout=2,
+        max_memory=200 * 1024**2,
+    )
+    assert time.monotonic() - start < 30
+    assert sorted(results) == list(range(6))
+    assert results[0] == (None, "timeout")
+    assert results[2] == (None, "crashed")
+    assert results[4] == (None, "error: ValueError: bad structure")
+    assert results[5] == (None, "memory")
+    # the remaining tasks of the chunks of killed workers are not lost
+    assert isinstance(results[1][0], int) and results[1][1] is None
+    assert isinstance(results[3][0], int) and results[3][1] is None
+
+
+def test_supervised_imap_unordered_recycling():
+    results = _run([[(i, "ok")] for i in range(3)], n_workers=1, max_tasks_per_worker=1)
+    assert len({pid for pid, _ in results.values()}) == 3
+
+    results = _run([[(i, "ok")] for i in range(3)], n_workers=1)
+    assert len({pid for pid, _ in results.values()}) == 1
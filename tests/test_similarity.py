@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from structuregraph_helpers.create import get_structure_graph
+from structuregraph_helpers.similarity import (
+    SimilarityIndex,
+    estimate_jaccard,
+    lsh_parameters,
+    minhash,
+    wl_features,
+)
+
+
+def test_minhash():
+    a = {f"feature{i}" for i in range(100)}
+    b = {f"feature{i}" for i in range(50, 150)}
+    assert estimate_jaccard(minhash(a), minhash(a)) == 1
+    assert estimate_jaccard(minhash(a, num_perm=512), minhash(b, num_perm=512)) == pytest.approx(
+        1 / 3, abs=0.1
+    )
+    assert minhash(a, seed=2).tolist() != minhash(a).tolist()
+
+    bands, rows = lsh_parameters(0.9, 128)
+    assert bands * rows <= 128
+    # the probability to become candidates is high above and low below the threshold
+    assert 1 - (1 - 0.99**rows) ** bands > 0.9
+    assert 1 - (1 - 0.7**rows) ** bands < 0.01
+
+
+def test_similarity_index(tmp_path, mof_74_zr, mof_74_zr_nh2, mof_74_zn):
+    graphs = {
+        name: get_structure_graph(structure, "vesta")
+        for name, structure in [
+            ("MOF-74-Zr", mof_74_zr),
+            ("MOF-74-Zr-NH2", mof_74_zr_nh2),
+            ("MOF-74-Zn", mof_74_zn),
+        ]
+    }
+    # the scaffolds of the functionalized variant are identical, the full graphs are similar
+    zr, zr_nh2 = (
+        wl_features(graphs[name], variant="graph") for name in ("MOF-74-Zr", "MOF-74-Zr-NH2")
+    )
+    assert 0.5 < len(zr & zr_nh2) / len(zr | zr_nh2) < 1
+    assert wl_features(graphs["MOF-74-Zr"]) == wl_features(graphs["MOF-74-Zr-NH2"])
+
+    path = tmp_path / "similarity.sqlite"
+    with SimilarityIndex(path, threshold=0.5, variant="graph") as index:
+        index.add_many([(name, graphs[name]) for name in ("MOF-74-Zr", "MOF-74-Zn")])
+        assert len(index) == 2
+        results = index.query(graphs["MOF-74-Zr-NH2"])
+        assert [name for name, _ in results] == ["MOF-74-Zr"]
+        with pytest.raises(ValueError):
+            index.query(np.zeros(3))
+
+    # the settings are read from the index
+    with SimilarityIndex(path, variant="graph") as index:
+        assert index.variant == "graph" and index.threshold == 0.5
+        assert index.query(graphs["MOF-74-Zr"])[0] == ("MOF-74-Zr", 1.0)
+    # explicit settings must agree with the stored ones
+    for kwargs in ({"variant": "scaffold"}, {"threshold": 0.9}, {"lqg": True}):
+        with pytest.raises(ValueError):
+            SimilarityIndex(path, **kwargs)
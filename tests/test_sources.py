@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import shutil
+import tarfile
+import zipfile
+
+from pymatgen.core import Structure
+
+from structuregraph_helpers.cli import compute_hashes_for_folder
+from structuregraph_helpers.sources import (
+    iter_structure_sources,
+    read_structure,
+    structure_format,
+)
+
+from .conftest import _THIS_DIR
+
+_MOF_74 = os.path.join(_THIS_DIR, "test_files", "MOF-74-Zn.cif")
+
+
+def _make_folder(tmp_path):
+    folder = tmp_path / "structures"
+    (folder / "sub").mkdir(parents=True)
+    shutil.copy(_MOF_74, folder / "a.cif")
+    with open(_MOF_74, "rb") as handle, gzip.open(folder / "sub" / "b.cif.gz", "wb") as out:
+        out.write(handle.read())
+    Structure.from_file(_MOF_74).to(filename=str(folder / "sub" / "POSCAR"))
+    (folder / "notes.txt").write_text("not a structure")
+    with tarfile.open(folder / "dump.tar.gz", "w:gz") as archive:
+        archive.add(_MOF_74, arcname="./inner/c.cif")
+    with zipfile.ZipFile(folder / "sub" / "dump.zip", "w") as archive:
+        archive.write(_MOF_74, arcname="d.cif")
+    return folder
+
+
+def test_structure_format():
+    assert structure_format("a/b.cif") == "cif"
+    assert structure_format("b.CIF.gz") == "cif"
+    assert structure_format("run/CONTCAR") == "poscar"
+    assert structure_format("POSCAR.bz2") == "poscar"
+    assert structure_format("b.vasp") == "poscar"
+    assert structure_format("b.json") is None
+
+
+def test_iter_structure_sources(tmp_path):
+    folder = _make_folder(tmp_path)
+    sources = list(iter_structure_sources(folder))
+    assert [source.name for source in sources] == [
+        "a",
+        "sub/POSCAR",
+        "sub/b",
+        "dump.tar.gz/inner/c",
+        "sub/dump.zip/d",
+    ]
+    assert [source.data is None for source in sources] == [True] * 3 + [False] * 2
+
+    reference = Structure.from_file(_MOF_74)
+    for source in sources:
+        structure = read_structure(source.filename, source.data)
+        assert structure.composition == reference.composition
+
+    names = [source.name for source in iter_structure_sources(folder, recursive=False)]
+    assert names == ["a", "dump.tar.gz/inner/c"]
+
+
+def test_compute_hashes_for_nested_folder(tmp_path):
+    folder = _make_folder(tmp_path)
+    kinds = ["decorated_graph_hash"]
+    hashes = compute_hashes_for_folder(folder, None, n_jobs=2, kinds=kinds)
+    assert sorted(hashes) == sorted(source.name for source in iter_structure_sources(folder))
+    assert len({res[kinds[0]] for res in hashes.values()}) == 1
+
+
+def test_colliding_names(tmp_path):
+    folder = tmp_path / "structures"
+    folder.mkdir()
+    shutil.copy(_MOF_74, folder / "a.cif")
+    with open(_MOF_74, "rb") as handle, gzip.open(folder / "a.cif.gz", "wb") as out:
+        out.write(handle.read())
+    shutil.copy(_MOF_74, folder / "b.cif")
+    with tarfile.open(folder / "dump.tar", "w") as archive:
+        archive.add(_MOF_74, arcname="c.cif")
+        archive.add(folder / "a.cif.gz", arcname="c.cif.gz")
+
+    names = [source.name for source in iter_structure_sources(folder)]
+    assert names == ["a.cif", "a.cif.gz", "b", "dump.tar/c", "dump.tar/c.cif.gz"]
+
+    kinds = ["decorated_graph_hash"]
+    hashes = compute_hashes_for_folder(folder, None, kinds=kinds)
+    assert list(hashes) == sorted(names)
+
+    outname = tmp_path / "hashes.jsonl"
+    compute_hashes_for_folder(folder, str(outname), kinds=kinds)
+    with open(outname) as handle:
+        assert sorted(json.loads(line)["name"] for line in handle) == sorted(names)
@@ -1,8 +1,20 @@
+from collections import Counter
+
+import networkx as nx
 import numpy as np
+import pytest
 from pymatgen.analysis.graphs import MoleculeGraph
-from pymatgen.core import Molecule
+from pymatgen.core import Lattice, Molecule, Structure
 
-from structuregraph_helpers.subgraph import get_subgraphs_as_molecules
+from structuregraph_helpers.compact import CompactStructureGraph
+from structuregraph_helpers.create import get_structure_graph
+from structuregraph_helpers.subgraph import (
+    MoleculeRecord,
+    _first_of_each_isomorphism_class,
+    get_molecule_records,
+    get_periodic_components,
+    get_subgraphs_as_molecules,
+)
 
 
 def test_get_subgraphs_as_molecules(floating_hkust_graph):
@@ -23,3 +35,108 @@ def test_get_subgraphs_as_molecules(floating_hkust_graph):
 
     for coord in coordinates:
         assert isinstance(coord, np.ndarray)
+
+
+def test_get_subgraphs_as_molecules_across_boundary():
+    # a CO molecule across the boundary, an O2 molecule in the cell, and a chain of carbon atoms
+    structure = Structure(
+        Lattice.cubic(8),
+        ["C", "O", "O", "O"] + ["C"] * 6,
+        [[0.01, 0.5, 0.5], [0.87, 0.5, 0.5], [0.4, 0.4, 0.4], [0.4, 0.55, 0.4]]
+        + [[i / 6, 0.8, 0.8] for i in range(6)],
+    )
+    structure_graph = get_structure_graph(structure, "vesta")
+
+    mols, graphs, indices, centers, coordinates = get_subgraphs_as_molecules(structure_graph)
+    assert sorted(mol.composition.formula for mol in mols) == ["C1 O1", "O2"]
+    assert sorted(indices) == [[0, 1], [2, 3]]
+    for coords, graph in zip(coordinates, graphs):
+        assert np.linalg.norm(coords[0] - coords[1]) < 1.3
+        assert len(graph.graph.edges) == 1
+
+    mols, _, indices, _, _ = get_subgraphs_as_molecules(
+        CompactStructureGraph.from_structure_graph(structure_graph),
+        disable_boundary_crossing_check=True,
+    )
+    assert indices == [[0, 1], [2, 3], [4, 5, 6, 7, 8, 9]]
+
+    with pytest.warns(DeprecationWarning, match="filter_in_cell"):
+        _, _, indices, _, _ = get_subgraphs_as_molecules(structure_graph, filter_in_cell=False)
+    assert sorted(indices) == [[0, 1], [2, 3]]
+
+    records = get_molecule_records(structure_graph, return_unique=False)
+    assert all(isinstance(record, MoleculeRecord) for record in records)
+    assert [record.indices.tolist() for record in records] == [[0, 1], [2, 3]]
+    assert records[0].numbers.tolist() == [6, 8]
+    assert records[0].src.tolist() == [0] and records[0].dst.tolist() == [1]
+    assert np.allclose(records[0].masses, [12.011, 15.999], atol=1e-3)
+    assert np.allclose(records[0].center, (records[0].coords * records[0].masses[:, None]).mean(0))
+    molecule = records[0].to_molecule()
+    assert molecule.composition.formula == "C1 O1"
+    assert np.allclose(molecule.cart_coords, records[0].coords)
+    assert len(records[0].to_molecule_graph().graph.edges) == 1
+
+    # CO and O2 are in different buckets, so no graph is built for the uniqueness check
+    records = get_molecule_records(structure_graph)
+    assert len(records) == 2
+    assert all(record._graph is None for record in records)
+
+
+def test_get_periodic_components(bcc_graph):
+    edges = list(bcc_graph.graph.edges(data=True))
+    src, dst = np.array([(u, v) for u, v, _ in edges]).T
+    images = np.array([d["to_jimage"] for _, _, d in edges])
+    labels, offsets, periodic = get_periodic_components(2, src, dst, images)
+    assert labels.tolist() == [0, 0]
+    assert periodic.tolist() == [True]
+
+    # only the bond within the home cell
+    labels, offsets, periodic = get_periodic_components(3, [0], [1], [[0, 0, 0]])
+    assert labels.tolist() == [0, 0, 1]
+    assert periodic.tolist() == [False, False]
+
+    labels, offsets, periodic = get_periodic_components(2, [0], [1], [[1, 0, -1]])
+    assert offsets.tolist() == [[0, 0, 0], [1, 0, -1]]
+    assert periodic.tolist() == [False]
+
+
+def test_first_of_each_isomorphism_class():
+    def graph(species, edges):
+        g = nx.MultiDiGraph()
+        g.add_nodes_from((i, {"specie": specie}) for i, specie in enumerate(species))
+        g.add_edges_from(edges)
+        return g
+
+    graphs = [
+        graph("OHH", [(0, 1), (0, 2)]),
+        graph("HOH", [(1, 0), (1, 2)]),  # water with other labels and directions
+        graph("OHH", [(0, 1), (1, 2)]),  # same composition, other connectivity
+        graph("CCCCCC", [(i, (i + 1) % 6) for i in range(6)]),  # ring
+        graph("CCCCCC", [(0, 1), (1, 2), (2, 0), (3, 4), (4, 5), (5, 3)]),  # same WL hash
+        graph("OHH", [(2, 0), (2, 1)]),  # the same chain as the third graph
+    ]
+    keys = [
+        (tuple(sorted(Counter(dict(g.nodes(data="specie")).values()).items())), len(g.edges))
+        for g in graphs
+    ]
+    unique = _first_of_each_isomorphism_class(
+        keys, graphs.__getitem__, lambda n1, n2: n1["specie"] == n2["specie"], lambda e1, e2: True
+    )
+    assert unique == [0, 2, 3, 4]
+
+    # graphs are only requested for buckets with more than one member
+    subset = [0, 3, 4]  # water and the two C6 graphs
+    requested = []
+
+    def get_graph(i):
+        requested.append(i)
+        return graphs[subset[i]]
+
+    unique = _first_of_each_isomorphism_class(
+        [keys[i] for i in subset],
+        get_graph,
+        lambda n1, n2: n1["specie"] == n2["specie"],
+        lambda e1, e2: True,
+    )
+    assert unique == [0, 1, 2]
+    assert sorted(requested) == [1, 2]